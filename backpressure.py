@@ -0,0 +1,300 @@
+import os
+import pickle
+import queue
+import struct
+import logging
+import multiprocessing as mp
+from collections import deque
+from typing import Dict, Optional
+
+_SPILL_HEADER = struct.Struct('<Q')    # read offset of the next record to replay
+_SPILL_RECORD = struct.Struct('<I')    # pickled record length
+
+
+class SpillSegment:
+    """Append-only overflow file replayed in order once the consumer catches up.
+
+    The replay position is kept in the file header, so a backlog left over from
+    a previous run is replayed on the next start without duplicates. Once half of
+    max_bytes has been replayed, or an append would grow the file past max_bytes,
+    the unread backlog is rotated into a fresh file, so the file stays bounded.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        exists = os.path.isfile(path) and os.path.getsize(path) >= _SPILL_HEADER.size
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self.read_offset = _SPILL_HEADER.unpack(self.file.read(_SPILL_HEADER.size))[0]
+            self.write_offset = self.file.seek(0, os.SEEK_END)
+        else:
+            self._reset()
+        self.count = self._count_backlog()
+
+    def _reset(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(_SPILL_HEADER.pack(_SPILL_HEADER.size))
+        self.file.flush()
+        self.read_offset = self.write_offset = _SPILL_HEADER.size
+
+    def _count_backlog(self) -> int:
+        count = 0
+        offset = self.read_offset
+        while offset + _SPILL_RECORD.size <= self.write_offset:
+            self.file.seek(offset)
+            length, = _SPILL_RECORD.unpack(self.file.read(_SPILL_RECORD.size))
+            offset += _SPILL_RECORD.size + length
+            count += 1
+        if offset != self.write_offset:
+            # Torn tail from a crash while spilling
+            self.file.truncate(offset)
+            self.write_offset = offset
+        return count
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def backlog_bytes(self) -> int:
+        return self.write_offset - self.read_offset
+
+    def _compact(self):
+        # Rewrite the unread backlog into a new file and swap it in; a crash on the
+        # way leaves either the old file or the complete new one
+        backlog = self.backlog_bytes
+        tmp_path = self.path + '.tmp'
+        self.file.flush()
+        self.file.seek(self.read_offset)
+        with open(tmp_path, 'wb') as tmp:
+            tmp.write(_SPILL_HEADER.pack(_SPILL_HEADER.size))
+            remaining = backlog
+            while remaining:
+                chunk = self.file.read(min(remaining, 1024 * 1024))
+                tmp.write(chunk)
+                remaining -= len(chunk)
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'r+b')
+        self.read_offset = _SPILL_HEADER.size
+        self.write_offset = _SPILL_HEADER.size + backlog
+
+    def append(self, item) -> bool:
+        record = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        size = _SPILL_RECORD.size + len(record)
+        if self.write_offset - _SPILL_HEADER.size + size > self.max_bytes and self.read_offset > _SPILL_HEADER.size:
+            self._compact()
+        if self.write_offset - _SPILL_HEADER.size + size > self.max_bytes:
+            return False
+        self.file.seek(self.write_offset)
+        self.file.write(_SPILL_RECORD.pack(len(record)) + record)
+        self.write_offset += _SPILL_RECORD.size + len(record)
+        self.count += 1
+        return True
+
+    def peek(self):
+        self.file.flush()
+        self.file.seek(self.read_offset)
+        length, = _SPILL_RECORD.unpack(self.file.read(_SPILL_RECORD.size))
+        return pickle.loads(self.file.read(length)), _SPILL_RECORD.size + length
+
+    def advance(self, size: int):
+        self.read_offset += size
+        self.count -= 1
+        if self.count == 0:
+            self._reset()
+        elif self.read_offset - _SPILL_HEADER.size >= self.max_bytes // 2:
+            self._compact()
+        else:
+            self.file.seek(0)
+            self.file.write(_SPILL_HEADER.pack(self.read_offset))
+
+    def close(self):
+        self.file.flush()
+        self.file.close()
+
+
+class QueueStats:
+    def __init__(self):
+        self.put = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.high_water = 0
+        self.spill_high_water = 0
+        self.dropped_by_dean: Dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        return {
+            'put': self.put,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'high_water': self.high_water,
+            'spill_high_water': self.spill_high_water,
+            'dropped_by_dean': dict(self.dropped_by_dean),
+        }
+
+
+class GuardedQueue:
+    """Non-blocking producer front for a bounded worker queue.
+
+    put() never blocks the BLE callback. When the inner queue is full the item is
+    staged for the spill segment (if configured) or dropped and counted. Once a
+    backlog exists every new item is staged as well, so the consumer still sees
+    each DEAN's records in order. pump() does the spill file I/O (writing staged
+    items, replaying the backlog) and is meant to run in an executor; put() only
+    touches memory. Each counter has a single writer thread. The consumer side
+    simply reads the inner queue.
+
+    A queue whose producers are other worker processes is created with
+    shared_stats and no spill segment: put, dropped and high water are then
+    counted in shared memory, so report() in the main process includes them.
+    """
+
+    replay_batch = 256
+
+    def __init__(self, name: str, inner, spill: Optional[SpillSegment] = None, shared_stats: bool = False):
+        self.name = name
+        self.inner = inner
+        self.spill = spill
+        self.stats = QueueStats()
+        # Overflow waiting for pump() to write it to the spill segment
+        self._staged = deque()
+        # put, dropped, high water of the producers in other processes
+        self._shared = mp.Array('q', 3) if shared_stats else None
+
+    def __getstate__(self):
+        # Only the consumer half is needed in the worker process
+        return {'name': self.name, 'inner': self.inner, 'spill': None, 'stats': QueueStats(), '_staged': deque(),
+                '_shared': self._shared}
+
+    def _backlog(self) -> int:
+        return len(self._staged) + (len(self.spill) if self.spill is not None else 0)
+
+    def _depth(self) -> int:
+        try:
+            return self.inner.qsize()
+        except NotImplementedError:
+            return 0
+
+    def _drop(self, item):
+        self.stats.dropped += 1
+        address = item[2]
+        self.stats.dropped_by_dean[address] = self.stats.dropped_by_dean.get(address, 0) + 1
+        if self.stats.dropped in (1, 10, 100) or self.stats.dropped % 1000 == 0:
+            logging.warning("%s queue full: %d notifications dropped so far", self.name, self.stats.dropped)
+
+    def _write_staged(self):
+        # An item leaves the staging deque only once it is on disk (or dropped), so
+        # put() never sees an empty backlog while one is still in flight
+        while self._staged:
+            if not self.spill.append(self._staged[0]):
+                self._drop(self._staged[0])
+            self._staged.popleft()
+
+    def pump(self) -> int:
+        # Replay spilled items while the inner queue has room, then move the staged
+        # overflow to the worker directly if nothing is on disk ahead of it, or to disk
+        if self.spill is None:
+            return 0
+        replayed = 0
+        while len(self.spill) and replayed < self.replay_batch:
+            if self.inner.full():
+                break
+            item, size = self.spill.peek()
+            try:
+                self.inner.put_nowait(item)
+            except queue.Full:
+                break
+            self.spill.advance(size)
+            replayed += 1
+        while self._staged and not len(self.spill):
+            try:
+                self.inner.put_nowait(self._staged[0])
+            except queue.Full:
+                break
+            self._staged.popleft()
+            replayed += 1
+        self._write_staged()
+        self.stats.replayed += replayed
+        return replayed
+
+    def _put_shared(self, item):
+        try:
+            self.inner.put_nowait(item)
+        except queue.Full:
+            with self._shared.get_lock():
+                self._shared[0] += 1
+                self._shared[1] += 1
+            # Also logged from the producing process
+            self._drop(item)
+            return
+        depth = self._depth()
+        with self._shared.get_lock():
+            self._shared[0] += 1
+            if depth > self._shared[2]:
+                self._shared[2] = depth
+
+    def put(self, item, block=False, timeout=None):
+        if item is None:
+            self.inner.put(None)
+            return
+        if self._shared is not None:
+            self._put_shared(item)
+            return
+        self.stats.put += 1
+        if self.spill is None or not self._backlog():
+            try:
+                self.inner.put_nowait(item)
+            except queue.Full:
+                pass
+            else:
+                depth = self._depth()
+                if depth > self.stats.high_water:
+                    self.stats.high_water = depth
+                return
+        if self.spill is not None:
+            self._staged.append(item)
+            self.stats.spilled += 1
+            backlog = self._backlog()
+            if backlog > self.stats.spill_high_water:
+                self.stats.spill_high_water = backlog
+            return
+        self._drop(item)
+
+    put_nowait = put
+
+    def full(self) -> bool:
+        # Producers never need to check: put() always returns immediately
+        return False
+
+    def qsize(self) -> int:
+        return self._depth()
+
+    def get(self, block=True, timeout=None):
+        return self.inner.get(block, timeout)
+
+    def get_nowait(self):
+        return self.inner.get_nowait()
+
+    def close(self):
+        if self.spill is not None:
+            # Kept for the next start, like the rest of the backlog
+            self._write_staged()
+            self.spill.close()
+        self.inner.close()
+
+    def report(self) -> dict:
+        report = self.stats.as_dict()
+        if self._shared is not None:
+            with self._shared.get_lock():
+                put, dropped, high_water = self._shared[:]
+            report['put'] += put
+            report['dropped'] += dropped
+            report['high_water'] = max(report['high_water'], high_water)
+        report['depth'] = self._depth()
+        report['spill_backlog'] = self._backlog()
+        return report
@@ -0,0 +1,144 @@
+"""Display line throughput: legacy LogProcess path vs. formatter registry + buffered writer.
+
+legacy : json.loads + if/elif chain + open(..., 'a') per line (the old LogProcess._run)
+current: decode_debugstr (now done by DataProcess), display_format registry, AppendWriter
+
+Both paths start from the raw notification, so the totals cover the same work.
+The decode column times the JSON decode step of each path alone; format+write
+is the rest of the total.
+
+    python benchmarks/bench_display_format.py [-n 50000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from data_writer import AppendWriter
+from debug_event import decode_debugstr
+from display_format import env_list, format_display_line
+
+MESSAGES = [
+    {'type': 'DEBUG', 'event': 'SOUND', 'id': 'speech_tv'},
+    {'type': 'DEBUG', 'event': 'SOUND', 'id': 'background'},
+    {'type': 'DEBUG', 'event': 'ENV', 'id': 2},
+    {'type': 'DEBUG', 'event': 'ENTER', 'value': 1},
+    {'type': 'DEBUG', 'event': 'EXIT', 'value': 0},
+    {'type': 'INFERENCE', 'status': 'DONE', 'ADL': 'toileting', 'sequence': '3-5-7', 'truth': 0.82, 'missing': 'None'},
+    {'type': 'INFERENCE', 'status': 'EXCEPTION', 'ADL': 'cooking', 'value': 4},
+    {'type': 'HEAPPRINT', 'heap_state': '[1, 4, 9]\n'},
+]
+
+
+def make_items(n):
+    now = time.time()
+    rng = random.Random(0)
+    return [['livingroom', 'dean', 'AA:BB:CC:DD:EE:%02X' % (i % 8), 'inference', 'debugstr', now + i * 0.01,
+             bytearray(json.dumps(rng.choice(MESSAGES)).encode('utf-8'))] for i in range(n)]
+
+
+def legacy_format(item):
+    # Body of the former LogProcess._run loop, kept verbatim for comparison
+    location, device_type, address, service_name, char_name, received_time, data = item
+    time_dt = datetime.fromtimestamp(received_time)
+    debug_dict = json.loads(data.decode('utf-8'))
+    debug_dict["timestamp"] = time_dt.strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = debug_dict["timestamp"]
+    log_message = ""
+    if debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'SOUND':
+        label = debug_dict.get('id', 'unknown')
+        if label not in ("unknown", "background"):
+            log_message = f"{timestamp}  {location} [EVENT] - Sound '{label}' was detected\n"
+    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'ENV':
+        env_id = debug_dict.get('id', -1)
+        label = env_list[env_id] if 0 <= env_id < len(env_list) else "N/A"
+        log_message = f"{timestamp}  {location} [EVENT] - '{label}' event was detected\n"
+    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'ENTER':
+        log_message = f"{timestamp}  {location} [EVENT] - ENTER value: {debug_dict.get('value', 0)}\n"
+    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'EXIT':
+        log_message = f"{timestamp}  {location} [EVENT] - EXIT value: {debug_dict.get('value', 0)}\n"
+    elif debug_dict['type'] == 'INFERENCE':
+        status = debug_dict.get('status', '')
+        adl = debug_dict.get('ADL', 'N/A')
+        if status == 'EXCEPTION':
+            log_message = f"{timestamp}  {location} [INFERENCE] {status}: {adl}, value: {debug_dict.get('value', 0)}\n"
+        else:
+            log_message = (f"{timestamp}  {location} [INFERENCE] {status}: {adl}, sequence: {debug_dict.get('sequence', 'N/A')}, "
+                           f"truth: {debug_dict.get('truth', 0.0):.2f}, missing: {debug_dict.get('missing', 'None')}\n")
+    elif debug_dict['type'] == 'HEAPPRINT':
+        log_message = f"{timestamp} {location} [HEAP STATE] - {debug_dict.get('heap_state', '')}"
+    return time_dt.strftime("%Y-%m-%d") + ".txt", log_message
+
+
+def legacy_decode(item):
+    # Decode step of legacy_format
+    debug_dict = json.loads(item[6].decode('utf-8'))
+    debug_dict["timestamp"] = datetime.fromtimestamp(item[5]).strftime("%Y-%m-%d %H:%M:%S")
+    return debug_dict
+
+
+def current_decode(item):
+    return decode_debugstr(item[0], item[1], item[2], item[5], item[6])
+
+
+def run_decode(items, decode):
+    start = time.perf_counter()
+    for item in items:
+        decode(item)
+    return time.perf_counter() - start
+
+
+def run_legacy(items, out_dir):
+    start = time.perf_counter()
+    for item in items:
+        filename, log_message = legacy_format(item)
+        if log_message:
+            with open(os.path.join(out_dir, filename), 'a') as f:
+                f.write(log_message)
+    return time.perf_counter() - start
+
+
+def run_current(items, out_dir):
+    start = time.perf_counter()
+    writer = AppendWriter(sync=False)
+    for item in items:
+        event = current_decode(item)
+        log_message = format_display_line(event)
+        if log_message is not None:
+            writer.write(os.path.join(out_dir, event.timestamp[:10] + ".txt"), log_message.encode('utf-8'))
+        writer.flush_if_due()
+    writer.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=50000, help='number of debugstr messages')
+    args = parser.parse_args()
+
+    items = make_items(args.n)
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as current_dir:
+        legacy = run_legacy(items, legacy_dir)
+        current = run_current(items, current_dir)
+        for filename in os.listdir(legacy_dir):
+            with open(os.path.join(legacy_dir, filename)) as a, open(os.path.join(current_dir, filename)) as b:
+                assert a.read() == b.read(), "display output differs"
+    legacy_decode_s = run_decode(items, legacy_decode)
+    current_decode_s = run_decode(items, current_decode)
+
+    print(f"messages: {args.n}")
+    print(f"{'':<9}{'lines/sec':>12}{'decode us':>12}{'format+write us':>17}")
+    for name, total, decode in (('legacy', legacy, legacy_decode_s), ('current', current, current_decode_s)):
+        print(f"{name:<9}{args.n / total:12.0f}{decode / args.n * 1e6:12.2f}{max(total - decode, 0.0) / args.n * 1e6:17.2f}")
+    print(f"speedup : {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
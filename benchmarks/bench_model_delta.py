@@ -0,0 +1,57 @@
+"""Model delta size and encode/decode time for retrained models.
+
+A retrained model keeps the frozen encoder and changes the head, i.e. a run of
+bytes near the end. Without --model a random 300 KB model is used (worst case
+for compression of the unchanged part, so sizes are dominated by the change).
+
+    python benchmarks/bench_model_delta.py [--model path.tflite] [--changed 1024 4096 16384]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import model_delta
+
+
+def measure(base: bytes, target: bytes, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoded = model_delta.encode(base, target)
+    encode_s = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decoded = model_delta.decode(base, encoded)
+    decode_s = (time.perf_counter() - start) / repeat
+    assert decoded == target
+    return len(encoded), encode_s, decode_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='base model file (default: random bytes)')
+    parser.add_argument('--size', type=int, default=300 * 1024, help='random model size')
+    parser.add_argument('--changed', type=int, nargs='+', default=[1024, 4096, 16384, 65536],
+                        help='bytes rewritten at the end of the model')
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.model:
+        with open(args.model, 'rb') as f:
+            base = f.read()
+    else:
+        base = os.urandom(args.size)
+
+    size, encode_s, decode_s = measure(b'', base, args.repeat)
+    print(f"{'first push':<14}{len(base):>9} -> {size:>9} bytes   encode {encode_s * 1000:7.1f} ms   decode {decode_s * 1000:7.1f} ms")
+    for changed in args.changed:
+        changed = min(changed, len(base))
+        target = base[:-changed] + os.urandom(changed)
+        size, encode_s, decode_s = measure(base, target, args.repeat)
+        print(f"{f'{changed} changed':<14}{len(target):>9} -> {size:>9} bytes   encode {encode_s * 1000:7.1f} ms   decode {decode_s * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
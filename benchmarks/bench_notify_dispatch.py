@@ -0,0 +1,115 @@
+"""Notify callback cost per packet: legacy UUID lookups + string tree vs. handle dispatch table.
+
+Feeds inference/rawdata and inference/debugstr notifications (the bulk of the
+traffic) straight into Device._ble_notify_callback; queues are stubbed so only
+the callback itself is measured.
+
+    python benchmarks/bench_notify_dispatch.py [-n 200000]
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import device
+from dean_uuid import dean_service_dict, dean_service_lookup
+
+
+class NullQueue:
+    def __init__(self):
+        self.count = 0
+
+    def put(self, item):
+        self.count += 1
+
+
+def legacy_callback(self, sender, data):
+    # Former Device._ble_notify_callback, inference branch only
+    service_name = dean_service_lookup[sender.service_uuid]
+    char_name = dean_service_lookup[sender.uuid]
+    received_time = time.time()
+    try:
+        dean_entry, payload = device.known_deans.parse_upstream(
+            data, self.config_dict['address'], self.config_dict['type'], self.config_dict['location'])
+    except ValueError:
+        return
+    dean_mac = dean_entry.mac
+    location = dean_entry.location or self.config_dict['location']
+    device_type = dean_entry.device_type or self.config_dict['type']
+    if service_name == 'config':
+        pass
+    elif service_name == 'sound':
+        pass
+    elif service_name == 'inference':
+        if char_name == 'rawdata':
+            unpacked_data_list = list(struct.unpack('<BBBfffffB20b', payload))
+            if unpacked_data_list[0] == 1:
+                pass
+            else:
+                self.check_room_status(payload)
+                self.data_queue.put([location, device_type, dean_mac, service_name, char_name, received_time, payload])
+        elif char_name == 'predict':
+            pass
+        elif char_name == 'debugstr':
+            self.data_queue.put([location, device_type, dean_mac, service_name, char_name, received_time, payload])
+
+
+def make_device():
+    dev = device.Device.__new__(device.Device)
+    dev.config_dict = {'address': 'AA:AA:AA:AA:AA:01', 'type': 'DE&N_RELAY', 'name': '', 'location': 'bench'}
+    dev.data_queue = NullQueue()
+    dev.log_queue = NullQueue()
+    dev.sound_queue = NullQueue()
+    dev.notify_handlers = {}
+    return dev
+
+
+def make_packets(n):
+    service_uuid = dean_service_dict['inference']['service']
+    senders = [SimpleNamespace(handle=0x20 + i, uuid=dean_service_dict['inference'][name], service_uuid=service_uuid)
+               for i, name in enumerate(('rawdata', 'debugstr'))]
+    rawdata = struct.pack('<BBBfffffB20b', 0, 1, 2, 21.5, 40.0, 50.0, 400.0, 0.5, 3, *range(20))
+    debugstr = b'{"type":"DEBUG","event":"ENTER","value":1}'
+    packets = []
+    for i in range(n):
+        mac = bytes([0x11, 0x22, 0x33, 0x44, 0x55, i % 8])
+        packets.append((senders[0], bytearray(mac + rawdata)) if i % 4 else (senders[1], bytearray(mac + debugstr)))
+    return packets
+
+
+def bench(callback, packets):
+    start = time.perf_counter()
+    for sender, data in packets:
+        callback(sender, data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=200000, help='number of notifications')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs per variant (best is reported)')
+    args = parser.parse_args()
+    packets = make_packets(args.n)
+
+    legacy_dev = make_device()
+    dev = make_device()
+    for sender in {id(s): s for s, _ in packets}.values():
+        char_name = dean_service_lookup[sender.uuid]
+        dev.notify_handlers[sender.handle] = getattr(dev, dev.notify_handler_names[('inference', char_name)])
+
+    legacy = current = float('inf')
+    for _ in range(args.repeat):
+        legacy = min(legacy, bench(lambda sender, data: legacy_callback(legacy_dev, sender, data), packets))
+        current = min(current, bench(dev._ble_notify_callback, packets))
+
+    print(f"packets            : {args.n}")
+    print(f"legacy  ns/packet  : {legacy / args.n * 1e9:10.0f}")
+    print(f"current ns/packet  : {current / args.n * 1e9:10.0f}  ({legacy / current:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from typing import Iterable, Iterator
+
+# Block-compressed file: header, independently zlib-compressed blocks, a block
+# index and a footer pointing at the index. Reading a byte range only
+# decompresses the blocks that overlap it.
+BLOCK_SUFFIX = '.blk'
+# Lines that arrive for a day after it was compacted, merged by the next compaction.
+# A sidecar starts with a preamble giving the length of the file header written
+# behind it, so the merge drops exactly that header and never a data line.
+LATE_SUFFIX = '.late'
+LATE_MAGIC = b'SLIMLAT1'
+BLOCK_MAGIC = b'SLIMBLK1'
+DEFAULT_BLOCK_SIZE = 64 * 1024
+_HEADER = struct.Struct('<8sI')
+_INDEX_ENTRY = struct.Struct('<QQII')      # raw offset, compressed offset, compressed length, raw length
+_FOOTER = struct.Struct('<QI8s')           # index offset, block count, magic
+_LATE_PREAMBLE = struct.Struct('<8sI')     # magic, header length
+
+
+def block_path(path: str) -> str:
+    return path + BLOCK_SUFFIX
+
+
+def late_path(path: str) -> str:
+    return path + LATE_SUFFIX
+
+
+def late_preamble(header_length: int) -> bytes:
+    return _LATE_PREAMBLE.pack(LATE_MAGIC, header_length)
+
+
+def split_late(data: bytes):
+    """(header, lines) of the contents of a late sidecar."""
+    if len(data) < _LATE_PREAMBLE.size:
+        return b'', b''
+    magic, header_length = _LATE_PREAMBLE.unpack_from(data)
+    if magic != LATE_MAGIC:
+        raise ValueError("not a late sidecar")
+    start = _LATE_PREAMBLE.size
+    return data[start:start + header_length], data[start + header_length:]
+
+
+def _chunked(stream, block_size: int) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(block_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_block_file(dst: str, chunks: Iterable[bytes], block_size: int = DEFAULT_BLOCK_SIZE, level: int = 6) -> int:
+    """Write chunks to dst as a block file through a temporary file; returns the raw size."""
+    tmp = dst + '.tmp'
+    entries = []
+    raw_offset = 0
+    pending = b''
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(BLOCK_MAGIC, block_size))
+
+        def emit(block):
+            nonlocal raw_offset
+            compressed = zlib.compress(block, level)
+            entries.append((raw_offset, f.tell(), len(compressed), len(block)))
+            f.write(compressed)
+            raw_offset += len(block)
+
+        for chunk in chunks:
+            pending += chunk
+            while len(pending) >= block_size:
+                emit(pending[:block_size])
+                pending = pending[block_size:]
+        if pending:
+            emit(pending)
+        index_offset = f.tell()
+        for entry in entries:
+            f.write(_INDEX_ENTRY.pack(*entry))
+        f.write(_FOOTER.pack(index_offset, len(entries), BLOCK_MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, dst)
+    return raw_offset
+
+
+def compress_file(src: str, dst: str = None, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    dst = dst or block_path(src)
+    with open(src, 'rb') as f:
+        return write_block_file(dst, _chunked(f, block_size), block_size)
+
+
+class BlockReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, self.block_size = _HEADER.unpack(self.file.read(_HEADER.size))
+        if magic != BLOCK_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a block file")
+        self.file.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, count, magic = _FOOTER.unpack(self.file.read(_FOOTER.size))
+        if magic != BLOCK_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} has no block index")
+        self.file.seek(index_offset)
+        raw_index = self.file.read(count * _INDEX_ENTRY.size)
+        self.entries = [_INDEX_ENTRY.unpack_from(raw_index, i * _INDEX_ENTRY.size) for i in range(count)]
+        self._raw_offsets = [entry[0] for entry in self.entries]
+        self.size = self.entries[-1][0] + self.entries[-1][3] if self.entries else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _block(self, i: int) -> bytes:
+        _, offset, length, _ = self.entries[i]
+        self.file.seek(offset)
+        return zlib.decompress(self.file.read(length))
+
+    def iter_blocks(self) -> Iterator[bytes]:
+        for i in range(len(self.entries)):
+            yield self._block(i)
+
+    def read(self, offset: int, length: int) -> bytes:
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first = bisect_right(self._raw_offsets, offset) - 1
+        parts = []
+        for i in range(first, len(self.entries)):
+            raw_offset = self.entries[i][0]
+            if raw_offset >= end:
+                break
+            block = self._block(i)
+            parts.append(block[max(0, offset - raw_offset):end - raw_offset])
+        return b''.join(parts)
+
+    def read_all(self) -> bytes:
+        return b''.join(self.iter_blocks())
+
+    def close(self):
+        self.file.close()
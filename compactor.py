@@ -0,0 +1,173 @@
+import os
+import re
+import fcntl
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import data_index
+import record_store
+from block_file import BLOCK_SUFFIX, LATE_SUFFIX, BlockReader, block_path, compress_file, late_path, split_late, write_block_file
+
+# Daily files written by DataProcess / LogProcess: <YYYY-MM-DD>.txt and <YYYY-MM-DD>.bin,
+# plus the .late sidecar holding lines written after the day was compacted
+DAY_FILE = re.compile(r'^(\d{4}-\d{2}-\d{2})\.(txt|bin)(' + re.escape(LATE_SUFFIX) + ')?$')
+DAY_BLOCK_FILE = re.compile(r'^(\d{4}-\d{2}-\d{2})\.(txt|bin)' + re.escape(BLOCK_SUFFIX) + '$')
+FEATURES_DONE = '.compressed'
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _merge_late_lines(path: str, day_path: str, dst: str):
+    # Lines arrived for a day that was already compacted: append them to the block file
+    old = b''
+    if os.path.exists(dst):
+        with BlockReader(dst) as reader:
+            old = reader.read_all()
+    with open(path, 'rb') as f:
+        new = f.read()
+    if path != day_path:
+        # Only the header the writer recorded in the sidecar is dropped
+        header, new = split_late(new)
+        if not old:
+            new = header + new
+    elif day_path.endswith(record_store.STORE_SUFFIX) and old[:record_store.HEADER_SIZE] == new[:record_store.HEADER_SIZE]:
+        # A daily store file recreated next to its block file by an older writer
+        new = new[record_store.HEADER_SIZE:]
+    data = old + new
+    write_block_file(dst, [data])
+    if os.path.isfile(data_index.index_path(day_path)):
+        data_index.save_offsets(day_path, data_index.rebuild_offsets(data))
+
+
+def compact_day_file(path: str) -> int:
+    """Replace one closed daily file (or its late sidecar) with its block-compressed copy;
+    returns bytes saved. The minute index sidecar stays valid as it holds uncompressed offsets.
+    The file is locked from the read through its removal, as AppendWriter.flush() locks it
+    around appends, so no late line lands in a file that is about to be removed."""
+    day_path = path[:-len(LATE_SUFFIX)] if path.endswith(LATE_SUFFIX) else path
+    dst = block_path(day_path)
+    with open(path, 'rb') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        stat = os.fstat(f.fileno())
+        if stat.st_nlink == 0:
+            # Removed by another pass while we waited for the lock
+            return 0
+        raw_size = stat.st_size
+        if os.path.exists(dst) or path != day_path:
+            _merge_late_lines(path, day_path, dst)
+        else:
+            compress_file(path, dst)
+        os.remove(path)
+    return raw_size - os.path.getsize(dst)
+
+
+def compact_data_tree(data_root: str, today: Optional[str] = None, grace: float = 600.0) -> Tuple[int, int]:
+    """Compact every daily file older than today that has not been written for grace seconds."""
+    today = today or _today()
+    now = time.time()
+    files = saved = 0
+    for dirpath, _, filenames in os.walk(data_root):
+        for filename in filenames:
+            match = DAY_FILE.match(filename)
+            if not match or match.group(1) >= today:
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                if now - os.path.getmtime(path) < grace:
+                    continue
+                saved += compact_day_file(path)
+                files += 1
+            except (OSError, ValueError) as e:
+                logging.warning("Compaction of %s failed: %s", path, e)
+    return files, saved
+
+
+def compact_feature_tree(datasets_root: str, today: Optional[str] = None) -> Tuple[int, int]:
+    """Re-save the .npz feature dumps of closed days with compression."""
+    today = today or _today()
+    files = saved = 0
+    if not os.path.isdir(datasets_root):
+        return files, saved
+    for address in os.listdir(datasets_root):
+        features_dir = os.path.join(datasets_root, address, "features")
+        if not os.path.isdir(features_dir):
+            continue
+        for day in os.listdir(features_dir):
+            day_dir = os.path.join(features_dir, day)
+            marker = os.path.join(day_dir, FEATURES_DONE)
+            if day >= today or not os.path.isdir(day_dir) or os.path.exists(marker):
+                continue
+            for filename in os.listdir(day_dir):
+                if not filename.endswith('.npz'):
+                    continue
+                path = os.path.join(day_dir, filename)
+                tmp = path + '.tmp'
+                try:
+                    raw_size = os.path.getsize(path)
+                    with np.load(path) as npz:
+                        arrays = {key: npz[key] for key in npz.files}
+                    with open(tmp, 'wb') as f:
+                        np.savez_compressed(f, **arrays)
+                    os.replace(tmp, path)
+                    saved += raw_size - os.path.getsize(path)
+                    files += 1
+                except (OSError, ValueError) as e:
+                    logging.warning("Compression of %s failed: %s", path, e)
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            open(marker, 'w').close()
+    return files, saved
+
+
+def _tree_size(root: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def enforce_disk_budget(roots: List[str], budget_bytes: int, today: Optional[str] = None) -> int:
+    """Delete the oldest compacted days until the trees fit in budget_bytes; returns bytes freed.
+    Only closed days are ever removed, so today's data is kept even over budget."""
+    if budget_bytes <= 0:
+        return 0
+    today = today or _today()
+    total = sum(_tree_size(root) for root in roots if os.path.isdir(root))
+    if total <= budget_bytes:
+        return 0
+
+    days: Dict[str, List[str]] = {}
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                match = DAY_BLOCK_FILE.match(filename)
+                if match and match.group(1) < today:
+                    path = os.path.join(dirpath, filename[:-len(BLOCK_SUFFIX)])
+                    days.setdefault(match.group(1), []).extend([block_path(path), data_index.index_path(path), late_path(path)])
+            day = os.path.basename(dirpath)
+            if os.path.basename(os.path.dirname(dirpath)) == "features" and day < today:
+                days.setdefault(day, []).extend(os.path.join(dirpath, filename) for filename in filenames)
+
+    freed = 0
+    for day in sorted(days):
+        if total - freed <= budget_bytes:
+            break
+        for path in days[day]:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+        logging.info("Disk budget: removed data of %s", day)
+    return freed
@@ -0,0 +1,151 @@
+import os
+import re
+import struct
+from array import array
+from datetime import datetime
+from typing import List, Optional
+
+from block_file import BlockReader, block_path
+
+# Sidecar <date>.txt.idx: one little-endian uint64 per minute of the day holding
+# (byte offset of the first line written in that minute) + 1, or 0 if none.
+INDEX_SUFFIX = '.idx'
+MINUTES_PER_DAY = 24 * 60
+_ENTRY = struct.Struct('<Q')
+
+
+def index_path(data_path: str) -> str:
+    return data_path + INDEX_SUFFIX
+
+
+def minute_of_day(value) -> int:
+    if not isinstance(value, datetime):
+        value = datetime.fromtimestamp(value)
+    return value.hour * 60 + value.minute
+
+
+def load_offsets(data_path: str) -> array:
+    offsets = array('Q')
+    path = index_path(data_path)
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            raw = f.read(MINUTES_PER_DAY * _ENTRY.size)
+        raw = raw[:len(raw) - len(raw) % _ENTRY.size]
+        offsets.frombytes(raw)
+    if len(offsets) < MINUTES_PER_DAY:
+        offsets.extend([0] * (MINUTES_PER_DAY - len(offsets)))
+    return offsets
+
+
+class MinuteIndex:
+    """Writer-side minute index of one daily file.
+
+    Offsets are recorded while lines are buffered and written to the sidecar only
+    after the data itself has been flushed, so an entry never points past the end
+    of the file.
+    """
+
+    def __init__(self, data_path: str):
+        self.path = index_path(data_path)
+        self.offsets = load_offsets(data_path)
+        self.pending = {}
+        self.fd = None
+
+    def mark(self, minute: int, offset: int):
+        if not self.offsets[minute] and minute not in self.pending:
+            self.pending[minute] = offset
+
+    def discard_pending(self):
+        self.pending = {}
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        for minute, offset in self.pending.items():
+            os.pwrite(self.fd, _ENTRY.pack(offset + 1), minute * _ENTRY.size)
+            self.offsets[minute] = offset + 1
+        self.pending = {}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _byte_range(offsets: array, start_minute: int, end_minute: int, file_size: int):
+    start = None
+    for minute in range(start_minute, end_minute + 1):
+        if offsets[minute]:
+            start = offsets[minute] - 1
+            break
+    if start is None:
+        return None
+    end = file_size
+    for minute in range(end_minute + 1, MINUTES_PER_DAY):
+        if offsets[minute]:
+            end = offsets[minute] - 1
+            break
+    return start, end
+
+
+_LINE_TIME = re.compile(rb'\d{4}-\d{2}-\d{2} (\d{2}):(\d{2}):\d{2}')
+
+
+def rebuild_offsets(data: bytes) -> array:
+    """Recompute the minute index of a whole file from the timestamps in its lines."""
+    offsets = array('Q', [0] * MINUTES_PER_DAY)
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        match = _LINE_TIME.search(line)
+        if match:
+            minute = int(match.group(1)) * 60 + int(match.group(2))
+            if minute < MINUTES_PER_DAY and not offsets[minute]:
+                offsets[minute] = offset + 1
+        offset += len(line)
+    return offsets
+
+
+def save_offsets(data_path: str, offsets: array):
+    with open(index_path(data_path), 'wb') as f:
+        f.write(offsets.tobytes())
+
+
+def read_range_bytes(data_path: str, start, end) -> bytes:
+    """Raw bytes of the lines written from the minute of start through the minute
+    of end (inclusive) of one daily file, found by seeking through the index.
+    Days already compacted into a block file are read the same way; the index then
+    describes the block file, and any daily file beside it only holds late lines
+    the next compaction merges."""
+    offsets = load_offsets(data_path)
+    start_minute, end_minute = minute_of_day(start), minute_of_day(end)
+    if os.path.isfile(block_path(data_path)):
+        with BlockReader(block_path(data_path)) as reader:
+            byte_range = _byte_range(offsets, start_minute, end_minute, reader.size)
+            if byte_range is None:
+                return b''
+            data = reader.read(byte_range[0], byte_range[1] - byte_range[0])
+    elif os.path.isfile(data_path):
+        with open(data_path, 'rb') as f:
+            file_size = f.seek(0, os.SEEK_END)
+            byte_range = _byte_range(offsets, start_minute, end_minute, file_size)
+            if byte_range is None:
+                return b''
+            f.seek(byte_range[0])
+            data = f.read(byte_range[1] - byte_range[0])
+    else:
+        return b''
+    # Drop a line that is still being appended
+    return data[:data.rfind(b'\n') + 1]
+
+
+def read_range(data_path: str, start, end) -> List[str]:
+    """Lines of one daily file between two times (minute granularity)."""
+    return read_range_bytes(data_path, start, end).decode('utf-8').splitlines()
+
+
+def read_last_minutes(data_path: str, minutes: int, now: Optional[datetime] = None) -> List[str]:
+    now = now or datetime.now()
+    start = max(0, minute_of_day(now) - minutes + 1)
+    return read_range(data_path, now.replace(hour=start // 60, minute=start % 60), now)
@@ -0,0 +1,300 @@
+import os
+import fcntl
+import struct
+import time
+import logging
+from typing import Dict, List, Optional
+
+from block_file import block_path, late_path, late_preamble
+from data_index import MinuteIndex
+
+# Journal layout: repeated [entry header][path][data], closed by a trailer.
+# A journal without a valid trailer was torn before any data file was touched.
+JOURNAL_MAGIC = b'SHJ1'
+_JOURNAL_ENTRY = struct.Struct('<HQI')      # path length, file offset, data length
+_JOURNAL_TRAILER = struct.Struct('<4sI')    # magic, entry count
+
+
+def _append_target(path: str) -> str:
+    # A compacted day is never recreated: readers would take the new file for the
+    # whole day. Its late lines go to a sidecar the compactor merges instead.
+    if not os.path.exists(path) and os.path.exists(block_path(path)):
+        return late_path(path)
+    return path
+
+
+class _AppendHandle:
+    __slots__ = ('path', 'file_path', 'file', 'size', 'committed', 'pending', 'last_used', 'index', 'header')
+
+    def __init__(self, path: str, file_path: str, file):
+        self.path = path
+        # File actually appended to: path, or its late sidecar
+        self.file_path = file_path
+        self.file = file
+        self.committed = os.fstat(file.fileno()).st_size
+        self.size = self.committed
+        self.pending: List[bytes] = []
+        self.last_used = time.monotonic()
+        self.index: Optional[MinuteIndex] = None
+        # Header of the file, written again whenever the file starts empty
+        self.header = b''
+
+
+class AppendWriter:
+    """Keeps daily files open in append mode and writes buffered lines in batches.
+
+    Each flush is recorded in a redo journal before the data files are touched,
+    so a crash in the middle of a flush never leaves a torn line behind.
+    """
+
+    def __init__(self, journal_path: Optional[str] = None, flush_interval: float = 1.0,
+                 flush_bytes: int = 64 * 1024, max_open: int = 64, idle_close: float = 300.0,
+                 sync: bool = True):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_open = max_open
+        self.idle_close = idle_close
+        self.sync = sync
+        self._handles: Dict[str, _AppendHandle] = {}
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    # ---- recovery ----
+
+    def recover(self) -> int:
+        if not self.journal_path or not os.path.isfile(self.journal_path):
+            return 0
+        with open(self.journal_path, 'rb') as f:
+            journal = f.read()
+        entries = self._parse_journal(journal)
+        if entries is None:
+            if journal:
+                logging.warning("Discarding torn data writer journal %s", self.journal_path)
+            self._clear_journal()
+            return 0
+        for path, offset, data in entries:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                mode = 'r+b' if os.path.exists(path) else 'w+b'
+                with open(path, mode) as f:
+                    size = f.seek(0, os.SEEK_END)
+                    if size < offset:
+                        logging.warning("Journal replay skipped for %s: file shorter than %d bytes", path, offset)
+                        continue
+                    f.truncate(offset)
+                    f.seek(offset)
+                    f.write(data)
+                    f.flush()
+                    if self.sync:
+                        os.fsync(f.fileno())
+            except OSError as e:
+                logging.warning("Journal replay failed for %s: %s", path, e)
+        logging.info("Replayed %d journal entries from %s", len(entries), self.journal_path)
+        self._clear_journal()
+        return len(entries)
+
+    @staticmethod
+    def _parse_journal(journal: bytes):
+        if len(journal) < _JOURNAL_TRAILER.size:
+            return None
+        magic, count = _JOURNAL_TRAILER.unpack_from(journal, len(journal) - _JOURNAL_TRAILER.size)
+        if magic != JOURNAL_MAGIC:
+            return None
+        entries = []
+        pos = 0
+        end = len(journal) - _JOURNAL_TRAILER.size
+        for _ in range(count):
+            if pos + _JOURNAL_ENTRY.size > end:
+                return None
+            path_len, offset, data_len = _JOURNAL_ENTRY.unpack_from(journal, pos)
+            pos += _JOURNAL_ENTRY.size
+            if pos + path_len + data_len > end:
+                return None
+            path = journal[pos:pos + path_len].decode('utf-8')
+            pos += path_len
+            entries.append((path, offset, journal[pos:pos + data_len]))
+            pos += data_len
+        if pos != end:
+            return None
+        return entries
+
+    def _write_journal(self, handles: List[_AppendHandle]):
+        parts = []
+        for handle in handles:
+            path_bytes = handle.file_path.encode('utf-8')
+            data = b''.join(handle.pending)
+            handle.pending = [data]
+            parts.append(_JOURNAL_ENTRY.pack(len(path_bytes), handle.committed, len(data)))
+            parts.append(path_bytes)
+            parts.append(data)
+        parts.append(_JOURNAL_TRAILER.pack(JOURNAL_MAGIC, len(handles)))
+        with open(self.journal_path, 'wb') as f:
+            f.write(b''.join(parts))
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+
+    def _clear_journal(self):
+        with open(self.journal_path, 'wb') as f:
+            if self.sync:
+                os.fsync(f.fileno())
+
+    # ---- handles ----
+
+    def _handle(self, path: str) -> _AppendHandle:
+        handle = self._handles.get(path)
+        if handle is None:
+            if len(self._handles) >= self.max_open:
+                self._evict_lru()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_path = _append_target(path)
+            handle = _AppendHandle(path, file_path, open(file_path, 'ab'))
+            self._handles[path] = handle
+        handle.last_used = time.monotonic()
+        return handle
+
+    def _evict_lru(self):
+        lru = min(self._handles.values(), key=lambda h: h.last_used)
+        if lru.pending:
+            self.flush()
+        self._close_handle(lru)
+
+    def _close_handle(self, handle: _AppendHandle):
+        self._handles.pop(handle.path, None)
+        try:
+            if handle.index is not None:
+                handle.index.close()
+            handle.file.close()
+        except OSError as e:
+            logging.warning("Failed to close %s: %s", handle.path, e)
+
+    # ---- writes ----
+
+    def write(self, path: str, data: bytes, header: bytes = b'', minute: Optional[int] = None):
+        self.write_many(path, [data], header=header, minutes=None if minute is None else [minute])
+
+    def write_many(self, path: str, chunks: List[bytes], header: bytes = b'', minutes: Optional[List[Optional[int]]] = None):
+        # minutes, when given, holds the minute of day of each chunk for the sidecar index
+        if not chunks:
+            return
+        handle = self._handle(path)
+        if header:
+            handle.header = header
+        start = self._file_start(handle) if handle.size == 0 else b''
+        if start:
+            handle.pending.append(start)
+            handle.size += len(start)
+            self._pending_bytes += len(start)
+        # Late sidecar lines are indexed when the compactor merges them
+        if handle.file_path == path and minutes is not None and any(minute is not None for minute in minutes):
+            if handle.index is None:
+                handle.index = MinuteIndex(path)
+            offset = handle.size
+            for chunk, minute in zip(chunks, minutes):
+                if minute is not None:
+                    handle.index.mark(minute, offset)
+                offset += len(chunk)
+        data = b''.join(chunks)
+        handle.pending.append(data)
+        handle.size += len(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= self.flush_bytes:
+            self.flush()
+
+    def size_of(self, path: str) -> int:
+        return self._handle(path).size
+
+    def next_flush_delay(self) -> Optional[float]:
+        if self._pending_bytes == 0:
+            # Wake up once in a while to close idle handles
+            return self.idle_close if self._handles else None
+        return max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _lock_for_append(self, handle: _AppendHandle):
+        # The compactor removes closed daily files (and merged sidecars) while holding
+        # the same advisory lock, so a file still linked once locked stays so until
+        # the append is done. Late lines for a removed file go to a new sidecar,
+        # which starts with the file header again.
+        fcntl.flock(handle.file.fileno(), fcntl.LOCK_EX)
+        while os.fstat(handle.file.fileno()).st_nlink == 0:
+            self._reopen(handle)
+            fcntl.flock(handle.file.fileno(), fcntl.LOCK_EX)
+
+    @staticmethod
+    def _file_start(handle: _AppendHandle) -> bytes:
+        # A new file begins with its header; a late sidecar also records the header length
+        if handle.file_path != handle.path:
+            return late_preamble(len(handle.header)) + handle.header
+        return handle.header
+
+    def _reopen(self, handle: _AppendHandle):
+        handle.file.close()
+        handle.file_path = _append_target(handle.path)
+        handle.file = open(handle.file_path, 'ab')
+        handle.committed = os.fstat(handle.file.fileno()).st_size
+        start = self._file_start(handle) if handle.committed == 0 else b''
+        if start:
+            handle.pending.insert(0, start)
+            self._pending_bytes += len(start)
+        handle.size = handle.committed + sum(len(data) for data in handle.pending)
+        if handle.index is not None:
+            # Offsets marked for the removed file would point into the block file
+            handle.index.discard_pending()
+            handle.index.close()
+            handle.index = None
+
+    def flush(self):
+        dirty = [h for h in self._handles.values() if h.pending]
+        self._last_flush = time.monotonic()
+        if not dirty:
+            self._close_idle()
+            return
+        locked = []
+        try:
+            for handle in dirty:
+                self._lock_for_append(handle)
+                locked.append(handle)
+            if self.journal_path:
+                self._write_journal(dirty)
+            for handle in dirty:
+                data = b''.join(handle.pending)
+                try:
+                    handle.file.write(data)
+                    handle.file.flush()
+                    if self.sync:
+                        os.fsync(handle.file.fileno())
+                except OSError as e:
+                    logging.warning("Append to %s failed: %s", handle.path, e)
+                    handle.size = handle.committed
+                    if handle.index is not None:
+                        handle.index.discard_pending()
+                else:
+                    handle.committed += len(data)
+                    if handle.index is not None:
+                        try:
+                            handle.index.flush()
+                        except OSError as e:
+                            logging.warning("Index update for %s failed: %s", handle.path, e)
+                handle.pending = []
+        finally:
+            for handle in locked:
+                fcntl.flock(handle.file.fileno(), fcntl.LOCK_UN)
+        self._pending_bytes = 0
+        if self.journal_path:
+            self._clear_journal()
+        self._close_idle()
+
+    def _close_idle(self):
+        deadline = time.monotonic() - self.idle_close
+        for handle in [h for h in self._handles.values() if h.last_used < deadline]:
+            self._close_handle(handle)
+
+    def close(self):
+        self.flush()
+        for handle in list(self._handles.values()):
+            self._close_handle(handle)
@@ -1,6 +1,6 @@
 import string
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, Iterable, Optional, Tuple
 
 MAC_PREFIX_LEN = 6
@@ -56,57 +56,117 @@ class KnownDean:
     location: str = ""
     last_seen: float = 0.0
     connected: bool = False
+    # Raw 6-byte prefix: the upstream lookup key and the downstream prefix
+    mac_bytes: bytes = field(default=b"", repr=False)
+
+    def __post_init__(self):
+        if not self.mac_bytes:
+            self.mac_bytes = mac_str_to_bytes(self.mac)
 
 
 class KnownDeanTable:
+    # Cached identifier spellings; CLI and callers use a handful per DEAN
+    canonical_cache_size = 4096
+
     def __init__(self):
         self._entries: Dict[str, KnownDean] = {}
+        # raw MAC prefix -> entry, for upstream packets
+        self._by_prefix: Dict[bytes, KnownDean] = {}
+        # relay address -> {DEAN MAC: entry}, kept in step with entry.relay_address
+        self._by_relay: Dict[str, Dict[str, KnownDean]] = {}
+        # identifier as given -> canonical MAC (None if not a MAC)
+        self._canonical: Dict[str, Optional[str]] = {}
+
+    def canonical(self, mac) -> Optional[str]:
+        """Canonical 'AA:BB:..' form of mac, or None; cached per spelling."""
+        if not isinstance(mac, str):
+            return try_normalize_mac_string(mac)
+        try:
+            return self._canonical[mac]
+        except KeyError:
+            pass
+        if len(self._canonical) >= self.canonical_cache_size:
+            self._canonical.clear()
+        normalized = self._canonical[mac] = try_normalize_mac_string(mac)
+        return normalized
 
     def _get_entry(self, mac: str) -> Optional[KnownDean]:
-        normalized = try_normalize_mac_string(mac)
+        normalized = self.canonical(mac)
         if normalized is None:
             return None
         return self._entries.get(normalized)
 
-    def observe(self, mac_bytes: bytes, relay_address: str, device_type: str, location_hint: str = "") -> KnownDean:
-        mac_str = mac_bytes_to_str(mac_bytes)
-        entry = self._entries.get(mac_str)
-        if entry is None:
-            entry = KnownDean(mac=mac_str, relay_address=relay_address, device_type=device_type)
-            self._entries[mac_str] = entry
+    def _add(self, entry: KnownDean):
+        self._entries[entry.mac] = entry
+        self._by_prefix[entry.mac_bytes] = entry
+
+    def _set_relay(self, entry: KnownDean, relay_address: str):
+        # A DEAN whose relay is not known yet is left out of _by_relay until it is
+        if entry.relay_address == relay_address and (not relay_address or entry.mac in self._by_relay.get(relay_address, ())):
+            return
+        previous = self._by_relay.get(entry.relay_address) if entry.relay_address else None
+        if previous is not None:
+            previous.pop(entry.mac, None)
+            if not previous:
+                del self._by_relay[entry.relay_address]
         entry.relay_address = relay_address
+        if relay_address:
+            self._by_relay.setdefault(relay_address, {})[entry.mac] = entry
+
+    def observe(self, mac_bytes: bytes, relay_address: str, device_type: str, location_hint: str = "",
+                received_time: Optional[float] = None) -> KnownDean:
+        mac_bytes = bytes(mac_bytes)
+        entry = self._by_prefix.get(mac_bytes)
+        if entry is None:
+            entry = KnownDean(mac=mac_bytes_to_str(mac_bytes), relay_address=relay_address,
+                              device_type=device_type, mac_bytes=mac_bytes)
+            self._add(entry)
+        self._set_relay(entry, relay_address)
         entry.device_type = device_type or entry.device_type
-        entry.last_seen = time.time()
+        entry.last_seen = received_time if received_time is not None else time.time()
         entry.connected = True
         if location_hint and not entry.location:
             entry.location = location_hint
         return entry
 
     def ensure(self, mac: str, relay_address: str = "", device_type: str = "", location_hint: str = "") -> KnownDean:
-        normalized = normalize_mac_string(mac)
+        normalized = self.canonical(mac)
+        if normalized is None:
+            raise ValueError(f"Invalid MAC string: {mac}")
         entry = self._entries.get(normalized)
         if entry is None:
             entry = KnownDean(mac=normalized, relay_address=relay_address, device_type=device_type)
-            self._entries[normalized] = entry
-        if relay_address:
-            entry.relay_address = relay_address
+            self._add(entry)
+            self._set_relay(entry, relay_address)
+        elif relay_address:
+            self._set_relay(entry, relay_address)
         if device_type and not entry.device_type:
             entry.device_type = device_type
         if location_hint and not entry.location:
             entry.location = location_hint
         return entry
 
-    def parse_upstream(self, packet: bytes, relay_address: str, device_type: str, location_hint: str = "") -> Tuple[KnownDean, bytes]:
+    def parse_upstream(self, packet: bytes, relay_address: str, device_type: str, location_hint: str = "",
+                       received_time: Optional[float] = None) -> Tuple[KnownDean, bytes]:
         if len(packet) < MAC_PREFIX_LEN:
             raise ValueError("Packet shorter than MAC prefix")
         mac_bytes = packet[:MAC_PREFIX_LEN]
-        payload = packet[MAC_PREFIX_LEN:]
-        entry = self.observe(mac_bytes, relay_address, device_type, location_hint)
-        return entry, payload
+        if not isinstance(mac_bytes, bytes):
+            mac_bytes = bytes(mac_bytes)
+        entry = self._by_prefix.get(mac_bytes)
+        # Known DEAN, same relay and nothing to fill in: only last_seen changes
+        if (entry is None or not entry.connected or entry.relay_address != relay_address
+                or (device_type and entry.device_type != device_type) or (location_hint and not entry.location)):
+            entry = self.observe(mac_bytes, relay_address, device_type, location_hint, received_time)
+        else:
+            entry.last_seen = received_time if received_time is not None else time.time()
+        return entry, packet[MAC_PREFIX_LEN:]
 
     def build_downstream(self, mac: str, payload: bytes) -> bytes:
-        mac_bytes = mac_str_to_bytes(mac)
-        return mac_bytes + payload
+        entry = self._entries.get(mac)
+        if entry is not None:
+            return entry.mac_bytes + payload
+        return mac_str_to_bytes(mac) + payload
 
     def get(self, mac: str) -> Optional[KnownDean]:
         return self._get_entry(mac)
@@ -118,8 +178,13 @@ class KnownDeanTable:
     def iter_entries(self) -> Iterable[KnownDean]:
         return list(self._entries.values())
 
+    def deans_on(self, relay_address: str) -> Iterable[KnownDean]:
+        return list(self._by_relay.get(relay_address, {}).values())
+
+    def iter_by_relay(self) -> Iterable[Tuple[str, Iterable[KnownDean]]]:
+        return [(relay_address, list(entries.values())) for relay_address, entries in self._by_relay.items()]
+
     def mark_disconnected(self, relay_address: str):
-        for entry in self._entries.values():
-            if entry.relay_address == relay_address:
-                entry.connected = False
+        for entry in self._by_relay.get(relay_address, {}).values():
+            entry.connected = False
 
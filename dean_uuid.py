@@ -132,4 +132,15 @@ dean_service_lookup = {
     DEAN_UUID_INFERENCE_RAWDATA_CHAR:       'rawdata',
     DEAN_UUID_INFERENCE_PREDICT_CHAR:       'predict',
     DEAN_UUID_INFERENCE_DEBUG_STRING_CHAR:  'debugstr',
-}
\ No newline at end of file
+}
+
+# Compact ids for (service, characteristic) pairs, used by fixed-width record transports
+dean_char_id = {}
+dean_char_by_id = {}
+for _service_name, _char_dict in dean_service_dict.items():
+    for _char_name in _char_dict:
+        if _char_name == 'service':
+            continue
+        _char_id = len(dean_char_by_id) + 1
+        dean_char_id[(_service_name, _char_name)] = _char_id
+        dean_char_by_id[_char_id] = (_service_name, _char_name)
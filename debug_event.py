@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+# Kinds of inference/debugstr messages shown on the display
+SOUND = 'SOUND'
+ENV = 'ENV'
+ENTER = 'ENTER'
+EXIT = 'EXIT'
+INFERENCE = 'INFERENCE'
+HEAPPRINT = 'HEAPPRINT'
+
+_DEBUG_EVENTS = (SOUND, ENV, ENTER, EXIT)
+
+
+class DebugEvent(NamedTuple):
+    # Same leading fields as a queue item, so item[2] is still the DEAN MAC
+    location: str
+    device_type: str
+    address: str
+    kind: Optional[str]         # None for messages the display does not show
+    received_time: float
+    timestamp: str              # "%Y-%m-%d %H:%M:%S" of received_time
+    fields: Optional[dict]      # parsed JSON with "timestamp" set, None if not JSON
+    text: str                   # decoded debug string
+
+    def data_line(self) -> str:
+        # Line stored in data/<...>/inference/debugstr/<date>.txt
+        if self.fields is None:
+            return f"{self.timestamp},{self.text.rstrip(chr(10))}\n"
+        return json.dumps(self.fields, ensure_ascii=False) + "\n"
+
+
+def _kind(fields: dict) -> Optional[str]:
+    msg_type = fields.get('type')
+    if msg_type == 'DEBUG':
+        event = fields.get('event')
+        return event if event in _DEBUG_EVENTS else None
+    if msg_type in (INFERENCE, HEAPPRINT):
+        return msg_type
+    return None
+
+
+def decode_debugstr(location: str, device_type: str, address: str, received_time: float, data) -> DebugEvent:
+    """Decode one debugstr notification; the JSON is parsed here and nowhere else."""
+    text = data.decode('utf-8') if isinstance(data, (bytes, bytearray)) else str(data)
+    timestamp = datetime.fromtimestamp(received_time).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        fields = json.loads(text)
+    except json.JSONDecodeError:
+        fields = None
+    if not isinstance(fields, dict):
+        return DebugEvent(location, device_type, address, None, received_time, timestamp, None, text)
+    fields["timestamp"] = timestamp
+    return DebugEvent(location, device_type, address, _kind(fields), received_time, timestamp, fields, text)
@@ -9,52 +9,147 @@ import numpy as np
 import time
 import struct
 import json
+import hashlib
 import logging
+import mmap
 from dataclasses import dataclass
+from typing import Optional
 
 from dean_uuid import *
 from packet import *
-from dean_identity import KnownDeanTable, try_normalize_mac_string
+from dean_identity import MAC_PREFIX_LEN, KnownDeanTable
+from gatt_activation import plan_activation, run_plan
+from gatt_writes import GattWriteScheduler, WRITE_BULK, WRITE_CONFIG, WRITE_CONTROL, WRITE_UNITSPACE
+from transfer import TransferProgressStore, WindowedSender
+from rollout import ModelRollout
+import model_delta
 from unitspace_manager import UnitspaceManager
 from unitspace_manager_with_timestamp import UnitspaceManager_new_new
 
 connected_devices = {}
 known_deans = KnownDeanTable()
+transfer_progress = TransferProgressStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "programdata", "transfers"))
 
 def get_device_by_address(address):
+    # Relay address, or a DEAN MAC in any spelling (canonical form cached in known_deans)
     device = connected_devices.get(address, None)
     if device is not None:
         return device
-    entry = known_deans.get(address)
-    if entry is None:
+    relay_address = known_deans.relay_for(address)
+    if relay_address is None:
         return None
-    return connected_devices.get(entry.relay_address, None)
+    return connected_devices.get(relay_address, None)
 
 class DeviceError(Exception):
     pass
 
+# inference/rawdata payload
+_RAWDATA = struct.Struct('<BBBfffffB20b')
+
 # unitspace_manager = UnitspaceManager()
 # unitspace_manager = UnitspaceManager_new()
 unitspace_manager = UnitspaceManager_new_new()
 
 @dataclass
-class FileTransferState:
+class TransferState:
     path: str = ''
     size: int = 0
     seq: int = 0
     sending: bool = False
+    # Payload loaded once per transfer; chunks are memoryview slices of it
+    data: Optional[memoryview] = None
+    _mapping: Optional[mmap.mmap] = None
+    # Mode agreed on from the relay's START reply: '', 'window' or 'stop-and-wait'
+    mode: str = ''
+    # WindowedSender while a negotiated windowed transfer runs (transfer.py)
+    sender: Optional[WindowedSender] = None
+    # DATA payload bytes per chunk; unpadded Var*DataPacket when varlen was granted
+    chunk_size: int = 128
+    varlen: bool = False
+    started: float = 0.0
+    # Payload offset this attempt started at (non-zero when resumed)
+    sent_from: int = 0
+    # Bytes per second of the last completed transfer
+    throughput: float = 0.0
+    # Payload identity and restart point for resumable transfers
+    sha256: str = ''
+    resume_seq: int = 0
+    # A capability block went out with START
+    offered: bool = False
+    # Windowed DATA chunks go out as write without response
+    no_response: bool = False
+    # Resolved with '' once the DEAN confirms the transfer, else with the reason it stopped
+    done: Optional[asyncio.Future] = None
+
+    # Larger payloads are memory-mapped instead of read
+    mmap_threshold = 1024 * 1024
+
+    def load(self, path: str):
+        self.release()
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= self.mmap_threshold:
+                self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.data = memoryview(self._mapping)
+            else:
+                self.data = memoryview(f.read())
+        self.path = path
+        self.size = size
+
+    def load_bytes(self, data: bytes):
+        self.release()
+        self.data = memoryview(data)
+        self.size = len(data)
+
+    def chunk(self, seq: int, chunk_size: int):
+        start = seq * chunk_size
+        if self._mapping is not None:
+            # A copy: a live slice of the mapping would keep release() from closing it
+            return self._mapping[start:start + chunk_size]
+        return self.data[start:start + chunk_size]
+
+    def next_unacked(self) -> int:
+        return self.sender.base if self.sender is not None else self.seq
+
+    def digest(self) -> int:
+        return int.from_bytes(bytes.fromhex(self.sha256)[:4], 'little')
+
+    def complete(self, error: str = ''):
+        if self.done is not None and not self.done.done():
+            self.done.set_result(error)
+
+    def record_throughput(self) -> float:
+        elapsed = time.monotonic() - self.started
+        self.throughput = (self.size - self.sent_from) / elapsed if elapsed > 0 else 0.0
+        return self.throughput
+
+    def release(self):
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Some view is still alive; the mapping is unmapped once it is collected
+                logging.info('Transfer payload mapping still in use, left to the garbage collector')
+            self._mapping = None
 
 
 @dataclass
-class ModelTransferState:
-    path: str = ''
-    size: int = 0
-    seq: int = 0
-    sending: bool = False
+class FileTransferState(TransferState):
+    target: str = ''
+
+
+@dataclass
+class ModelTransferState(TransferState):
+    # Payload is a model_delta stream against the model with this digest
+    delta: bool = False
+    base_digest: int = 0
 
 
 def _canonical_mac(mac: str) -> str:
-    normalized = try_normalize_mac_string(mac)
+    normalized = known_deans.canonical(mac)
     if normalized is None:
         raise DeviceError(f"Invalid MAC address {mac}")
     return normalized
@@ -63,6 +158,11 @@ def _canonical_mac(mac: str) -> str:
 def _mac_slug(mac: str) -> str:
     return _canonical_mac(mac).replace(':', '')
 
+
+def _short_digest(data) -> int:
+    # First four bytes of the SHA-256, as carried in TransferCapabilities
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], 'little')
+
 class Device:
     sound_classlist = [
         'background',
@@ -88,6 +188,21 @@ class Device:
 
     file_chunk_size = 128
     model_chunk_size = 128
+    # Chunks in flight offered to the relay for model/file transfers; 0 keeps
+    # stop-and-wait (main.py sets this from 'transfer_window' in config.json)
+    transfer_window = 0
+    # Offer unpadded DATA packets sized from the ATT MTU ('transfer_varlen')
+    transfer_varlen = False
+    # Persist transfer progress and resume after reconnects ('transfer_resume')
+    transfer_resume = False
+    # Send model updates as deltas against the last confirmed model ('transfer_delta')
+    transfer_delta = False
+    # Default for windowed DATA chunks as write without response ('transfer_no_response');
+    # the relay's seq ACKs and WindowedSender retransmits replace the ATT write response
+    transfer_no_response = False
+
+    # Notify subscriptions kept in flight while enabling services
+    activation_window = 4
 
     def __init__(self, dev):
         # Update connected device dictionary
@@ -100,8 +215,14 @@ class Device:
             'location': '',
         }
         self.is_connected = False
+        # Negotiated ATT MTU of the relay link (23 until read after connect)
+        self.att_mtu = 23
+        # Called with the relay address when the link drops (set by main_worker)
+        self.on_disconnect = None
 
         self.ble_client = None
+        # Every GATT write to the relay goes through this queue (gatt_writes.py)
+        self.writes = GattWriteScheduler(dev.address, self._gatt_write)
         self.manager_queue = None
         self.sound_queue = None
         self.data_queue = None
@@ -117,6 +238,9 @@ class Device:
         self.file_transfers = {}
         self.collecting_feature = set()
 
+        # Characteristic handle -> bound notification handler
+        self.notify_handlers = {}
+
         self.user_in = False
         
         self.enable = Device.service_enable_default
@@ -138,6 +262,12 @@ class Device:
         os.makedirs(model_dir, exist_ok=True)
         return os.path.join(model_dir, f"{_mac_slug(dean_mac)}.tflite")
 
+    def _pushed_model_path(self, dean_mac: str):
+        # Copy of the last model the DEAN confirmed, the base for the next delta
+        pushed_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programdata", "models", "pushed")
+        os.makedirs(pushed_dir, exist_ok=True)
+        return os.path.join(pushed_dir, f"{_mac_slug(dean_mac)}.tflite")
+
     @staticmethod
     def _payload_to_bytes(payload) -> bytes:
         if isinstance(payload, bytes):
@@ -152,11 +282,43 @@ class Device:
             return bytes([payload])
         raise DeviceError(f"Unsupported payload type {type(payload)}")
 
-    def _write_with_target(self, char_uuid, target_mac: str, payload):
+    def _gatt_write(self, char_uuid, payload, response=None):
+        # Looked up per write: the client is replaced on every reconnect. response=None
+        # leaves the write type to bleak (from the characteristic's properties)
+        if response is None:
+            return self.ble_client.write_gatt_char(char_uuid, payload)
+        return self.ble_client.write_gatt_char(char_uuid, payload, response=response)
+
+    def _write(self, char_uuid, payload, priority=WRITE_CONTROL, coalesce_key=None, response=None):
+        return self.writes.submit(priority, char_uuid, payload, coalesce_key, response)
+
+    def _write_with_target(self, char_uuid, target_mac: str, payload, priority=WRITE_CONTROL, coalesce=False, response=None):
+        # coalesce: a newer value for the same DEAN and characteristic replaces a queued one
         canonical_mac = _canonical_mac(target_mac)
         payload_bytes = self._payload_to_bytes(payload)
         prefixed_payload = known_deans.build_downstream(canonical_mac, payload_bytes)
-        return self.ble_client.write_gatt_char(char_uuid, prefixed_payload)
+        return self._write(char_uuid, prefixed_payload, priority, (char_uuid, canonical_mac) if coalesce else None, response)
+
+    def _supports_no_response(self, char_uuid) -> bool:
+        try:
+            characteristic = self.ble_client.services.get_characteristic(char_uuid)
+        except Exception:
+            return False
+        return characteristic is not None and 'write-without-response' in characteristic.properties
+
+    @staticmethod
+    def _drop_no_response(dean_mac, state):
+        if state.no_response:
+            logging.info('%s: Stop-and-wait transfer, write without response not used', dean_mac)
+            state.no_response = False
+
+    def _select_no_response(self, dean_mac, state, char_uuid, no_response):
+        if no_response is None:
+            no_response = self.transfer_no_response
+        if no_response and not self._supports_no_response(char_uuid):
+            logging.info('%s: Relay characteristic has no write without response, DATA chunks use write requests', dean_mac)
+            no_response = False
+        state.no_response = no_response
 
     def _ensure_identity(self, dean_mac: str):
         return known_deans.ensure(dean_mac, relay_address=self.config_dict['address'], device_type=self.config_dict['type'])
@@ -170,36 +332,43 @@ class Device:
         return self.model_transfers.setdefault(canonical, ModelTransferState())
 
     def is_file_transfer_active(self, dean_mac: str) -> bool:
-        canonical = try_normalize_mac_string(dean_mac)
+        canonical = known_deans.canonical(dean_mac)
         if canonical is None:
             return False
         state = self.file_transfers.get(canonical)
         return state.sending if state else False
 
     def is_model_transfer_active(self, dean_mac: str) -> bool:
-        canonical = try_normalize_mac_string(dean_mac)
+        canonical = known_deans.canonical(dean_mac)
         if canonical is None:
             return False
         state = self.model_transfers.get(canonical)
         return state.sending if state else False
 
     def is_training(self, dean_mac: str) -> bool:
-        canonical = try_normalize_mac_string(dean_mac)
+        canonical = known_deans.canonical(dean_mac)
         if canonical is None:
             return False
         return canonical in self.training_targets
     
-    async def remove(self):
+    async def disconnect(self):
+        # Drops the link but keeps the device registered for reconnection
+        self.is_connected = False
         try:
             if self.ble_client is not None:
                 await self.ble_client.disconnect()
         except Exception as e:
             logging.warning("Error during disconnect: %s", e)
+        known_deans.mark_disconnected(self.config_dict.get("address"))
+
+    async def remove(self):
+        # No reconnection is scheduled for a removed device
+        self.on_disconnect = None
+        await self.disconnect()
         try:
             address = self.config_dict.get("address")
             if address in connected_devices:
                 connected_devices.pop(address, None)
-            known_deans.mark_disconnected(address)
         except Exception as e:
             logging.warning("Error during device removal: %s", e)
         finally:
@@ -208,9 +377,34 @@ class Device:
     def check_room_status(self, data):
         value = struct.unpack('B', data[0:1])[0]
     
+    # (service, characteristic) -> notification handler method
+    notify_handler_names = {
+        ('config', 'file'): '_on_config_file',
+        ('sound', 'model'): '_on_sound_model',
+        ('inference', 'rawdata'): '_on_inference_rawdata',
+        ('inference', 'predict'): '_on_inference_predict',
+        ('inference', 'debugstr'): '_on_inference_debugstr',
+    }
+
+    def _register_notify_handler(self, service_name, char_name, char_uuid):
+        # Bound once per subscription so the callback is a single table lookup by handle
+        name = self.notify_handler_names.get((service_name, char_name))
+        characteristic = self.ble_client.services.get_characteristic(char_uuid)
+        if name is None or characteristic is None:
+            return None
+        self.notify_handlers[characteristic.handle] = getattr(self, name)
+        return characteristic.handle
+
     def _ble_notify_callback(self, sender, data):
-        service_name = dean_service_lookup[sender.service_uuid]
-        char_name = dean_service_lookup[sender.uuid]
+        handler = self.notify_handlers.get(sender.handle)
+        if handler is None:
+            # Notification on a characteristic enabled outside activate_characteristic
+            service_name = dean_service_lookup.get(sender.service_uuid)
+            char_name = dean_service_lookup.get(sender.uuid)
+            name = self.notify_handler_names.get((service_name, char_name))
+            if name is None:
+                return
+            handler = self.notify_handlers[sender.handle] = getattr(self, name)
         received_time = time.time()
 
         try:
@@ -218,118 +412,213 @@ class Device:
                 data,
                 self.config_dict['address'],
                 self.config_dict['type'],
-                self.config_dict['location']
+                self.config_dict['location'],
+                received_time
             )
         except ValueError:
-            logging.warning("Received %s/%s packet without MAC prefix", service_name, char_name)
+            logging.warning("Received %s packet without MAC prefix", handler.__name__)
             return
 
-        dean_mac = dean_entry.mac
         location = dean_entry.location or self.config_dict['location']
         device_type = dean_entry.device_type or self.config_dict['type']
+        handler(dean_entry.mac, location, device_type, received_time, payload)
 
-        if service_name == 'config':
-            if char_name == 'file':
-                recv_packet = FilePacket.unpack(payload)
-                state = self._get_file_state(dean_mac)
-                if recv_packet.cmd == FILE_TRANSFER_CMD_START:
-                    if not state.sending:
-                        state.sending = True
-                        state.seq = 0
-                        asyncio.create_task(self.file_send_worker(dean_mac))
-                elif recv_packet.cmd == FILE_TRANSFER_CMD_DATA:
-                    recv_packet = FileAckPacket.unpack(payload)
-                    state.seq = recv_packet.seq + 1
+    def _on_config_file(self, dean_mac, location, device_type, received_time, payload):
+        recv_packet = FilePacket.unpack(payload)
+        state = self._get_file_state(dean_mac)
+        if recv_packet.cmd == FILE_TRANSFER_CMD_START:
+            if state.sending and not state.mode and state.offered:
+                # Reply to a START that carried a capability block
+                caps = TransferCapabilities.unpack_reply(payload)
+                if state.resume_seq and caps.resumable:
+                    self._resume_at(dean_mac, 'file', state, caps)
+                else:
+                    self._reset_chunks(state, self.file_chunk_size)
+                    self._apply_chunk_capabilities(dean_mac, state, caps, VarFileDataPacket.header.size)
+                if caps.windowed and self.transfer_window > 1:
+                    state.mode = 'window'
+                    self._start_windowed_transfer(
+                        dean_mac, 'file', state, caps, DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR,
+                        partial(self._file_data_packet, state),
+                        FilePacket(cmd=FILE_TRANSFER_CMD_END).pack(), state.chunk_size)
+                else:
+                    state.mode = 'stop-and-wait'
+                    self._drop_no_response(dean_mac, state)
                     asyncio.create_task(self.file_send_worker(dean_mac))
-                elif recv_packet.cmd == FILE_TRANSFER_CMD_END:
-                    logging.info('%s: File transfer completed', dean_mac)
-                    state.sending = False
-                    state.seq = 0
-                elif recv_packet.cmd == FILE_TRANSFER_CMD_FAIL:
-                    logging.info('%s: File transfer failed', dean_mac)
-                    state.sending = False
-                    state.seq = 0
-                elif recv_packet.cmd == FILE_TRANSFER_CMD_REMOVE:
-                    logging.info('%s: File removed', dean_mac)
-        
-        elif service_name == 'sound':
-            if char_name == 'model':
-                recv_packet = ModelPacket.unpack(payload)
-                state = self._get_model_state(dean_mac)
-                if recv_packet.cmd == MODEL_UPDATE_CMD_START:
-                    if not state.sending:
-                        state.sending = True
-                        state.seq = 0
-                        asyncio.create_task(self.model_send_worker(dean_mac))
-                elif recv_packet.cmd == MODEL_UPDATE_CMD_DATA:
-                    recv_packet = ModelAckPacket.unpack(payload)
-                    state.seq = recv_packet.seq + 1
-                    asyncio.create_task(self.model_send_worker(dean_mac))
-                elif recv_packet.cmd == MODEL_UPDATE_CMD_END:
-                    logging.info('%s: Model update completed', dean_mac)
-                    state.sending = False
-                    state.seq = 0
-                elif recv_packet.cmd == MODEL_UPDATE_CMD_FAIL:
-                    logging.info('%s: Model update failed', dean_mac)
-                    state.sending = False
-                    state.seq = 0
-                elif recv_packet.cmd == MODEL_UPDATE_CMD_REMOVE:
-                    logging.info('%s: Model removed', dean_mac)
-
-                elif recv_packet.cmd == FEATURE_COLLECTION_CMD_START:
-                    self.collecting_feature.add(dean_mac)
-                elif recv_packet.cmd == FEATURE_COLLECTION_CMD_DATA:
-                    if not self.sound_queue.full():
-                        self.sound_queue.put([location, device_type,
-                                               dean_mac, service_name, char_name,
-                                               received_time, payload])
-                elif recv_packet.cmd == FEATURE_COLLECTION_CMD_FINISH:
-                    if not self.sound_queue.full():
-                        self.sound_queue.put([location, device_type,
-                                               dean_mac, service_name, char_name,
-                                               received_time, payload])
-                elif recv_packet.cmd == FEATURE_COLLECTION_CMD_END:
-                    self.collecting_feature.discard(dean_mac)
-
-        elif service_name == 'inference':
-            if char_name == 'rawdata':
-                fmt = '<BBBfffffB20b'
-                unpacked_data = struct.unpack(fmt, payload)
-                unpacked_data_list = list(unpacked_data)
-                if unpacked_data_list[0] == 1:
-                    # Unitspace management start
-                    asyncio.create_task(unitspace_manager.unitspace_existence_estimation(location, device_type,
-                                                dean_mac, service_name, char_name,
-                                                received_time, unpacked_data_list, payload))
+                self._save_progress(dean_mac, 'file', state, force=True)
+            elif not state.sending:
+                # Relay-initiated restart, always fixed-size stop-and-wait
+                self._reset_transfer(state, self.file_chunk_size)
+                state.mode = 'stop-and-wait'
+                asyncio.create_task(self.file_send_worker(dean_mac))
+        elif recv_packet.cmd == FILE_TRANSFER_CMD_DATA:
+            recv_packet = FileAckPacket.unpack(payload)
+            if state.sender is not None:
+                state.sender.on_ack(recv_packet.seq)
+            else:
+                state.seq = recv_packet.seq + 1
+                asyncio.create_task(self.file_send_worker(dean_mac))
+            self._save_progress(dean_mac, 'file', state)
+        elif recv_packet.cmd == FILE_TRANSFER_CMD_END:
+            if state.sender is not None:
+                state.sender.finish(True)
+            if state.sending:
+                state.record_throughput()
+                logging.info('%s: File transfer completed, %d bytes in %.2f s (%.1f kB/s, %d-byte chunks)',
+                             dean_mac, state.size - state.sent_from, time.monotonic() - state.started,
+                             state.throughput / 1000, state.chunk_size)
+            else:
+                logging.info('%s: File transfer completed', dean_mac)
+            state.sending = False
+            state.seq = 0
+            state.release()
+            state.complete()
+            self._forget_progress(dean_mac, 'file')
+        elif recv_packet.cmd == FILE_TRANSFER_CMD_FAIL:
+            if state.sender is not None:
+                state.sender.finish(False)
+            logging.info('%s: File transfer failed', dean_mac)
+            state.sending = False
+            state.seq = 0
+            state.release()
+            state.complete('rejected by the DEAN')
+            self._forget_progress(dean_mac, 'file')
+        elif recv_packet.cmd == FILE_TRANSFER_CMD_REMOVE:
+            logging.info('%s: File removed', dean_mac)
+
+    def _on_sound_model(self, dean_mac, location, device_type, received_time, payload):
+        recv_packet = ModelPacket.unpack(payload)
+        state = self._get_model_state(dean_mac)
+        if recv_packet.cmd == MODEL_UPDATE_CMD_START:
+            if state.sending and not state.mode and state.offered:
+                # Reply to a START that carried a capability block
+                caps = TransferCapabilities.unpack_reply(payload)
+                if state.delta and not caps.delta:
+                    self._send_full_model(dean_mac, state)
+                if state.resume_seq and caps.resumable:
+                    self._resume_at(dean_mac, 'model', state, caps)
                 else:
-                    self.check_room_status(payload)
-                    if not self.data_queue.full():
-                        self.data_queue.put([location, device_type,
-                                            dean_mac, service_name, char_name,
-                                            received_time, payload])
-                    # if not self.unitspace_queue.full():
-                
-            elif char_name == 'predict':
-                print("WIP : mqtt service required for handling inference result")   
-            elif char_name == 'debugstr':
-                if not self.data_queue.full():
-                    self.data_queue.put([location, device_type,
-                                         dean_mac, service_name, char_name,
-                                         received_time, payload])
-                if not self.log_queue.full():
-                    self.log_queue.put([location, device_type,
-                                         dean_mac, service_name, char_name,
-                                         received_time, payload])
+                    self._reset_chunks(state, self.model_chunk_size)
+                    self._apply_chunk_capabilities(dean_mac, state, caps, VarModelDataPacket.header.size)
+                if caps.windowed and self.transfer_window > 1:
+                    state.mode = 'window'
+                    self._start_windowed_transfer(
+                        dean_mac, 'model', state, caps, DEAN_UUID_SOUND_MODEL_CHAR,
+                        partial(self._model_data_packet, state),
+                        ModelPacket(cmd=MODEL_UPDATE_CMD_END).pack(), state.chunk_size)
+                else:
+                    state.mode = 'stop-and-wait'
+                    self._drop_no_response(dean_mac, state)
+                    asyncio.create_task(self.model_send_worker(dean_mac))
+                self._save_progress(dean_mac, 'model', state, force=True)
+            elif not state.sending:
+                # Relay-initiated restart, always fixed-size stop-and-wait of the full model
+                if state.delta:
+                    try:
+                        self._send_full_model(dean_mac, state)
+                    except OSError as e:
+                        logging.warning('%s: Model restart requested but not sent: %s', dean_mac, e)
+                        return
+                self._reset_transfer(state, self.model_chunk_size)
+                state.mode = 'stop-and-wait'
+                asyncio.create_task(self.model_send_worker(dean_mac))
+        elif recv_packet.cmd == MODEL_UPDATE_CMD_DATA:
+            recv_packet = ModelAckPacket.unpack(payload)
+            if state.sender is not None:
+                state.sender.on_ack(recv_packet.seq)
+            else:
+                state.seq = recv_packet.seq + 1
+                asyncio.create_task(self.model_send_worker(dean_mac))
+            self._save_progress(dean_mac, 'model', state)
+        elif recv_packet.cmd == MODEL_UPDATE_CMD_END:
+            if state.sender is not None:
+                state.sender.finish(True)
+            if state.sending:
+                state.record_throughput()
+                logging.info('%s: Model update completed, %d bytes in %.2f s (%.1f kB/s, %d-byte chunks)',
+                             dean_mac, state.size - state.sent_from, time.monotonic() - state.started,
+                             state.throughput / 1000, state.chunk_size)
+            else:
+                logging.info('%s: Model update completed', dean_mac)
+            self._commit_pushed_model(dean_mac)
+            state.sending = False
+            state.seq = 0
+            state.delta = False
+            state.base_digest = 0
+            state.release()
+            state.complete()
+            self._forget_progress(dean_mac, 'model')
+        elif recv_packet.cmd == MODEL_UPDATE_CMD_FAIL:
+            if state.sender is not None:
+                state.sender.finish(False)
+            logging.info('%s: Model update failed', dean_mac)
+            state.sending = False
+            state.seq = 0
+            state.delta = False
+            state.base_digest = 0
+            state.release()
+            state.complete('rejected by the DEAN')
+            self._forget_progress(dean_mac, 'model')
+        elif recv_packet.cmd == MODEL_UPDATE_CMD_REMOVE:
+            logging.info('%s: Model removed', dean_mac)
+
+        elif recv_packet.cmd == FEATURE_COLLECTION_CMD_START:
+            self.collecting_feature.add(dean_mac)
+        elif recv_packet.cmd == FEATURE_COLLECTION_CMD_DATA:
+            self.sound_queue.put([location, device_type,
+                                  dean_mac, 'sound', 'model',
+                                  received_time, payload])
+        elif recv_packet.cmd == FEATURE_COLLECTION_CMD_FINISH:
+            self.sound_queue.put([location, device_type,
+                                  dean_mac, 'sound', 'model',
+                                  received_time, payload])
+        elif recv_packet.cmd == FEATURE_COLLECTION_CMD_END:
+            self.collecting_feature.discard(dean_mac)
+
+    def _on_inference_rawdata(self, dean_mac, location, device_type, received_time, payload):
+        if len(payload) != _RAWDATA.size:
+            logging.warning('%s: rawdata payload of %d bytes ignored', dean_mac, len(payload))
+            return
+        if payload[0] == 1:
+            # Unitspace management start
+            asyncio.create_task(unitspace_manager.unitspace_existence_estimation(location, device_type,
+                                        dean_mac, 'inference', 'rawdata',
+                                        received_time, list(_RAWDATA.unpack(payload)), payload))
+        else:
+            self.check_room_status(payload)
+            # Worker queues never block: overflow is spilled or counted (backpressure.py)
+            self.data_queue.put([location, device_type,
+                                 dean_mac, 'inference', 'rawdata',
+                                 received_time, payload])
+            # if not self.unitspace_queue.full():
+
+    def _on_inference_predict(self, dean_mac, location, device_type, received_time, payload):
+        print("WIP : mqtt service required for handling inference result")
+
+    def _on_inference_debugstr(self, dean_mac, location, device_type, received_time, payload):
+        # DataProcess decodes it once and forwards the event to LogProcess
+        self.data_queue.put([location, device_type,
+                             dean_mac, 'inference', 'debugstr',
+                             received_time, payload])
         
     def _ble_disconnected_callback(self, client):
         logging.info('%s: %s disconnected', client.address, self.config_dict['type'])
+        was_connected = self.is_connected
         self.is_connected = False
-        for state in self.model_transfers.values():
-            state.sending = False
-            state.seq = 0
-        for state in self.file_transfers.values():
+        if was_connected and self.on_disconnect is not None:
+            self.on_disconnect(self.config_dict['address'])
+        for kind, transfers in (('model', self.model_transfers), ('file', self.file_transfers)):
+            for dean_mac, state in transfers.items():
+                if state.sending:
+                    # Resume point for resume_transfers() after reconnecting
+                    self._save_progress(dean_mac, kind, state, force=True)
+        for state in list(self.model_transfers.values()) + list(self.file_transfers.values()):
+            if state.sender is not None:
+                state.sender.finish(False)
             state.sending = False
             state.seq = 0
+            state.release()
+            state.complete('relay disconnected')
         known_deans.mark_disconnected(self.config_dict['address'])
     
     def get_service_by_uuid(self, service_uuid):
@@ -356,7 +645,7 @@ class Device:
             return
         char_uuid = dean_service_dict['config'][target]
         self.save_dean_config(entry)
-        await self._write_with_target(char_uuid, entry.mac, data)
+        await self._write_with_target(char_uuid, entry.mac, data, WRITE_CONFIG, coalesce=True)
 
     async def load_config(self, dean_mac=None):
         if dean_mac is None:
@@ -368,10 +657,8 @@ class Device:
                     self.config_dict['name'] = json_data['name']
                     self.config_dict['location'] = json_data['location']
                 try:
-                    await self.ble_client.write_gatt_char(DEAN_UUID_CONFIG_NAME_CHAR,
-                                                          bytearray(self.config_dict['name'], 'utf-8'))
-                    await self.ble_client.write_gatt_char(DEAN_UUID_CONFIG_LOCATION_CHAR,
-                                                          bytearray(self.config_dict['location'], 'utf-8'))
+                    await self._write(DEAN_UUID_CONFIG_NAME_CHAR, bytearray(self.config_dict['name'], 'utf-8'), WRITE_CONFIG, DEAN_UUID_CONFIG_NAME_CHAR)
+                    await self._write(DEAN_UUID_CONFIG_LOCATION_CHAR, bytearray(self.config_dict['location'], 'utf-8'), WRITE_CONFIG, DEAN_UUID_CONFIG_LOCATION_CHAR)
                     return True
                 except Exception as e:
                     logging.warning(e)
@@ -386,8 +673,8 @@ class Device:
                 entry.name = json_data.get('name', entry.name)
                 entry.location = json_data.get('location', entry.location)
             try:
-                await self._write_with_target(DEAN_UUID_CONFIG_NAME_CHAR, entry.mac, entry.name or '')
-                await self._write_with_target(DEAN_UUID_CONFIG_LOCATION_CHAR, entry.mac, entry.location or '')
+                await self._write_with_target(DEAN_UUID_CONFIG_NAME_CHAR, entry.mac, entry.name or '', WRITE_CONFIG, coalesce=True)
+                await self._write_with_target(DEAN_UUID_CONFIG_LOCATION_CHAR, entry.mac, entry.location or '', WRITE_CONFIG, coalesce=True)
                 return True
             except Exception as e:
                 logging.warning(e)
@@ -421,12 +708,15 @@ class Device:
             char_dict = dean_service_dict.get(service_name)
             char_uuid = char_dict.get(char_name, None)
             if char_uuid is not None:
+                # Registered before subscribing so the first notification already finds it
+                handle = self._register_notify_handler(service_name, char_name, char_uuid)
                 try:
                     await self.ble_client.start_notify(char_uuid, self._ble_notify_callback)
                     logging.info('%s: Characteristic %s %s %s',
                                  self.config_dict['address'], service_name, char_name, 'enabled')
                     return True
                 except Exception as e:
+                    self.notify_handlers.pop(handle, None)
                     logging.info('%s: Characteristic %s %s %s - %s',
                                  self.config_dict['address'], service_name, char_name, 'activation failed', e)
                     return False
@@ -439,6 +729,9 @@ class Device:
             if char_uuid is not None:
                 try:
                     await self.ble_client.stop_notify(char_uuid)
+                    characteristic = self.ble_client.services.get_characteristic(char_uuid)
+                    if characteristic is not None:
+                        self.notify_handlers.pop(characteristic.handle, None)
                     logging.info('%s: Characteristic %s %s %s',
                                  self.config_dict['address'], service_name, char_name, 'disabled')
                     return True
@@ -452,56 +745,26 @@ class Device:
         if service is None:
             logging.warning("%s: Service %s not found", self.config_dict['address'], service_name)
             return
-        char_list = []
-        for characteristic in service.characteristics:
-            current_char = dean_service_lookup.get(characteristic.uuid, None)
-            if current_char is None:
-                continue
-            char_list.append(characteristic.uuid)
-        enable_list = self.enable.get(service_name, None)
-        if enable_list is not None:
-            for char_name in enable_list:
-                try:
-                    await self.activate_characteristic(service_name, char_name)
-                except Exception as e:
-                    logging.warning("Failed to activate %s %s: %s", service_name, char_name, e)
-                #NEW CODE: Increase delay for service activation stability
-                await asyncio.sleep(0.2)  # NEW CODE (was 0.1)
-            return True
-        return False
+        if self.enable.get(service_name, None) is None:
+            return False
+        plan = plan_activation([service_name], self.enable)
+        await run_plan(self.config_dict['address'], plan, self.activate_characteristic, self.activation_window)
+        return True
     
     async def deactivate_service(self, service_name):
-        # service = self.get_service_by_name(service_name)
-        # for characteristic in service.characteristics:
-        #     char_name = dean_service_lookup.get(characteristic.uuid, None)
-        #     if char_name is None:
-        #         continue
-        #     try:
-        #         await self.ble_client.stop_notify(characteristic.uuid)
-        #     except Exception as e:
-        #         logging.warning(e)
-        #         pass
-        enable_list = self.enable.get(service_name, None)
-        if enable_list is not None:
-            for char_name in enable_list:
-                try:
-                    await self.deactivate_characteristic(service_name, char_name)
-                except Exception as e:
-                    logging.warning("Failed to deactivate %s %s: %s", service_name, char_name, e)
-                #NEW CODE: Increase delay for service activation stability
-                await asyncio.sleep(0.2)  # NEW CODE (was 0.1)
-            return True
-        return False
+        if self.enable.get(service_name, None) is None:
+            return False
+        plan = plan_activation([service_name], self.enable)
+        await run_plan(self.config_dict['address'], plan, self.deactivate_characteristic, self.activation_window, 'disabled')
+        return True
 
     async def init_services(self):
+        # Every default characteristic of every exposed service goes through one
+        # bounded pipeline (gatt_activation.py) instead of fixed sleeps
         try:
-            for service in self.ble_client.services:
-                # if service.uuid == DEAN_UUID_CONFIG_SERVICE:
-                #     continue
-                service_name = dean_service_lookup.get(service.uuid, None)
-                if service_name is not None:
-                    await self.activate_service(service_name)
-                await asyncio.sleep(0.1)
+            service_names = [dean_service_lookup.get(service.uuid, None) for service in self.ble_client.services]
+            plan = plan_activation(service_names, self.enable)
+            await run_plan(self.config_dict['address'], plan, self.activate_characteristic, self.activation_window)
         except Exception as e:
             logging.warning(e)
             raise DeviceError("Service initialization failed")
@@ -519,69 +782,294 @@ class Device:
         adjust_reason = 0
         format_string = '<HBBBBBBBB'
         packed_data = struct.pack(format_string, year, month, day, hours, minutes, seconds, day_of_week, exact_time_256, adjust_reason)
-        await self.ble_client.write_gatt_char(DEAN_UUID_CTS_CURRENT_TIME_CHAR, packed_data)
+        await self._write(DEAN_UUID_CTS_CURRENT_TIME_CHAR, packed_data, WRITE_CONFIG, DEAN_UUID_CTS_CURRENT_TIME_CHAR)
 
-    async def file_transfer_start(self, dean_mac, file_path, target_path):
+    async def file_transfer_start(self, dean_mac, file_path, target_path, no_response=None):
+        # no_response: windowed DATA chunks as write without response (None: transfer_no_response)
         state = self._get_file_state(dean_mac)
-        state.path = file_path
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-        state.size = len(file_data)
-        state.seq = 0
-        state.sending = True
+        state.load(file_path)
+        state.target = target_path
+        self._select_no_response(dean_mac, state, DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, no_response)
+        self._reset_transfer(state, self.file_chunk_size)
+        self._prepare_resume(dean_mac, 'file', state)
         logging.info('%s: File transfer start to %s', dean_mac, target_path)
         send_packet = FileDataPacket(cmd=FILE_TRANSFER_CMD_START, seq=0, size=len(target_path), data=bytearray(target_path, 'utf-8'))
-        await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac, send_packet.pack())
+        capabilities = self._transfer_capabilities(state, VarFileDataPacket.header.size, self.file_chunk_size)
+        state.offered = bool(capabilities)
+        await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac, send_packet.pack() + capabilities)
+
+    @staticmethod
+    def _reset_chunks(state, chunk_size):
+        state.seq = 0
+        state.chunk_size = chunk_size
+        state.varlen = False
+
+    @classmethod
+    def _reset_transfer(cls, state, chunk_size):
+        cls._reset_chunks(state, chunk_size)
+        state.mode = ''
+        state.resume_seq = 0
+        state.sent_from = 0
+        state.offered = False
+        state.sender = None
+        state.started = time.monotonic()
+        state.sending = True
+        if state.done is None or state.done.done():
+            state.done = asyncio.get_running_loop().create_future()
+
+    def _max_chunk_size(self, header_size) -> int:
+        # ATT write payload (MTU - 3, at most 512) minus the MAC prefix and the DATA header
+        return max(1, min(self.att_mtu - 3, 512) - MAC_PREFIX_LEN - header_size)
+
+    def _transfer_capabilities(self, state, header_size, chunk_size) -> bytes:
+        caps = TransferCapabilities()
+        if self.transfer_window > 1:
+            caps.flags |= TRANSFER_CAP_WINDOW
+            caps.window = min(self.transfer_window, 255)
+        if state.resume_seq:
+            # The DEAN keeps the chunk geometry of the interrupted attempt
+            caps.flags |= TRANSFER_CAP_RESUME
+            caps.resume = state.resume_seq
+            if state.varlen:
+                caps.flags |= TRANSFER_CAP_VARLEN
+                caps.chunk = state.chunk_size
+        # Below the fixed chunk size (small MTU, e.g. not acquired) padded long writes do better
+        elif self.transfer_varlen and self._max_chunk_size(header_size) > chunk_size:
+            caps.flags |= TRANSFER_CAP_VARLEN
+            caps.chunk = self._max_chunk_size(header_size)
+        if self.transfer_resume:
+            caps.digest = state.digest()
+        if getattr(state, 'delta', False):
+            caps.flags |= TRANSFER_CAP_DELTA
+            caps.base = state.base_digest
+        return caps.pack() if caps.flags or caps.digest else b''
+
+    def _prepare_resume(self, dean_mac, kind, state):
+        if not self.transfer_resume:
+            return
+        state.sha256 = hashlib.sha256(state.data).hexdigest()
+        record = transfer_progress.load(_mac_slug(dean_mac), kind)
+        if (record is not None and record.get('sha256') == state.sha256
+                and record.get('target', '') == getattr(state, 'target', '') and record.get('next_seq', 0) > 0):
+            state.resume_seq = record['next_seq']
+            state.chunk_size = record['chunk_size']
+            state.varlen = record['varlen']
+            logging.info('%s: Interrupted %s transfer found at chunk %d', dean_mac, kind, state.resume_seq)
+        self._save_progress(dean_mac, kind, state, force=True)
+
+    def _resume_at(self, dean_mac, kind, state, caps):
+        # The DEAN still holds every chunk before caps.resume
+        state.seq = min(caps.resume, state.resume_seq)
+        state.sent_from = min(state.seq * state.chunk_size, state.size)
+        total = (state.size + state.chunk_size - 1) // state.chunk_size
+        logging.info('%s: Resuming %s transfer at chunk %d/%d', dean_mac, kind, state.seq, total)
+
+    def _save_progress(self, dean_mac, kind, state, force=False):
+        if not self.transfer_resume or not state.sha256:
+            return
+        record = {
+            'kind': kind,
+            'dean': dean_mac,
+            'relay': self.config_dict['address'],
+            'path': state.path,
+            'target': getattr(state, 'target', ''),
+            'size': state.size,
+            'sha256': state.sha256,
+            'chunk_size': state.chunk_size,
+            'varlen': state.varlen,
+            # Until the relay answers START the recorded restart point still holds
+            'next_seq': state.next_unacked() if state.mode else state.resume_seq,
+        }
+        transfer_progress.save(_mac_slug(dean_mac), kind, record, force)
+
+    def _forget_progress(self, dean_mac, kind):
+        if self.transfer_resume:
+            transfer_progress.remove(_mac_slug(dean_mac), kind)
+
+    async def resume_transfers(self):
+        """Restart transfers to DEANs behind this relay that a disconnect interrupted."""
+        for record in list(transfer_progress.records()):
+            if record.get('relay') != self.config_dict['address']:
+                continue
+            dean_mac, kind = record['dean'], record['kind']
+            try:
+                if kind == 'model' and not self.is_model_transfer_active(dean_mac):
+                    if not await self.model_update_start(dean_mac):
+                        self._forget_progress(dean_mac, kind)
+                elif kind == 'file' and not self.is_file_transfer_active(dean_mac):
+                    await self.file_transfer_start(dean_mac, record['path'], record['target'])
+            except FileNotFoundError:
+                logging.warning('%s: %s payload %s is gone, not resumed', dean_mac, kind, record['path'])
+                self._forget_progress(dean_mac, kind)
+            except Exception as e:
+                logging.warning('%s: %s transfer not resumed: %s', dean_mac, kind, e)
+
+    def _apply_chunk_capabilities(self, dean_mac, state, caps, header_size):
+        if self.transfer_varlen and caps.varlen:
+            state.varlen = True
+            state.chunk_size = min(caps.chunk, self._max_chunk_size(header_size))
+            logging.info('%s: %d-byte chunks (ATT MTU %d)', dean_mac, state.chunk_size, self.att_mtu)
+
+    @staticmethod
+    def _file_data_packet(state, seq, chunk) -> bytes:
+        packet_type = VarFileDataPacket if state.varlen else FileDataPacket
+        return packet_type(cmd=FILE_TRANSFER_CMD_DATA, seq=seq, size=len(chunk), data=chunk).pack()
+
+    @staticmethod
+    def _model_data_packet(state, seq, chunk) -> bytes:
+        packet_type = VarModelDataPacket if state.varlen else ModelDataPacket
+        return packet_type(cmd=MODEL_UPDATE_CMD_DATA, seq=seq, data=chunk).pack()
+
+    def _start_windowed_transfer(self, dean_mac, kind, state, caps, char_uuid, data_packet, end_packet, chunk_size):
+        window = min(caps.window, self.transfer_window)
+        if state.no_response:
+            # A write command is never split: the whole DATA packet must fit one ATT PDU
+            packet_size = MAC_PREFIX_LEN + len(data_packet(0, state.chunk(0, chunk_size)))
+            if packet_size > self.att_mtu - 3:
+                logging.info('%s: %d-byte DATA writes exceed ATT MTU %d, using write requests',
+                             dean_mac, packet_size, self.att_mtu)
+                state.no_response = False
+        state.sender = WindowedSender(f'{dean_mac} {kind} transfer', state,
+                                      partial(self._write_with_target, char_uuid, dean_mac,
+                                              priority=WRITE_BULK, response=False if state.no_response else None),
+                                      data_packet, end_packet, chunk_size, window, start=state.seq)
+        logging.info('%s: Windowed transfer, %d chunks in flight%s', dean_mac, window,
+                     ', write without response' if state.no_response else '')
+
+        async def run():
+            sender = state.sender
+            try:
+                completed = await sender.run()
+            except Exception as e:
+                logging.warning("Windowed transfer error (%s): %s", dean_mac, e)
+                completed = False
+            finally:
+                # A transfer restarted after a reconnect or END may already own the state
+                owned = state.sender is sender
+                if owned:
+                    state.sender = None
+            if owned and not completed and state.sending:
+                state.seq = sender.base
+                self._save_progress(dean_mac, kind, state, force=True)
+                state.sending = False
+                state.seq = 0
+                state.release()
+                state.complete('no ACK from the relay')
+        asyncio.create_task(run())
 
     async def file_send_worker(self, dean_mac):
         state = self._get_file_state(dean_mac)
         if not state.sending:
             return
-        total_chunk = state.size // self.file_chunk_size + 1
+        total_chunk = state.size // state.chunk_size + 1
         if state.seq > total_chunk:
             send_packet = FilePacket(cmd=FILE_TRANSFER_CMD_END)
+            # The next transfer may start before this loop wakes up
+            done = state.done
             for _ in range(3):
                 await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac, send_packet.pack())
                 await asyncio.sleep(1)
-                if not state.sending:
+                if not state.sending or done is None or done.done():
                     break
             return
         try:
-            with open(state.path, 'rb') as f:
-                file_data = f.read()
-            start_idx = state.seq * self.file_chunk_size
-            end_idx = (state.seq + 1) * self.file_chunk_size
-            file_chunk = file_data[start_idx:end_idx]
-            send_packet = FileDataPacket(cmd=FILE_TRANSFER_CMD_DATA, seq=state.seq, size=len(file_chunk), data=file_chunk)
+            if state.data is None:
+                # Released on disconnect; the relay asked to start over
+                state.load(state.path)
+            file_chunk = state.chunk(state.seq, state.chunk_size)
             if state.seq % 1 == 0 or state.seq == total_chunk:
                 logging.info('%s: Sending file data %d/%d', dean_mac, state.seq, total_chunk)
-            await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac, send_packet.pack())
+            await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac,
+                                          self._file_data_packet(state, state.seq, file_chunk), WRITE_BULK)
         except Exception as e:
             logging.warning("File send error (%s): %s", dean_mac, e)
             state.sending = False
+            state.release()
+            state.complete(f'send error: {e}')
 
     async def file_remove(self, dean_mac, target_path):
         logging.info('%s: Remove %s', dean_mac, target_path)
         send_packet = FileDataPacket(cmd=FILE_TRANSFER_CMD_REMOVE, seq=0, size=len(target_path), data=bytearray(target_path, 'utf-8'))
         await self._write_with_target(DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR, dean_mac, send_packet.pack())
 
-    async def model_update_start(self, dean_mac):
+    async def model_update_start(self, dean_mac, no_response=None):
+        # no_response: windowed DATA chunks as write without response (None: transfer_no_response)
         state = self._get_model_state(dean_mac)
         model_path = self._model_path_for(dean_mac)
         if not os.path.isfile(model_path):
             logging.warning('%s: Model file %s not found', dean_mac, model_path)
             return False
-        with open(model_path, 'rb') as f:
-            model_data = f.read()
-        state.size = len(model_data)
-        state.path = model_path
-        state.seq = 0
-        state.sending = True
+        state.load(model_path)
+        state.delta = False
+        self._select_no_response(dean_mac, state, DEAN_UUID_SOUND_MODEL_CHAR, no_response)
+        if self.transfer_delta:
+            await self._prepare_model_delta(dean_mac, state)
+        self._reset_transfer(state, self.model_chunk_size)
+        self._prepare_resume(dean_mac, 'model', state)
         logging.info('%s: Model update start', dean_mac)
         send_packet = ModelPacket(cmd=MODEL_UPDATE_CMD_START)
-        await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, send_packet.pack())
+        capabilities = self._transfer_capabilities(state, VarModelDataPacket.header.size, self.model_chunk_size)
+        state.offered = bool(capabilities)
+        await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, send_packet.pack() + capabilities)
         return True
 
+    async def _prepare_model_delta(self, dean_mac, state):
+        model = bytes(state.data)
+        pushed_path = self._pushed_model_path(dean_mac)
+        # Becomes the pushed copy once the DEAN confirms this update
+        with open(pushed_path + '.pending', 'wb') as f:
+            f.write(model)
+        try:
+            with open(pushed_path, 'rb') as f:
+                base = f.read()
+        except FileNotFoundError:
+            base = b''
+        start = time.monotonic()
+        encoded = await asyncio.get_running_loop().run_in_executor(None, model_delta.encode, base, model)
+        logging.info('%s: Model delta %d -> %d bytes against a %d-byte base in %.2f s',
+                     dean_mac, len(model), len(encoded), len(base), time.monotonic() - start)
+        # Always the delta stream: its header carries the model size, so the DEAN's
+        # copy (and the base of the next delta) never includes DATA padding
+        state.load_bytes(encoded)
+        state.delta = True
+        state.base_digest = _short_digest(base) if base else 0
+
+    def _send_full_model(self, dean_mac, state):
+        logging.info('%s: Model delta not accepted, sending the full model', dean_mac)
+        state.load(self._model_path_for(dean_mac))
+        # The pending copy must be what the DEAN ends up with
+        with open(self._pushed_model_path(dean_mac) + '.pending', 'wb') as f:
+            f.write(state.data)
+        state.delta = False
+        state.base_digest = 0
+        state.resume_seq = 0
+        if state.sha256:
+            state.sha256 = hashlib.sha256(state.data).hexdigest()
+
+    def _commit_pushed_model(self, dean_mac):
+        pushed_path = self._pushed_model_path(dean_mac)
+        if os.path.isfile(pushed_path + '.pending'):
+            os.replace(pushed_path + '.pending', pushed_path)
+
+    async def model_update(self, dean_mac, timeout=None):
+        """Start a model update, or join the running one, and wait until the DEAN confirms it."""
+        state = self._get_model_state(dean_mac)
+        if not state.sending and not await self.model_update_start(dean_mac):
+            raise DeviceError(f"Model file {self._model_path_for(dean_mac)} not found")
+        try:
+            error = await asyncio.wait_for(asyncio.shield(state.done), timeout)
+        except asyncio.TimeoutError:
+            raise DeviceError(f"Model update timed out after {timeout} s")
+        if error:
+            raise DeviceError(f"Model update failed: {error}")
+
+    def model_update_progress(self, dean_mac):
+        """(acknowledged chunks, total chunks) of the running model update, (0, 0) if idle."""
+        state = self.model_transfers.get(known_deans.canonical(dean_mac))
+        if state is None or not state.sending:
+            return 0, 0
+        return state.next_unacked(), (state.size + state.chunk_size - 1) // state.chunk_size
+
     async def send_sound_packet(self, dean_mac, packet):
         await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, packet.pack())
 
@@ -589,31 +1077,38 @@ class Device:
         state = self._get_model_state(dean_mac)
         if not state.sending:
             return
-        total_chunk = state.size // self.model_chunk_size + 1
+        total_chunk = state.size // state.chunk_size + 1
         if state.seq > total_chunk:
             send_packet = ModelPacket(cmd=MODEL_UPDATE_CMD_END)
+            # The next transfer may start before this loop wakes up
+            done = state.done
             for _ in range(3):
                 await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, send_packet.pack())
                 await asyncio.sleep(1)
-                if not state.sending:
+                if not state.sending or done is None or done.done():
                     break
             return
         try:
-            with open(state.path, 'rb') as f:
-                model_data = f.read()
-            start_idx = state.seq * self.model_chunk_size
-            end_idx = (state.seq + 1) * self.model_chunk_size
-            model_chunk = model_data[start_idx:end_idx]
-            send_packet = ModelDataPacket(cmd=MODEL_UPDATE_CMD_DATA, seq=state.seq, data=model_chunk)
+            if state.data is None:
+                # Released on disconnect; the relay asked to start over
+                state.load(state.path)
+            model_chunk = state.chunk(state.seq, state.chunk_size)
             if state.seq % 10 == 0 or state.seq == total_chunk:
                 logging.info('%s: Sending model data %d/%d', dean_mac, state.seq, total_chunk)
-            await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, send_packet.pack())
+            await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac,
+                                          self._model_data_packet(state, state.seq, model_chunk), WRITE_BULK)
         except Exception as e:
             logging.warning("Model send error (%s): %s", dean_mac, e)
             state.sending = False
+            state.release()
+            state.complete(f'send error: {e}')
     
     async def model_remove(self, dean_mac):
         logging.info('%s: Remove model', dean_mac)
+        # Without a model on the DEAN there is no delta base
+        for path in (self._pushed_model_path(dean_mac), self._pushed_model_path(dean_mac) + '.pending'):
+            if os.path.isfile(path):
+                os.remove(path)
         send_packet = ModelPacket(cmd=MODEL_UPDATE_CMD_REMOVE)
         await self._write_with_target(DEAN_UUID_SOUND_MODEL_CHAR, dean_mac, send_packet.pack())
     
@@ -639,7 +1134,7 @@ class Device:
             debug_data = (10, 20, 30, 40)
             format_string = '<BBBB'
             debug_packed_data = struct.pack(format_string, *debug_data)
-            await self._write_with_target(DEAN_UUID_GRIDEYE_PREDICTION_CHAR, dean_mac, debug_packed_data)
+            await self._write_with_target(DEAN_UUID_GRIDEYE_PREDICTION_CHAR, dean_mac, debug_packed_data, WRITE_UNITSPACE)
             # logging.info("unitspace existence simulation end")
         except Exception as e:
             logging.warning(e)
@@ -652,7 +1147,7 @@ class Device:
             byte_string = command_string.encode("utf-8")
             packed_validity_packet = struct.pack(f"{len(byte_string)}s", byte_string)
             
-            await self._write_with_target(DEAN_UUID_GRIDEYE_PREDICTION_CHAR, dean_mac, packed_validity_packet)
+            await self._write_with_target(DEAN_UUID_GRIDEYE_PREDICTION_CHAR, dean_mac, packed_validity_packet, WRITE_UNITSPACE)
             # logging.info("unitspace existence estimation end")
         except Exception as e:
             logging.warning(e)
@@ -670,6 +1165,7 @@ class Device:
                     break
                 await asyncio.sleep(0.1)
             #OLD CODE: await asyncio.sleep(0.1)
+            self.att_mtu = await self._read_att_mtu()
             config_service = self.get_service_by_uuid(DEAN_UUID_CONFIG_SERVICE)
             if not await self.load_config():
                 if config_service is not None:
@@ -685,33 +1181,46 @@ class Device:
             logging.warning("Error in _connect_device: %s", e)
             raise DeviceError("Device connection failed")
 
+    async def _read_att_mtu(self):
+        # BlueZ reports the minimum MTU until it is acquired through a characteristic
+        backend = getattr(self.ble_client, '_backend', None)
+        if hasattr(backend, '_acquire_mtu'):
+            try:
+                await backend._acquire_mtu()
+            except Exception as e:
+                logging.info('%s: ATT MTU not acquired: %s', self.config_dict['address'], e)
+        try:
+            return self.ble_client.mtu_size
+        except Exception:
+            return 23
+
     async def _ble_worker(self):
         self.ble_client = BleakClient(self.config_dict['address'], disconnected_callback=self._ble_disconnected_callback)
+        # Handles belong to this connection's GATT database
+        self.notify_handlers = {}
         try:
             await self._connect_device()
             self.is_connected = True
             await self.init_services()
+            if self.transfer_resume:
+                asyncio.create_task(self.resume_transfers())
             return True
         except DeviceError as e:
             logging.warning(e)
-            await self.remove()
+            await self.disconnect()
             return False
     
     async def ble_client_start(self):
-        retry_count = 3
-        for attempt in range(retry_count):
-            try:
-                return await self._ble_worker()
-            except DeviceError as e:
-                logging.warning(f"{self.config_dict['address']}: Connection failed, retrying... ({attempt + 1}/{retry_count})")
-                await asyncio.sleep(2)  # 2초 후 재시도
-        logging.error(f"{self.config_dict['address']}: Failed to connect after {retry_count} attempts")
-        return False    
+        # Single attempt; retries and backoff belong to the ReconnectScheduler (reconnect.py)
+        return await self._ble_worker()
             
 
 class DeviceManager:
     # def __init__(self):
 
+    # Last model rollout started with the 'rollout' command
+    rollout = None
+
     def _resolve_connection(self, address):
         device_obj = get_device_by_address(address)
         if device_obj is None:
@@ -724,11 +1233,32 @@ class DeviceManager:
         entry = known_deans.get(identifier)
         if entry is None:
             return None, None, f"{identifier} is not registered"
-        device_obj = get_device_by_address(entry.mac)
+        device_obj = connected_devices.get(entry.relay_address, None)
         if device_obj is None or not device_obj.is_connected:
             return None, entry, f"{identifier} is not connected"
         return device_obj, entry, None
 
+    def _start_rollout(self, identifiers):
+        if self.rollout is not None and self.rollout.running:
+            return "A model rollout is already running"
+        if identifiers == ['all']:
+            entries = list(known_deans.iter_entries())
+        else:
+            entries = []
+            for identifier in identifiers:
+                entry = known_deans.get(identifier)
+                if entry is None:
+                    return f"{identifier} is not registered"
+                entries.append(entry)
+        if not entries:
+            return "No DEAN to update"
+        targets = {}
+        for entry in entries:
+            targets.setdefault(entry.relay_address, []).append(entry.mac)
+        self.rollout = ModelRollout(targets, get_device_by_address)
+        self.rollout.start()
+        return f"Model rollout started: {len(entries)} DEANs on {len(targets)} relays"
+
     async def process_command(self, commands):
         cmd = commands[0]
         device_obj = None
@@ -743,7 +1273,7 @@ class DeviceManager:
             device_obj, error = self._resolve_connection(commands[1])
             if error:
                 return error.encode()
-        elif cmd not in {'list', 'apply'} and len(commands) > 1:
+        elif cmd not in {'list', 'apply', 'rollout'} and len(commands) > 1:
             device_obj, error = self._resolve_connection(commands[1])
             if error:
                 return error.encode()
@@ -780,11 +1310,14 @@ class DeviceManager:
             else:
                 return "Argument 2 must be 'enable', 'disable', 'activate all', 'deactivate all'".encode()
         elif cmd == 'list':
-            entries = list(known_deans.iter_entries())
-            if entries:
-                return_msg = f"{'Dean MAC':<20}{'Relay':<20}{'Type':<10}{'Location':<15}{'Connected':<10}\n"
-                for entry in entries:
-                    return_msg += f"{entry.mac:<20}{entry.relay_address:<20}{entry.device_type:<10}{entry.location:<15}{entry.connected:<10}\n"
+            relays = known_deans.iter_by_relay()
+            if relays:
+                # Grouped by relay through the relay -> DEAN index
+                lines = [f"{'Dean MAC':<20}{'Relay':<20}{'Type':<10}{'Location':<15}{'Connected':<10}\n"]
+                for relay_address, entries in relays:
+                    for entry in entries:
+                        lines.append(f"{entry.mac:<20}{relay_address:<20}{entry.device_type:<10}{entry.location:<15}{entry.connected:<10}\n")
+                return_msg = ''.join(lines)
             else:
                 return_msg = f"{'Address':<20}{'Type':<10}{'Name':<15}{'Location':<15}{'Connected':<10}\n"
                 for value in connected_devices.values():
@@ -792,12 +1325,14 @@ class DeviceManager:
             return return_msg.encode()
 
         elif cmd == 'apply':
-            entries = list(known_deans.iter_entries())
-            if not entries:
+            relays = known_deans.iter_by_relay()
+            if not relays:
                 return "No known DEAN nodes".encode()
-            for entry in entries:
-                device = get_device_by_address(entry.mac)
-                if device and device.is_connected:
+            for relay_address, entries in relays:
+                device = connected_devices.get(relay_address, None)
+                if device is None or not device.is_connected:
+                    continue
+                for entry in entries:
                     await device.load_config(entry.mac)
                     await asyncio.sleep(0.1)
             return "Config data applied".encode()
@@ -806,7 +1341,7 @@ class DeviceManager:
             if commands[2] == 'update':
                 if device_obj.is_model_transfer_active(dean_entry.mac):
                     return f"{dean_entry.mac} Model update is in progress".encode()
-                started = await device_obj.model_update_start(dean_entry.mac)
+                started = await device_obj.model_update_start(dean_entry.mac, True if 'noresp' in commands[3:] else None)
                 if started:
                     return f"{dean_entry.mac} Model update started".encode()
                 return f"{dean_entry.mac} Model file not found".encode()
@@ -821,6 +1356,20 @@ class DeviceManager:
             else:
                 return "Argument 2 must be 'update', 'train' or 'remove'".encode()
 
+        elif cmd == 'rollout':
+            if len(commands) < 2:
+                return "Usage: rollout all | rollout <mac> [<mac> ...] | rollout status | rollout cancel".encode()
+            if commands[1] == 'status':
+                if self.rollout is None:
+                    return "No model rollout".encode()
+                return self.rollout.summary().encode()
+            if commands[1] == 'cancel':
+                if self.rollout is None or not self.rollout.running:
+                    return "No model rollout is running".encode()
+                self.rollout.cancel()
+                return "Model rollout cancelled after the running transfers".encode()
+            return self._start_rollout(commands[1:]).encode()
+
         elif cmd == 'feature':
             if commands[2] == 'start':
                 await device_obj.send_sound_packet(dean_entry.mac, ModelPacket(cmd=FEATURE_COLLECTION_CMD_START))
@@ -838,7 +1387,8 @@ class DeviceManager:
                 return f"File {file_path} does not exist".encode()
             if device_obj.is_file_transfer_active(dean_entry.mac):
                 return f"{dean_entry.mac} File transfer is in progress".encode()
-            await device_obj.file_transfer_start(dean_entry.mac, file_path, target_path)
+            await device_obj.file_transfer_start(dean_entry.mac, file_path, target_path,
+                                                 True if 'noresp' in commands[4:] else None)
             return f"{dean_entry.mac} File transfer started for {file_path} to {target_path}".encode()   
         else:
             print("What? " + cmd + " " + str(type(cmd)))
@@ -0,0 +1,79 @@
+import logging
+from typing import Callable, Dict, Optional
+
+import debug_event
+from debug_event import DebugEvent
+
+env_list = [
+    'temperature',
+    'humidity',
+    'IAQ',
+    'CO2',
+    'bVOC',
+]
+
+# Display line formatter per event kind; the kind is the message's (type, event)
+# pair as classified by debug_event.decode_debugstr
+DISPLAY_FORMATTERS: Dict[str, Callable[[DebugEvent], str]] = {}
+
+
+def formatter(kind: str):
+    def register(func):
+        DISPLAY_FORMATTERS[kind] = func
+        return func
+    return register
+
+
+@formatter(debug_event.SOUND)
+def _format_sound(event: DebugEvent) -> str:
+    # background / unknown 은 표시하지 않음
+    label = event.fields.get('id', 'unknown')
+    if label in ("unknown", "background"):
+        return ""
+    return f"{event.timestamp}  {event.location} [EVENT] - Sound '{label}' was detected\n"
+
+
+@formatter(debug_event.ENV)
+def _format_env(event: DebugEvent) -> str:
+    env_id = event.fields.get('id', -1)
+    label = env_list[env_id] if 0 <= env_id < len(env_list) else "N/A"
+    return f"{event.timestamp}  {event.location} [EVENT] - '{label}' event was detected\n"
+
+
+@formatter(debug_event.ENTER)
+def _format_enter(event: DebugEvent) -> str:
+    return f"{event.timestamp}  {event.location} [EVENT] - ENTER value: {event.fields.get('value', 0)}\n"
+
+
+@formatter(debug_event.EXIT)
+def _format_exit(event: DebugEvent) -> str:
+    return f"{event.timestamp}  {event.location} [EVENT] - EXIT value: {event.fields.get('value', 0)}\n"
+
+
+@formatter(debug_event.INFERENCE)
+def _format_inference(event: DebugEvent) -> str:
+    fields = event.fields
+    status = fields.get('status', '')
+    adl = fields.get('ADL', 'N/A')
+    if status == 'EXCEPTION':
+        return f"{event.timestamp}  {event.location} [INFERENCE] {status}: {adl}, value: {fields.get('value', 0)}\n"
+    return (f"{event.timestamp}  {event.location} [INFERENCE] {status}: {adl}, "
+            f"sequence: {fields.get('sequence', 'N/A')}, truth: {fields.get('truth', 0.0):.2f}, "
+            f"missing: {fields.get('missing', 'None')}\n")
+
+
+@formatter(debug_event.HEAPPRINT)
+def _format_heapprint(event: DebugEvent) -> str:
+    return f"{event.timestamp} {event.location} [HEAP STATE] - {event.fields.get('heap_state', '')}"
+
+
+def format_display_line(event: DebugEvent) -> Optional[str]:
+    """Display line for one event, or None if the event is not shown."""
+    func = DISPLAY_FORMATTERS.get(event.kind)
+    if func is None:
+        return None
+    try:
+        return func(event) or None
+    except Exception as e:
+        logging.error(f"Display format of {event.kind} from {event.address} failed: {e}")
+        return None
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from dean_uuid import dean_service_dict
+
+CharKey = Tuple[str, str]    # (service name, characteristic name)
+
+
+def plan_activation(service_names: Iterable[Optional[str]], enable: Dict[str, List[str]]) -> List[CharKey]:
+    """Characteristics to enable, in the order of the enable table, for the
+    services the relay actually exposes."""
+    present = {name for name in service_names if name is not None}
+    plan = []
+    for service_name, char_names in enable.items():
+        if service_name not in present:
+            continue
+        chars = dean_service_dict.get(service_name, {})
+        for char_name in char_names:
+            if char_name in chars:
+                plan.append((service_name, char_name))
+    return plan
+
+
+class ActivationPipeline:
+    """Runs GATT notify (un)subscriptions with up to window requests in flight.
+
+    Requests are paced by completion only. When the stack reports a failure the
+    window drops to one request and the failed characteristic is retried after
+    an exponentially growing pause; each success widens the window again.
+    """
+
+    window = 4
+    retries = 3
+    backoff_initial = 0.1
+    backoff_max = 1.6
+
+    def __init__(self, window: Optional[int] = None):
+        if window is not None:
+            self.window = max(1, window)
+
+    async def run(self, plan: List[CharKey], op: Callable[[str, str], Awaitable]) -> Dict[CharKey, bool]:
+        results: Dict[CharKey, bool] = {}
+        attempts: Dict[CharKey, int] = {}
+        pending = deque(plan)
+        in_flight = {}
+        limit = self.window
+        backoff = 0.0
+        while pending or in_flight:
+            while pending and len(in_flight) < limit:
+                key = pending.popleft()
+                in_flight[asyncio.ensure_future(op(*key))] = key
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            failed = False
+            for task in done:
+                key = in_flight.pop(task)
+                error = task.exception()
+                if error is None and task.result() is not False:
+                    results[key] = True
+                    continue
+                attempts[key] = attempts.get(key, 0) + 1
+                if error is not None:
+                    logging.warning("%s %s: %s", key[0], key[1], error)
+                if attempts[key] <= self.retries:
+                    pending.append(key)
+                    failed = True
+                else:
+                    results[key] = False
+            if failed:
+                limit = 1
+                backoff = min(self.backoff_max, backoff * 2 if backoff else self.backoff_initial)
+                await asyncio.sleep(backoff)
+            elif done:
+                limit = min(self.window, limit + 1)
+                backoff = 0.0
+        return results
+
+
+async def run_plan(address: str, plan: List[CharKey], op, window: Optional[int] = None, action: str = 'enabled'):
+    start = time.monotonic()
+    results = await ActivationPipeline(window).run(plan, op)
+    ok = sum(results.values())
+    logging.info('%s: %d/%d characteristics %s in %.2f s', address, ok, len(plan), action, time.monotonic() - start)
+    return results
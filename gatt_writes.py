@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import time
+from itertools import count
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Priority classes, lower is served first
+WRITE_CONTROL = 0     # transfer START/END, resets, feature collection
+WRITE_UNITSPACE = 1   # strong_enter/strong_exit and other presence callbacks
+WRITE_CONFIG = 2      # name/location/time
+WRITE_BULK = 3        # transfer DATA chunks
+WRITE_CLASS_NAMES = ('control', 'unitspace', 'config', 'bulk')
+
+
+class WriteClassStats:
+    def __init__(self):
+        self.writes = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.write_total = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+            'wait_avg_ms': self.wait_total / self.writes * 1000 if self.writes else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+            'write_avg_ms': self.write_total / self.writes * 1000 if self.writes else 0.0,
+        }
+
+
+class _PendingWrite:
+    __slots__ = ('priority', 'char_uuid', 'payload', 'response', 'key', 'queued', 'waiters')
+
+    def __init__(self, priority, char_uuid, payload, response, key, queued):
+        self.priority = priority
+        self.char_uuid = char_uuid
+        self.payload = payload
+        self.response = response
+        self.key = key
+        self.queued = queued
+        self.waiters: List[asyncio.Future] = []
+
+
+class GattWriteScheduler:
+    """Serializes one relay's GATT writes by priority class.
+
+    Every downstream write is queued here and a single task issues them, so a
+    unitspace callback waits for at most the write already on the air instead
+    of every bulk chunk queued ahead of it. Within a class writes keep their
+    order. A write submitted with a coalesce key replaces a queued write with
+    the same key that has not started yet (e.g. a name set twice); both callers
+    complete with the newer write.
+    """
+
+    def __init__(self, label: str, write: Callable[[str, bytes, Optional[bool]], Awaitable]):
+        # write(char_uuid, payload, response) performs the GATT write
+        self.label = label
+        self.write = write
+        self.stats: Dict[int, WriteClassStats] = {priority: WriteClassStats() for priority in range(len(WRITE_CLASS_NAMES))}
+        self._heap = []
+        self._order = count()
+        self._coalesce: Dict[Hashable, _PendingWrite] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def submit(self, priority: int, char_uuid: str, payload: bytes, coalesce_key: Optional[Hashable] = None,
+               response: Optional[bool] = None) -> asyncio.Future:
+        # response=False: write without response (ATT write command); None: bleak's default
+        future = asyncio.get_running_loop().create_future()
+        pending = self._coalesce.get(coalesce_key) if coalesce_key is not None else None
+        if pending is not None:
+            pending.payload = payload
+            pending.waiters.append(future)
+            self.stats[priority].coalesced += 1
+        else:
+            pending = _PendingWrite(priority, char_uuid, payload, response, coalesce_key, time.monotonic())
+            pending.waiters.append(future)
+            if coalesce_key is not None:
+                self._coalesce[coalesce_key] = pending
+            heapq.heappush(self._heap, (priority, next(self._order), pending))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        while self._heap:
+            _, _, pending = heapq.heappop(self._heap)
+            if pending.key is not None:
+                self._coalesce.pop(pending.key, None)
+            if all(waiter.done() for waiter in pending.waiters):
+                # Every caller gave up (timeout, cancelled transfer)
+                continue
+            stats = self.stats[pending.priority]
+            start = time.monotonic()
+            wait = start - pending.queued
+            try:
+                result = await self.write(pending.char_uuid, pending.payload, pending.response)
+            except Exception as e:
+                stats.failed += 1
+                for waiter in pending.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            else:
+                stats.writes += 1
+                stats.wait_total += wait
+                stats.wait_max = max(stats.wait_max, wait)
+                stats.write_total += time.monotonic() - start
+                for waiter in pending.waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+
+    def report(self) -> Dict[str, dict]:
+        return {WRITE_CLASS_NAMES[priority]: stats.as_dict() for priority, stats in self.stats.items()}
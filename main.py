@@ -18,6 +18,8 @@ import signal
 import uuid
 
 import device
+from relay_scanner import RelayScanner
+from reconnect import ReconnectScheduler
 
 from process import *
 from dean_uuid import *
@@ -26,9 +28,10 @@ host = 'localhost'
 port = 6604
 
 sound_process = SoundProcess()
-data_process = DataProcess()
+data_process = DataProcessPool()
 
 log_process = LogProcess()
+compactor_process = CompactorProcess()
 
 manager = device.DeviceManager()
 
@@ -53,6 +56,15 @@ hub_config_dict = {
     'type': 'slimhub',
     'owner': None,
     'name': None,
+    'data_processes': 1,
+    'disk_budget_mb': 0,
+    'connect_concurrency': 4,
+    'connect_timeout': 30,
+    'transfer_window': 0,
+    'transfer_varlen': False,
+    'transfer_resume': False,
+    'transfer_delta': False,
+    'transfer_no_response': False,
 }
 
 # Configuration file path
@@ -84,62 +96,116 @@ def save_config():
     with open(config_file, "w", encoding="utf-8") as f:
         json.dump(hub_config_dict, f, indent=4, ensure_ascii=False)
 
+def config_flag(value) -> bool:
+    # Booleans set through --hubconfig arrive as strings; bool("false") would be True
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ('true', '1', 'yes', 'on'):
+            return True
+        if lowered in ('false', '0', 'no', 'off', ''):
+            return False
+        raise ValueError(f"Not a boolean: {value}")
+    return bool(value)
+
 # Update configuration field
 def update_config(key, value):
     if key in hub_config_dict:
+        # Stored with the type of the default so config.json keeps real booleans and numbers
+        default = hub_config_dict[key]
+        try:
+            if isinstance(default, bool):
+                value = config_flag(value)
+            elif isinstance(default, int):
+                value = int(value)
+            elif isinstance(default, float):
+                value = float(value)
+        except ValueError as e:
+            logging.warning("Invalid value for %s: %s", key, e)
+            print(f"Invalid value for {key}: {value}")
+            return
         hub_config_dict[key] = value
         save_config()
         logging.info("Updated %s to %s", key, value)
     else:
         logging.warning("Invalid config key: %s", key)
 
-async def main_worker(server):
-    async def scan():
-        target_devices = []
+async def connect_relay(current_device, limit, timeout):
+    # One relay's connect + service init; the semaphore bounds how many run at once
+    address = current_device.config_dict['address']
+    async with limit:
         try:
-            devices = await BleakScanner.discover(return_adv=True, timeout=2)
-        except Exception as e:
-            logging.warning(e)
-            return None
-        else:
-            for dev in devices.values():
-                if DEAN_UUID_BASE_SERVICE in dev[1].service_uuids:
-                    target_devices.append(dev[0])
-            return target_devices
-
-    while True:
-        if quit_event.is_set():
-            server.close()
-            await server.wait_closed()  # MODIFIED: wait for server to fully close
-            return
+            connected = await asyncio.wait_for(current_device.ble_client_start(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning('%s connection timed out after %s s', address, timeout)
+            await current_device.disconnect()
+            connected = False
+    logging.info('%s %s', address, 'connected' if connected else 'connection failed')
+    return connected
 
-        target_devices = await scan()
-        if target_devices is None:
-            await asyncio.sleep(10)
-            continue
-
-        for dev in target_devices:
-            current_device = device.get_device_by_address(dev.address)
-            if current_device is None:
-                if dev.name == "DE&N_RELAY":
-                    current_device = device.Device(dev)
-                    # current_device.manager_queue = manager.get_queue()  # remains for legacy usage if needed
-                    current_device.sound_queue = sound_process.get_queue()
-                    current_device.data_queue = data_process.get_queue()
-                    # current_device.unitspace_queue = unitspace_process.get_queue()
-                    current_device.log_queue = log_process.get_queue()
-
-                    if await current_device.ble_client_start():
-                        logging.info('%s connected', dev)
-                    else:
-                        logging.info('%s connection failed', dev)
-            else:
-                if await current_device.ble_client_start():
-                    logging.info('%s reconnected', dev)
-                else:
-                    logging.info('%s reconnection failed', dev)
-            await asyncio.sleep(0.1)
-        await asyncio.sleep(10)
+async def main_worker(server):
+    connect_limit = asyncio.Semaphore(max(1, int(hub_config_dict.get('connect_concurrency', 4))))
+    connect_timeout = float(hub_config_dict.get('connect_timeout', 30))
+    # Every connection attempt runs as its own task with per-relay backoff (reconnect.py)
+    scheduler = ReconnectScheduler(partial(connect_relay, limit=connect_limit, timeout=connect_timeout))
+
+    def on_relay(dev):
+        # Called by the scanner for every relay advertisement
+        current_device = device.get_device_by_address(dev.address)
+        if current_device is None:
+            current_device = device.Device(dev)
+            # current_device.manager_queue = manager.get_queue()  # remains for legacy usage if needed
+            current_device.sound_queue = sound_process.get_queue()
+            current_device.data_queue = data_process.get_queue()
+            # current_device.unitspace_queue = unitspace_process.get_queue()
+            current_device.log_queue = log_process.get_queue()
+            # Dropped links are retried directly on the known address
+            current_device.on_disconnect = scheduler.schedule
+        elif current_device.is_connected:
+            return
+        scheduler.request(dev.address, current_device)
+
+    # Persistent scan filtered on the DEAN base service; relays are connected the
+    # moment they advertise, including ones that dropped and came back
+    # Idle restarts are held while every known relay is connected
+    scanner = RelayScanner(on_relay, lambda: bool(device.connected_devices) and
+                           all(dev.is_connected for dev in list(device.connected_devices.values())))
+    await scanner.run(quit_event)
+
+    await scheduler.close()
+    server.close()
+    await server.wait_closed()  # MODIFIED: wait for server to fully close
+
+def worker_queues():
+    return sound_process.queues() + data_process.queues() + log_process.queues()
+
+def queue_report():
+    lines = [f"{'Queue':<15}{'Depth':>8}{'HighWater':>11}{'Put':>10}{'Spilled':>10}{'Backlog':>10}{'Dropped':>10}"]
+    for q in worker_queues():
+        r = q.report()
+        lines.append(f"{q.name:<15}{r['depth']:>8}{r['high_water']:>11}{r['put']:>10}{r['spilled']:>10}{r['spill_backlog']:>10}{r['dropped']:>10}")
+        for address, count in sorted(r['dropped_by_dean'].items()):
+            lines.append(f"  {address:<20} dropped {count}")
+    # Per-relay GATT write queue (gatt_writes.py), latency per priority class
+    lines.append(f"{'Relay writes':<28}{'Class':<11}{'Writes':>8}{'Merged':>8}{'Failed':>8}{'WaitAvg':>9}{'WaitMax':>9}{'Write':>8}")
+    for dev in list(device.connected_devices.values()):
+        for name, r in dev.writes.report().items():
+            if r['writes'] or r['failed']:
+                lines.append(f"{dev.config_dict['address']:<28}{name:<11}{r['writes']:>8}{r['coalesced']:>8}{r['failed']:>8}"
+                             f"{r['wait_avg_ms']:>7.1f}ms{r['wait_max_ms']:>7.1f}ms{r['write_avg_ms']:>6.1f}ms")
+    return "\n".join(lines)
+
+async def queue_maintenance_worker(pump_interval=0.2, report_interval=300):
+    # Replays spilled notifications once the workers catch up and logs drop counters;
+    # pump() does the spill file I/O, so it runs off the event loop
+    loop = asyncio.get_running_loop()
+    last_report = time.monotonic()
+    while not quit_event.is_set():
+        for q in worker_queues():
+            await loop.run_in_executor(None, q.pump)
+        if time.monotonic() - last_report >= report_interval:
+            last_report = time.monotonic()
+            logging.info("Worker queues:\n%s", queue_report())
+        await asyncio.sleep(pump_interval)
 
 async def cli_handler(reader, writer):
     def parse_message(msg):
@@ -158,6 +224,9 @@ async def cli_handler(reader, writer):
             await writer.drain()
             # MODIFIED: Signal quit_event and send sentinel command to DeviceManager via ipc_queue
             quit_event.set()
+        elif data[0] == 'stats':
+            writer.write(queue_report().encode())
+            await writer.drain()
         else:
             return_msg = await manager.process_command(data)
             writer.write(return_msg)
@@ -192,6 +261,7 @@ async def shutdown_all_tasks():
 async def async_main():
     server = await asyncio.start_server(cli_handler, host, port)
     main_task = asyncio.create_task(main_worker(server))
+    maintenance_task = asyncio.create_task(queue_maintenance_worker())
     try: 
         async with server:
             await server.serve_forever()
@@ -199,6 +269,8 @@ async def async_main():
         pass
     finally:
         await main_task
+        maintenance_task.cancel()
+        await asyncio.gather(maintenance_task, return_exceptions=True)
         
         from device import connected_devices
         for dev in list(connected_devices.values()):
@@ -211,11 +283,20 @@ async def async_main():
         # Gracefully shutdown child processes via their stop() (which now sends shutdown sentinel)
         sound_process.stop()     
         data_process.stop()     
-        log_process.stop()
+        compactor_process.stop()
 
-        sound_process.process.join()
-        data_process.process.join()
-        log_process.process.join()
+        sound_process.join()
+        data_process.join()
+        # LogProcess is fed by the data writers, so it stops after them
+        log_process.stop()
+        log_process.join()
+        compactor_process.join()
+
+        logging.info("Worker queues at shutdown:\n%s", queue_report())
+        sound_process.close()
+        data_process.close()
+        log_process.close()
+        compactor_process.close()
         
         logging.info('Exiting slimhub server')
         
@@ -233,6 +314,7 @@ if __name__ == "__main__":
     parser.add_argument('-a', '--apply', action='store_true', help='apply config file')
     parser.add_argument('-l', '--list', action='store_true', help='list registered devices')
     parser.add_argument('-q', '--quit', action='store_true', help='quit slimhub client')
+    parser.add_argument('--stats', action='store_true', help='show worker queue depth and drop counters')
     parser.add_argument('--hubconfig', nargs=2, help='Update hub configuration', metavar=('key', 'value'))
     parser.add_argument('--reset', nargs=1, help='reset device',
                         metavar=('address'))
@@ -240,6 +322,9 @@ if __name__ == "__main__":
                         metavar=('address', 'command'))
     parser.add_argument('--file', nargs=3, help='file transfer to sd card',
                         metavar=('address', 'file_path', 'save_path'))
+    parser.add_argument('--no-response', action='store_true',
+                        help='with --model update / --file: send DATA chunks as write without response '
+                             '(windowed transfers that fit the ATT MTU only)')
 
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
@@ -254,10 +339,19 @@ if __name__ == "__main__":
 
         # Execute configuration loading
         load_or_create_config()
+        data_process.size = int(hub_config_dict.get('data_processes', 1))
+        compactor_process.disk_budget = int(hub_config_dict.get('disk_budget_mb', 0)) * 1024 * 1024
+        device.Device.transfer_window = int(hub_config_dict.get('transfer_window', 0))
+        device.Device.transfer_varlen = config_flag(hub_config_dict.get('transfer_varlen', False))
+        device.Device.transfer_resume = config_flag(hub_config_dict.get('transfer_resume', False))
+        device.Device.transfer_delta = config_flag(hub_config_dict.get('transfer_delta', False))
+        device.Device.transfer_no_response = config_flag(hub_config_dict.get('transfer_no_response', False))
         
         sound_process.start()
-        data_process.start()
         log_process.start()
+        data_process.log_queue = log_process.get_queue()
+        data_process.start()
+        compactor_process.start()
         try:
             asyncio.run(async_main())
         except KeyboardInterrupt:
@@ -268,6 +362,10 @@ if __name__ == "__main__":
         send_command('reset', args_dict)
     if args.service:
         send_command('service', args_dict)
+    if args.no_response:
+        for cmd in ('model', 'file'):
+            if args_dict[cmd]:
+                args_dict[cmd].append('noresp')
     if args.model:
         send_command('model', args_dict)
     if args.feature:
@@ -278,6 +376,8 @@ if __name__ == "__main__":
         send_command('list', args_dict)
     if args.quit:
         send_command('quit', args_dict)
+    if args.stats:
+        send_command('stats', args_dict)
     if args.file:
         send_command('file', args_dict)
     if args.hubconfig:
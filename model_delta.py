@@ -0,0 +1,123 @@
+"""Delta encoding of model updates against the model already on the DEAN.
+
+Stream layout (little endian), optionally deflated after the header:
+
+    header  '<4s B I I I'  magic b'MDL1', flags, base size, target size, target CRC-32
+    COPY    '<B I I'       0x01, base offset, length
+    ADD     '<B I'         0x02, length, followed by `length` literal bytes
+
+With an empty base the stream is a single ADD, i.e. a compressed full model.
+decode() is the reference for the firmware side. It stops once the target
+size is reached, so the 0xFF padding of fixed-size DATA packets is ignored.
+"""
+import struct
+import zlib
+
+MAGIC = b'MDL1'
+HEADER = struct.Struct('<4s B I I I')
+COPY = struct.Struct('<B I I')
+ADD = struct.Struct('<B I')
+
+FLAG_DEFLATE = 0x01
+OP_COPY = 0x01
+OP_ADD = 0x02
+
+BLOCK = 32
+
+
+def _extend(base: bytes, target: bytes, off: int, pos: int) -> int:
+    # Length of the common run of base[off:] and target[pos:]
+    limit = min(len(base) - off, len(target) - pos)
+    length = 0
+    for step in (4096, 256, 16, 1):
+        while length + step <= limit and base[off + length:off + length + step] == target[pos + length:pos + length + step]:
+            length += step
+    return length
+
+
+def _ops(base: bytes, target: bytes, block: int):
+    index = {}
+    for off in range(0, len(base) - block + 1, block):
+        index.setdefault(base[off:off + block], off)
+    ops = []
+    pos = add_start = 0
+    shift = 0   # base offset - target offset of the last copy; models mostly change in place
+    while pos + block <= len(target):
+        window = target[pos:pos + block]
+        off = pos + shift
+        if not (0 <= off <= len(base) - block and base[off:off + block] == window):
+            off = index.get(window)
+            if off is None:
+                pos += 1
+                continue
+        # Grow the match backwards into the pending literals, then forwards
+        while pos > add_start and off > 0 and base[off - 1] == target[pos - 1]:
+            pos -= 1
+            off -= 1
+        length = _extend(base, target, off, pos)
+        if pos > add_start:
+            ops.append((OP_ADD, add_start, pos))
+        ops.append((OP_COPY, off, length))
+        pos += length
+        add_start = pos
+        shift = off + length - pos
+    if add_start < len(target):
+        ops.append((OP_ADD, add_start, len(target)))
+    return ops
+
+
+def encode(base: bytes, target: bytes, compress: bool = True, block: int = BLOCK) -> bytes:
+    base = bytes(base)
+    target = bytes(target)
+    body = bytearray()
+    for op in _ops(base, target, block) if base else [(OP_ADD, 0, len(target))]:
+        if op[0] == OP_COPY:
+            body += COPY.pack(*op)
+        else:
+            body += ADD.pack(OP_ADD, op[2] - op[1])
+            body += target[op[1]:op[2]]
+    flags = 0
+    if compress:
+        deflated = zlib.compress(bytes(body), 9)
+        if len(deflated) < len(body):
+            body, flags = deflated, FLAG_DEFLATE
+    return HEADER.pack(MAGIC, flags, len(base), len(target), zlib.crc32(target)) + bytes(body)
+
+
+def decode(base: bytes, delta: bytes) -> bytes:
+    try:
+        return _decode(base, delta)
+    except (struct.error, zlib.error) as e:
+        # Truncated or corrupted stream
+        raise ValueError(f"Malformed model delta: {e}") from e
+
+
+def _decode(base: bytes, delta: bytes) -> bytes:
+    magic, flags, base_size, target_size, crc = HEADER.unpack_from(delta)
+    if magic != MAGIC:
+        raise ValueError("Not a model delta")
+    if base_size != len(base):
+        raise ValueError(f"Delta is for a {base_size}-byte base, have {len(base)} bytes")
+    body = delta[HEADER.size:]
+    if flags & FLAG_DEFLATE:
+        body = zlib.decompressobj().decompress(body)
+    out = bytearray()
+    pos = 0
+    while len(out) < target_size and pos < len(body):
+        op = body[pos]
+        if op == OP_COPY:
+            _, off, length = COPY.unpack_from(body, pos)
+            if off + length > len(base):
+                raise ValueError("COPY outside the base model")
+            out += base[off:off + length]
+            pos += COPY.size
+        elif op == OP_ADD:
+            _, length = ADD.unpack_from(body, pos)
+            pos += ADD.size
+            out += body[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f"Unknown delta op {op}")
+    if len(out) != target_size or zlib.crc32(out) != crc:
+        raise ValueError("Decoded model does not match the delta header")
+    return bytes(out)
@@ -8,11 +8,62 @@ MODEL_UPDATE_CMD_END = 3
 MODEL_UPDATE_CMD_REMOVE = 4
 MODEL_UPDATE_CMD_FAIL = 11
 
+# Capability block appended to a transfer START (hub -> relay) and echoed in the
+# relay's START reply with the values it accepts. Firmware that does not know
+# the block ignores the trailing bytes and answers with a plain START, which
+# keeps the transfer in stop-and-wait mode.
+TRANSFER_CAP_WINDOW = 0x01      # cumulative ACKs, up to `window` chunks in flight
+TRANSFER_CAP_VARLEN = 0x02      # unpadded DATA packets carrying up to `chunk` bytes
+TRANSFER_CAP_RESUME = 0x04      # continue an interrupted transfer of `digest` at chunk `resume`
+TRANSFER_CAP_DELTA = 0x08       # payload is a model_delta stream against the model `base` on the DEAN
+
 FEATURE_COLLECTION_CMD_START = 5
 FEATURE_COLLECTION_CMD_DATA = 6
 FEATURE_COLLECTION_CMD_FINISH = 7
 FEATURE_COLLECTION_CMD_END = 8
 
+@dataclass
+class TransferCapabilities:
+    flags: int = 0   # uint8_t
+    window: int = 0  # uint8_t
+    chunk: int = 0   # uint16_t, DATA payload bytes
+    resume: int = 0  # uint16_t, first chunk to send
+    digest: int = 0  # uint32_t, first four bytes of the payload's SHA-256
+    base: int = 0    # uint32_t, same for the model a delta applies to (0: no model)
+
+    def pack(self) -> bytes:
+        """Pack the capability block (appended after a START packet)."""
+        return struct.pack('<B B H H I I', self.flags, self.window, self.chunk, self.resume, self.digest, self.base)
+
+    @classmethod
+    def unpack_reply(cls, packet_data: bytes) -> 'TransferCapabilities':
+        """Capabilities granted in a START reply; a plain 1-byte START grants none."""
+        if len(packet_data) < 3:
+            return cls()
+        flags, window = struct.unpack('<B B', packet_data[1:3])
+        chunk = struct.unpack('<H', packet_data[3:5])[0] if len(packet_data) >= 5 else 0
+        resume = struct.unpack('<H', packet_data[5:7])[0] if len(packet_data) >= 7 else 0
+        digest = struct.unpack('<I', packet_data[7:11])[0] if len(packet_data) >= 11 else 0
+        base = struct.unpack('<I', packet_data[11:15])[0] if len(packet_data) >= 15 else 0
+        return cls(flags=flags, window=window, chunk=chunk, resume=resume, digest=digest, base=base)
+
+    @property
+    def windowed(self) -> bool:
+        return bool(self.flags & TRANSFER_CAP_WINDOW) and self.window > 1
+
+    @property
+    def varlen(self) -> bool:
+        return bool(self.flags & TRANSFER_CAP_VARLEN) and self.chunk > 0
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.flags & TRANSFER_CAP_RESUME)
+
+    @property
+    def delta(self) -> bool:
+        return bool(self.flags & TRANSFER_CAP_DELTA)
+
+
 # Base packet class with only the cmd field
 @dataclass
 class ModelPacket:
@@ -56,7 +107,8 @@ class ModelDataPacket(ModelPacket):
     def pack(self) -> bytes:
         """Pack the cmd, seq, and data fields into a bytes object."""
         packet_format = '<B H 128s'
-        padded_data = self.data.ljust(128, b'\xFF')  # Ensure data is 128 bytes
+        # data may be any bytes-like object (transfers hand out memoryview slices)
+        padded_data = bytes(self.data).ljust(128, b'\xFF')  # Ensure data is 128 bytes
         return struct.pack(packet_format, self.cmd, self.seq, padded_data)
 
     @classmethod
@@ -64,6 +116,25 @@ class ModelDataPacket(ModelPacket):
         """Unpack bytes into a ModelDataPacket object."""
         cmd, seq, data = struct.unpack('<B H 128s', packet_data[:131])
         return cls(cmd=cmd, seq=seq, data=data)
+
+
+# Unpadded data packet (TRANSFER_CAP_VARLEN): the last chunk is sent as is
+@dataclass
+class VarModelDataPacket(ModelPacket):
+    seq: int  # uint16_t
+    data: bytes  # up to the negotiated chunk size
+
+    header = struct.Struct('<B H')
+
+    def pack(self) -> bytes:
+        """Pack the cmd and seq fields followed by the data as is."""
+        return self.header.pack(self.cmd, self.seq) + bytes(self.data)
+
+    @classmethod
+    def unpack(cls, packet_data: bytes) -> 'VarModelDataPacket':
+        """Unpack bytes into a VarModelDataPacket object."""
+        cmd, seq = cls.header.unpack_from(packet_data)
+        return cls(cmd=cmd, seq=seq, data=bytes(packet_data[cls.header.size:]))
     
 @dataclass
 class SoundFeaturePacket:
@@ -132,11 +203,32 @@ class FileDataPacket(FilePacket):
     def pack(self) -> bytes:
         """Pack the cmd, seq, and data fields into a bytes object."""
         packet_format = '<B H H 128s'
-        padded_data = self.data.ljust(128, b'\xFF')  # Ensure data is 128 bytes
+        # data may be any bytes-like object (transfers hand out memoryview slices)
+        padded_data = bytes(self.data).ljust(128, b'\xFF')  # Ensure data is 128 bytes
         return struct.pack(packet_format, self.cmd, self.seq, self.size, padded_data)
 
     @classmethod
     def unpack(cls, packet_data: bytes) -> 'FileDataPacket':
         """Unpack bytes into a FileDataPacket object."""
         cmd, seq, size, data = struct.unpack('<B H H 128s', packet_data[:133])
-        return cls(cmd=cmd, seq=seq, size=size, data=data)
\ No newline at end of file
+        return cls(cmd=cmd, seq=seq, size=size, data=data)
+
+
+# Unpadded data packet (TRANSFER_CAP_VARLEN); size is the length of data
+@dataclass
+class VarFileDataPacket(FilePacket):
+    seq: int  # uint16_t
+    size: int
+    data: bytes  # up to the negotiated chunk size
+
+    header = struct.Struct('<B H H')
+
+    def pack(self) -> bytes:
+        """Pack the cmd, seq and size fields followed by the data as is."""
+        return self.header.pack(self.cmd, self.seq, self.size) + bytes(self.data)
+
+    @classmethod
+    def unpack(cls, packet_data: bytes) -> 'VarFileDataPacket':
+        """Unpack bytes into a VarFileDataPacket object."""
+        cmd, seq, size = cls.header.unpack_from(packet_data)
+        return cls(cmd=cmd, seq=seq, size=size, data=bytes(packet_data[cls.header.size:cls.header.size + size]))
\ No newline at end of file
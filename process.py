@@ -13,12 +13,21 @@ from dataclasses import dataclass
 
 import paho.mqtt.client as mqtt
 import sysv_ipc
+import zlib
+import re
 import queue  # MODIFIED: for Empty exception in manager_main (if needed)
 
 import soundfile as sf
 import librosa
 
 from decoder import Decoder
+from data_writer import AppendWriter
+import record_store
+from shm_ring import make_worker_queue
+from backpressure import GuardedQueue, SpillSegment
+import compactor
+from debug_event import decode_debugstr
+from display_format import env_list, format_display_line
 from packet import *
 from dean_uuid import *
 
@@ -40,23 +49,46 @@ sound_classlist = [
 ]
 num_sound_labels = len(sound_classlist)
 
-env_list = [
-    'temperature',
-    'humidity',
-    'IAQ',
-    'CO2',
-    'bVOC',
-]
-
 # Base Process class
 class Process:
     queue = None
     process = None
+    name = None
+
+    # Batch mode: each wakeup drains up to batch_size items or waits batch_wait seconds
+    batch_size = 64
+    batch_wait = 0.02
+
+    # Notifications reach the workers through a shared-memory ring (shm_ring.py);
+    # set use_shared_memory = False to fall back to a plain mp.Queue
+    use_shared_memory = True
+    queue_capacity = 1024
+
+    # Overflow handling when the worker falls behind (backpressure.py): spill to
+    # disk and replay later, or drop and count
+    spill_to_disk = False
+    spill_max_bytes = 64 * 1024 * 1024
+    spill_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "programdata", "spill")
+    # Set when the producers are other worker processes, so their put/drop
+    # counters still reach queue_report() in the main process
+    shared_stats = False
 
     def get_queue(self):
         return self.queue
     
+    def open_queue(self):
+        # The transport is created here so CLI-only invocations never allocate shared memory
+        if self.queue is None:
+            name = self.name or self.__class__.__name__
+            spill = None
+            if self.spill_to_disk:
+                spill = SpillSegment(os.path.join(self.spill_dir, name + ".spill"), self.spill_max_bytes)
+            self.queue = GuardedQueue(name, make_worker_queue(self.queue_capacity, self.use_shared_memory), spill,
+                                      shared_stats=self.shared_stats)
+        return self.queue
+
     def start(self):
+        self.open_queue()
         self.process.start()
     
     def stop(self):
@@ -64,31 +96,57 @@ class Process:
         if self.queue is not None:
             self.queue.put(None)
 
+    def join(self):
+        self.process.join()
+
+    def close(self):
+        # Release the transport once the process has been joined
+        if self.queue is not None:
+            self.queue.close()
+
+    def queues(self):
+        return [self.queue] if self.queue is not None else []
+
+    def _get_batch(self, timeout=None):
+        # Returns (items, stop). Blocks up to timeout for the first item, then keeps
+        # draining until the batch is full, batch_wait has passed or the queue is empty.
+        try:
+            item = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return [], False
+        items = []
+        deadline = time.monotonic() + self.batch_wait
+        while item is not None:
+            items.append(item)
+            if len(items) >= self.batch_size:
+                return items, False
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                return items, False
+        return items, True
+
 class SoundProcess(Process):
     feature_buffer = {}
+    spill_to_disk = True
 
     def __init__(self):
-        self.queue = mp.Queue()
+        self.queue = None
         self.process = mp.Process(target=self._run)
         self.buffer = {}
 
-    def _run(self):
-        path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "programdata", "datasets")
-        while True:
-            item = self.queue.get()
-            if item is None:  # MODIFIED: shutdown signal detected
-                break
-            location, device_type, address, service_name, char_name, received_time, data = item
-            time_dt = datetime.fromtimestamp(received_time)
+    def _handle_address_batch(self, path_base, address, items):
+        buffer = self.buffer.setdefault(address, [])
+        for location, device_type, _, service_name, char_name, received_time, data in items:
             data_packet = SoundFeaturePacket.unpack(data)
-            if address not in self.buffer:
-                self.buffer[address] = []
             if data_packet.cmd == FEATURE_COLLECTION_CMD_DATA:
-                self.buffer[address].append(data_packet.data)
+                buffer.append(data_packet.data)
             elif data_packet.cmd == FEATURE_COLLECTION_CMD_FINISH:
                 # save buffer to file
-                if len(self.buffer[address]) > 0:
-                    feature = np.array(self.buffer[address])
+                if len(buffer) > 0:
+                    time_dt = datetime.fromtimestamp(received_time)
+                    feature = np.array(buffer)
                     dir_path = os.path.join(path_base, address, "features", time_dt.strftime("%Y-%m-%d"))
                     try:
                         os.makedirs(dir_path, exist_ok=True)
@@ -97,77 +155,277 @@ class SoundProcess(Process):
                     filename = time_dt.strftime("%H:%M:%S") + ".npz"
                     # save to npz
                     np.savez(os.path.join(dir_path, filename), feature=feature)
-                    self.buffer[address] = []
+                    buffer = self.buffer[address] = []
+
+    def _run(self):
+        path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "programdata", "datasets")
+        stop = False
+        while not stop:
+            items, stop = self._get_batch()
+            # Group by DEAN so each address buffer is looked up once per batch
+            groups = {}
+            for item in items:
+                groups.setdefault(item[2], []).append(item)
+            for address, group in groups.items():
+                self._handle_address_batch(path_base, address, group)
             
 
 class DataProcess(Process):
-    def __init__(self):
-        self.queue = mp.Queue()
-        self.process = mp.Process(target=self._run)
+    # Also keep inference/rawdata in the fixed-width binary store (record_store.py)
+    binary_rawdata = True
+    spill_to_disk = True
 
-    def _rawdata_result_handling_func(self, location, device_type, address, service_name, char_name, received_time, data, mode='a'):
-        def swapEndianness(hexstring):
-            ba = bytearray.fromhex(hexstring)
-            ba.reverse()
-            return ba.hex()
+    def __init__(self, shard=0, log_queue=None):
+        self.queue = None
+        self.process = mp.Process(target=self._run)
+        self.writer = None
+        self.shard = shard
+        self.name = f"DataProcess-{shard}"
+        # Decoded debugstr events are forwarded to LogProcess
+        self.log_queue = log_queue
+
+    @staticmethod
+    def journal_path(shard):
+        return os.path.join(os.path.dirname(os.path.realpath(__file__)), "programdata", f"data_writer-{shard}.journal")
+
+    def _format_record(self, location, device_type, address, service_name, char_name, received_time, data):
+        # Returns the (path, data, header, minute) appends produced by one notification;
+        # minute feeds the per-file minute index (data_index.py) and is None for .bin records
+        if service_name != "inference":
+            return []
 
         path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
         dir_path = os.path.join(path_base, location, device_type, address, service_name, char_name)
-        try:
-            os.makedirs(dir_path, exist_ok=True)
-        except:
-            pass
 
         time_dt = datetime.fromtimestamp(received_time)
         filename = time_dt.strftime("%Y-%m-%d") + ".txt"
         final_path = os.path.join(dir_path, filename)
-        tmp_path = final_path + ".tmp"
-
-        # Write into tmp file by appending to the existing file content
-        with open(tmp_path, 'w') as tmp_file:
-            # Copy existing content if present
-            if os.path.exists(final_path):
-                with open(final_path, 'r') as original_file:
-                    tmp_file.write(original_file.read())
+        minute = time_dt.hour * 60 + time_dt.minute
+
+        if char_name == "rawdata":
+            header = "time,GridEye,Direction,ENV,temp,humid,iaq,eco2,bvoc," + "SOUND," + ",".join(sound_classlist) + "\n"
+
+            fmt = '<BBBfffff' + 'B' + str(num_sound_labels) + 'b'
+            inference_unpacked_data = struct.unpack(fmt, data[:24 + num_sound_labels])
+            dequantized_values = [(value + 128) / 256 for value in inference_unpacked_data[-num_sound_labels:]]
+            dequantized_str = ','.join(map(str, dequantized_values))
+            file_msg_final = ','.join(map(str, inference_unpacked_data[:-num_sound_labels])) + ',' + dequantized_str
+            line = time_dt.strftime("%Y-%m-%d %H:%M:%S") + "," + file_msg_final + "\n"
+            records = [(final_path, line.encode('utf-8'), header.encode('utf-8'), minute)]
+
+            if self.binary_rawdata:
+                bin_path = os.path.join(dir_path, time_dt.strftime("%Y-%m-%d") + record_store.STORE_SUFFIX)
+                records.append((bin_path, record_store.pack_record(received_time, data), record_store.store_header(), None))
+            return records
+
+        elif char_name == "debugstr":
+            return self._format_debug_event(decode_debugstr(location, device_type, address, received_time, data))
+        return []
+
+    def _format_debug_event(self, event):
+        time_dt = datetime.fromtimestamp(event.received_time)
+        path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+        final_path = os.path.join(path_base, event.location, event.device_type, event.address,
+                                  "inference", "debugstr", time_dt.strftime("%Y-%m-%d") + ".txt")
+        return [(final_path, event.data_line().encode('utf-8'), b'', time_dt.hour * 60 + time_dt.minute)]
 
-            # Start appending new logs
-            if service_name == "inference":
-                if char_name == "rawdata":
-                    if not os.path.exists(final_path) or os.path.getsize(final_path) == 0:
-                        tmp_file.write("time,GridEye,Direction,ENV,temp,humid,iaq,eco2,bvoc,")
-                        tmp_file.write("SOUND," + ",".join(sound_classlist) + "\n")
-
-                    fmt = '<BBBfffff' + 'B' + str(num_sound_labels) + 'b'
-                    inference_unpacked_data = struct.unpack(fmt, data[:24 + num_sound_labels])
-                    dequantized_values = [(value + 128) / 256 for value in inference_unpacked_data[-num_sound_labels:]]
-                    dequantized_str = ','.join(map(str, dequantized_values))
-                    file_msg_final = ','.join(map(str, inference_unpacked_data[:-num_sound_labels])) + ',' + dequantized_str
-                    tmp_file.write(time_dt.strftime("%Y-%m-%d %H:%M:%S") + "," + file_msg_final + "\n")
-
-                elif char_name == "debugstr":
-                    try:
-                        debug_string = data.decode('utf-8') if isinstance(data, bytearray) else str(data)
-                        debug_dict = json.loads(debug_string)
-                        debug_dict["timestamp"] = time_dt.strftime("%Y-%m-%d %H:%M:%S")
-                        json.dump(debug_dict, tmp_file, ensure_ascii=False)
-                        tmp_file.write("\n")
-                    except json.JSONDecodeError:
-                        debug_string = data.decode('utf-8') if isinstance(data, bytearray) else str(data)
-                        line = debug_string.rstrip("\n")
-                        tmp_file.write(f"{time_dt.strftime('%Y-%m-%d %H:%M:%S')},{line}\n")
+    def _rawdata_result_handling_func(self, location, device_type, address, service_name, char_name, received_time, data, mode='a'):
+        # Lines are buffered by the writer and appended in journaled batches
+        for path, record, header, minute in self._format_record(location, device_type, address, service_name, char_name, received_time, data):
+            self.writer.write(path, record, header=header, minute=minute)
+
+    def _handle_batch(self, items):
+        # Group appends by destination file so each file gets one write per batch
+        groups = {}
+        for item in items:
+            if item[3] == "inference" and item[4] == "debugstr":
+                # Parsed once here, then shared with LogProcess
+                event = decode_debugstr(item[0], item[1], item[2], item[5], item[6])
+                if event.fields is None:
+                    logging.error(f"Invalid debugstr JSON from {event.address}: {event.text!r}")
+                elif event.kind is not None and self.log_queue is not None:
+                    self.log_queue.put(event)
+                records = self._format_debug_event(event)
             else:
-                return
+                records = self._format_record(*item)
+            for path, record, header, minute in records:
+                group = groups.get(path)
+                if group is None:
+                    group = groups[path] = (header, [], [])
+                group[1].append(record)
+                group[2].append(minute)
+        for path, (header, records, minutes) in groups.items():
+            self.writer.write_many(path, records, header=header, minutes=minutes)
+
+    def _run(self):
+        self.writer = AppendWriter(self.journal_path(self.shard))
+        self.writer.recover()
+        stop = False
+        while not stop:
+            items, stop = self._get_batch(timeout=self.writer.next_flush_delay())
+            self._handle_batch(items)
+            self.writer.flush_if_due()
+        self.writer.close()
+
+
+class ShardRouter:
+    """Producer-side queue that routes each notification to a DataProcess shard
+    by a hash of the DEAN MAC, so a daily file is only ever written by one shard."""
+
+    def __init__(self, queues):
+        self.queues = queues
+        self._routes = {}
+
+    def _route(self, address):
+        q = self._routes.get(address)
+        if q is None:
+            q = self._routes[address] = self.queues[zlib.crc32(address.encode('utf-8')) % len(self.queues)]
+        return q
+
+    def put(self, item, block=False, timeout=None):
+        self._route(item[2]).put(item)
+
+    put_nowait = put
+
+    def full(self):
+        return False
+
+
+class DataProcessPool:
+    # Number of writer processes; main.py sets this from 'data_processes' in programdata/config.json
+    size = 1
+    # Spill segments of the previous pool are renamed to this while being re-routed
+    REROUTE_SUFFIX = '.reroute'
+
+    def __init__(self, size=None, log_queue=None):
+        if size is not None:
+            self.size = size
+        self.workers = []
+        self.router = None
+        # LogProcess queue the shards forward decoded debugstr events to (set before start)
+        self.log_queue = log_queue
+
+    def get_queue(self):
+        return self.router
+
+    def queues(self):
+        return [q for worker in self.workers for q in worker.queues()]
+
+    def start(self):
+        size = max(1, int(self.size))
+        # Journals left by shards that no longer exist after a resize
+        journal_dir = os.path.dirname(DataProcess.journal_path(0))
+        if os.path.isdir(journal_dir):
+            for filename in os.listdir(journal_dir):
+                if filename.startswith("data_writer-") and filename.endswith(".journal"):
+                    shard = filename[len("data_writer-"):-len(".journal")]
+                    if shard.isdigit() and int(shard) >= size:
+                        orphan = os.path.join(journal_dir, filename)
+                        AppendWriter(orphan).recover()
+                        os.remove(orphan)
+        self.open(size)
+        for worker in self.workers:
+            worker.start()
+        logging.info("Data writer pool started with %d process(es)", size)
+
+    def open(self, size):
+        # Creates the shard queues and the router without starting the processes.
+        # Spill backlogs were routed by the previous pool size: they are moved aside
+        # and put through the new router, so every MAC still has a single writer.
+        spill_dir = DataProcess.spill_dir
+        previous = []
+        if DataProcess.spill_to_disk and os.path.isdir(spill_dir):
+            for filename in sorted(os.listdir(spill_dir)):
+                match = re.match(r'^DataProcess-\d+\.spill(' + re.escape(self.REROUTE_SUFFIX) + ')?$', filename)
+                if not match:
+                    continue
+                path = os.path.join(spill_dir, filename)
+                if not match.group(1):
+                    # A .reroute file is left by an interrupted start and is drained as well
+                    os.replace(path, path + self.REROUTE_SUFFIX)
+                    path += self.REROUTE_SUFFIX
+                previous.append(path)
+        self.workers = [DataProcess(shard, self.log_queue) for shard in range(size)]
+        self.router = ShardRouter([worker.open_queue() for worker in self.workers])
+        for path in previous:
+            self._reroute_spill(path)
+
+    def _reroute_spill(self, path):
+        segment = SpillSegment(path, DataProcess.spill_max_bytes)
+        count = len(segment)
+        while len(segment):
+            item, size = segment.peek()
+            self.router.put(item)
+            segment.advance(size)
+            if len(segment) % GuardedQueue.replay_batch == 0:
+                # Written out to the new segments as it goes rather than held in memory
+                for q in self.queues():
+                    q.pump()
+        segment.close()
+        os.remove(path)
+        if count:
+            logging.info("Re-routed %d spilled notification(s) from %s", count, os.path.basename(path))
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def join(self):
+        for worker in self.workers:
+            worker.join()
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+class CompactorProcess(Process):
+    name = "CompactorProcess"
+
+    # Seconds between passes, and how long a closed daily file must stay untouched
+    interval = 600
+    grace = 600
+    # Total size allowed for data/ and the feature dumps; 0 disables the budget.
+    # main.py sets this from 'disk_budget_mb' in programdata/config.json
+    disk_budget = 0
+
+    def __init__(self):
+        self.process = mp.Process(target=self._run, name=self.name)
+
+    def start(self):
+        # Only the shutdown sentinel travels on this queue
+        if self.queue is None:
+            self.queue = mp.Queue()
+        self.process.start()
+
+    def compact(self):
+        base = os.path.dirname(os.path.realpath(__file__))
+        data_root = os.path.join(base, "data")
+        datasets_root = os.path.join(base, "programdata", "datasets")
+        today = datetime.now().strftime("%Y-%m-%d")
+        files, saved = compactor.compact_data_tree(data_root, today, self.grace)
+        feature_files, feature_saved = compactor.compact_feature_tree(datasets_root, today)
+        freed = compactor.enforce_disk_budget([data_root, datasets_root], self.disk_budget, today)
+        if files or feature_files or freed:
+            logging.info("Compactor: %d data file(s) -%d bytes, %d feature file(s) -%d bytes, %d bytes freed by budget",
+                         files, saved, feature_files, feature_saved, freed)
 
-        # Atomically replace original file with the updated tmp file
-        os.replace(tmp_path, final_path)
-            
     def _run(self):
+        # Stay out of the way of the BLE and writer processes
+        try:
+            os.nice(10)
+        except OSError:
+            pass
         while True:
-            item = self.queue.get()
-            if item is None:  # MODIFIED: shutdown signal detected
-                break
-            location, device_type, address, service_name, char_name, received_time, data = item
-            self._rawdata_result_handling_func(location, device_type, address, service_name, char_name, received_time, data)
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Compactor pass failed: {e}")
+            try:
+                if self.queue.get(timeout=self.interval) is None:
+                    break
+            except queue.Empty:
+                pass
 
 
 class LogProcess(Process):
@@ -175,6 +433,13 @@ class LogProcess(Process):
     MSGQ_TYPE_ENV = 2
     MSGQ_TYPE_SOUND = 3
 
+    # Fed with decoded debugstr events by every DataProcess shard; the ring is
+    # single-producer, so this queue is a plain mp.Queue, and its counters live in
+    # shared memory for queue_report()
+    use_shared_memory = False
+    shared_stats = True
+    display_flush_interval = 1.0
+
     class Msgq():
         def __init__(self, key_t, flag):
             self.key_t = key_t
@@ -208,7 +473,7 @@ class LogProcess(Process):
     def __init__(self):
         super().__init__()
         self.process = mp.Process(target=self._run)
-        self.queue = mp.Queue()
+        self.queue = None
         self.mqtt = self.Mqtt("155.230.186.52", 1883, "csosMember", "csos!1234")
         self.msgq = self.Msgq(6604, sysv_ipc.IPC_CREAT)
 
@@ -216,6 +481,13 @@ class LogProcess(Process):
         mac = uuid.getnode()
         return ':'.join(['{:02X}'.format((mac >> i) & 0xff) for i in range(0, 6 * 8, 8)][::-1])
 
+    @staticmethod
+    def display_path(event):
+        # 경로 설정
+        path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+        # dir_path = os.path.join(path_base, location, device_type, address, service_name, "display")
+        return os.path.join(path_base, "display", event.timestamp[:10] + ".txt")
+
     def _run(self):
         def create_message(category, owner, location, device, activity, action, patient, level):
             return {
@@ -231,95 +503,18 @@ class LogProcess(Process):
                 "LEVEL": level
             }
 
-        while True:
-            item = self.queue.get()
-            if item is None:  # shutdown signal detected
-                break
- 
-            location, device_type, address, service_name, char_name, received_time, data = item
-
-            time_dt = datetime.fromtimestamp(received_time)
-
-            # 경로 설정
-            filename = time_dt.strftime("%Y-%m-%d") + ".txt"
-            path_base = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
-            # dir_path = os.path.join(path_base, location, device_type, address, service_name, "display")
-            dir_path = os.path.join(path_base, "display")
-
-            # 디렉터리 생성
-            os.makedirs(dir_path, exist_ok=True)
-
-            # 디버그 문자열 처리
-            if char_name == "debugstr":
-                try:
-                    debug_string = data.decode('utf-8') if isinstance(data, bytearray) else str(data)
-                    debug_dict = json.loads(debug_string)
-                    debug_dict["timestamp"] = time_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    timestamp = debug_dict["timestamp"]
-
-                    log_message = ""
-                    
-                    # SOUND 이벤트 처리 (ID 1과 7 무시)
-                    if debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'SOUND':
-                        label = debug_dict.get('id', 'unknown')
-                        if label not in ("unknown", "background"):
-                            log_message = f"{timestamp}  {location} [EVENT] - Sound '{label}' was detected\n"
-
-                    # ENV 이벤트 처리
-                    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'ENV':
-                        env_id = debug_dict.get('id', -1)
-                        label = env_list[env_id] if 0 <= env_id < len(env_list) else "N/A"
-                        log_message = f"{timestamp}  {location} [EVENT] - '{label}' event was detected\n"
-                    
-                    # ENTER 이벤트 처리
-                    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'ENTER':
-                        value = debug_dict.get('value', 0)
-                        log_message = f"{timestamp}  {location} [EVENT] - ENTER value: {value}\n"
-
-                    # EXIT 이벤트 처리
-                    elif debug_dict['type'] == 'DEBUG' and debug_dict['event'] == 'EXIT':
-                        value = debug_dict.get('value', 0)
-                        log_message = f"{timestamp}  {location} [EVENT] - EXIT value: {value}\n"
-
-                    # INFERENCE 처리
-                    elif debug_dict['type'] == 'INFERENCE':
-                        status = debug_dict.get('status', '')
-                        adl = debug_dict.get('ADL', 'N/A')
-                        sequence = debug_dict.get('sequence', 'N/A')
-                        truth = debug_dict.get('truth', 0.0)
-                        missing = debug_dict.get('missing', 'None')
-                        value = debug_dict.get('value', 0)
-                        
-                        if status == 'EXCEPTION':
-                            log_message = f"{timestamp}  {location} [INFERENCE] {status}: {adl}, value: {value}\n"
+        # Display lines are buffered and appended about once a second (formatters: display_format.py)
+        writer = AppendWriter(flush_interval=self.display_flush_interval, sync=False)
+        stop = False
+        while not stop:
+            items, stop = self._get_batch(timeout=writer.next_flush_delay())
+            for event in items:
+                log_message = format_display_line(event)
+                if log_message is not None:
+                    writer.write(self.display_path(event), log_message.encode('utf-8'))
+            writer.flush_if_due()
+        writer.close()
 
-                        else:
-                            log_message = f"{timestamp}  {location} [INFERENCE] {status}: {adl}, sequence: {sequence}, truth: {truth:.2f}, missing: {missing}\n"
-                            
-                    # PRIORITY HEAP 처리
-                    elif debug_dict['type'] == 'HEAPPRINT':
-                        heap_state_str = debug_dict.get('heap_state', '')
-                        log_message = f"{timestamp} {location} [HEAP STATE] - {heap_state_str}"
-
-                    # 로그 파일에 기록
-                    if log_message:
-                        with open(os.path.join(dir_path, filename), 'a') as f:
-                            f.write(log_message)
-                            
-                    # print(log_message)      # for debugging - display one
-
-                except json.JSONDecodeError as e:
-                    logging.error(f"JSONDecodeError: {e}")
-                    logging.error(f"Invalid JSON: {repr(debug_string)}")
-                except IndexError as e:
-                    logging.error(f"IndexError: {e} - Sound ID out of range")
-                except KeyError as e:
-                    logging.error(f"KeyError: {e}")
-                except Exception as e:
-                    logging.error(f"Unexpected error: {e}")
-
-                # mqtt_dict = create_message()
-            
         # while True:
         #     msg_dict = self.queue.get()
         #     msg_dict.update(SH_ID=self.mqtt.sh_id)
@@ -0,0 +1,99 @@
+import asyncio
+import random
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class RelayState:
+    def __init__(self, device):
+        self.device = device
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_attempt = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.wake = asyncio.Event()
+
+
+class ReconnectScheduler:
+    """Owns every connection attempt, one independent task per relay.
+
+    request() asks for an attempt right away (relay advertised or first seen);
+    schedule() queues one after a disconnect. Failed attempts are retried with
+    exponential backoff and jitter against the known address, without waiting
+    for a scan. An advertisement from the relay shows it is in range, so the
+    wait is then cut to at most advertised_retry after the last attempt.
+    """
+
+    base_delay = 1.0
+    max_delay = 120.0
+    jitter = 0.3
+    advertised_retry = 5.0
+
+    def __init__(self, connect: Callable[[object], Awaitable[bool]]):
+        # connect(device) -> True once connected and initialized
+        self.connect = connect
+        self.relays: Dict[str, RelayState] = {}
+        self._closed = False
+
+    def backoff(self, failures: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, failures - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def is_pending(self, address: str) -> bool:
+        state = self.relays.get(address)
+        return state is not None and state.task is not None
+
+    def request(self, address: str, device):
+        state = self.relays.get(address)
+        if state is None:
+            state = self.relays[address] = RelayState(device)
+        state.device = device
+        if state.task is not None:
+            state.next_attempt = min(state.next_attempt, state.last_attempt + self.advertised_retry)
+            state.wake.set()
+            return
+        self._start(address, state, delay=0.0)
+
+    def schedule(self, address: str):
+        state = self.relays.get(address)
+        if state is None or state.task is not None:
+            return
+        self._start(address, state, delay=self.backoff(state.failures + 1))
+
+    def _start(self, address: str, state: RelayState, delay: float):
+        if self._closed:
+            return
+        state.next_attempt = asyncio.get_running_loop().time() + delay
+        state.task = asyncio.create_task(self._run(address, state))
+
+    async def _run(self, address: str, state: RelayState):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._closed:
+                delay = state.next_attempt - loop.time()
+                if delay > 0:
+                    state.wake.clear()
+                    try:
+                        await asyncio.wait_for(state.wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                state.last_attempt = loop.time()
+                if await self.connect(state.device):
+                    state.failures = 0
+                    return
+                state.failures += 1
+                delay = self.backoff(state.failures)
+                state.next_attempt = loop.time() + delay
+                logging.info('%s: reconnect attempt %d in %.1f s', address, state.failures + 1, delay)
+        except Exception as e:
+            logging.warning('%s: reconnect task failed: %s', address, e)
+        finally:
+            state.task = None
+
+    async def close(self):
+        self._closed = True
+        tasks = [state.task for state in self.relays.values() if state.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,115 @@
+import os
+import struct
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from block_file import BlockReader, block_path
+
+# inference/rawdata payload as sent by the DEAN (44 bytes)
+RAWDATA_FORMAT = '<BBBfffffB20b'
+RAWDATA_SIZE = struct.calcsize(RAWDATA_FORMAT)
+NUM_SOUND_LOGITS = 20
+
+STORE_MAGIC = b'SLIMRAW1'
+STORE_SUFFIX = '.bin'
+_STORE_HEADER = struct.Struct('<8sHH4x')    # magic, record size, payload size
+_TIMESTAMP = struct.Struct('<d')
+
+# One record is the receive timestamp followed by the raw payload bytes,
+# so the payload never has to be unpacked on the write path.
+rawdata_dtype = np.dtype([
+    ('time', '<f8'),
+    ('grideye', 'u1'),
+    ('direction', 'u1'),
+    ('env', 'u1'),
+    ('temp', '<f4'),
+    ('humid', '<f4'),
+    ('iaq', '<f4'),
+    ('eco2', '<f4'),
+    ('bvoc', '<f4'),
+    ('sound', 'u1'),
+    ('sound_logits', 'i1', (NUM_SOUND_LOGITS,)),
+])
+RECORD_SIZE = rawdata_dtype.itemsize
+HEADER_SIZE = _STORE_HEADER.size
+
+
+def store_header() -> bytes:
+    return _STORE_HEADER.pack(STORE_MAGIC, RECORD_SIZE, RAWDATA_SIZE)
+
+
+def pack_record(received_time: float, payload: bytes) -> bytes:
+    if len(payload) < RAWDATA_SIZE:
+        raise ValueError(f"rawdata payload must be {RAWDATA_SIZE} bytes, got {len(payload)}")
+    return _TIMESTAMP.pack(received_time) + bytes(payload[:RAWDATA_SIZE])
+
+
+def store_dir(base: str, location: str, device_type: str, mac: str) -> str:
+    return os.path.join(base, location, device_type, mac, "inference", "rawdata")
+
+
+def store_path(base: str, location: str, device_type: str, mac: str, day) -> str:
+    if isinstance(day, datetime):
+        day = day.strftime("%Y-%m-%d")
+    return os.path.join(store_dir(base, location, device_type, mac), day + STORE_SUFFIX)
+
+
+def _check_header(path: str, header: bytes):
+    magic, record_size, _ = _STORE_HEADER.unpack(header)
+    if magic != STORE_MAGIC or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a rawdata store file")
+
+
+def open_day(path: str) -> np.ndarray:
+    """Map a daily store file as a read-only structured array.
+    A day already compacted into a block file is decompressed into memory; late
+    records beside it are left to the next compaction."""
+    if os.path.isfile(block_path(path)):
+        with BlockReader(block_path(path)) as reader:
+            raw = reader.read_all()
+        if len(raw) < HEADER_SIZE:
+            return np.empty(0, dtype=rawdata_dtype)
+        _check_header(path, raw[:HEADER_SIZE])
+        count = (len(raw) - HEADER_SIZE) // RECORD_SIZE
+        return np.frombuffer(raw, dtype=rawdata_dtype, count=count, offset=HEADER_SIZE)
+    if not os.path.isfile(path):
+        return np.empty(0, dtype=rawdata_dtype)
+    size = os.path.getsize(path)
+    if size < HEADER_SIZE:
+        return np.empty(0, dtype=rawdata_dtype)
+    with open(path, 'rb') as f:
+        _check_header(path, f.read(HEADER_SIZE))
+    # A record still being appended is ignored
+    count = (size - HEADER_SIZE) // RECORD_SIZE
+    if count == 0:
+        return np.empty(0, dtype=rawdata_dtype)
+    return np.memmap(path, dtype=rawdata_dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def time_slice(records: np.ndarray, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """Return records with start <= time < end; records are in arrival order."""
+    times = records['time']
+    lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    hi = len(records) if end is None else int(np.searchsorted(times, end, side='left'))
+    return records[lo:hi]
+
+
+def read_range(base: str, location: str, device_type: str, mac: str, start: float, end: float) -> np.ndarray:
+    """Read every record of one DEAN between two epoch timestamps, across days."""
+    day = datetime.fromtimestamp(start).date()
+    last_day = datetime.fromtimestamp(end).date()
+    parts = []
+    while day <= last_day:
+        records = open_day(store_path(base, location, device_type, mac, day.strftime("%Y-%m-%d")))
+        if len(records):
+            parts.append(np.array(time_slice(records, start, end)))
+        day += timedelta(days=1)
+    if not parts:
+        return np.empty(0, dtype=rawdata_dtype)
+    return np.concatenate(parts)
+
+
+def dequantize_sound(records: np.ndarray, num_labels: int = NUM_SOUND_LOGITS) -> np.ndarray:
+    return (records['sound_logits'][:, :num_labels].astype(np.float32) + 128) / 256
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+from bleak import BleakScanner
+
+from dean_uuid import DEAN_UUID_BASE_SERVICE
+
+RELAY_NAME = "DE&N_RELAY"
+
+
+class SeenRelay:
+    def __init__(self, device, name):
+        self.device = device
+        self.name = name
+        self.first_seen = time.monotonic()
+        self.last_seen = self.first_seen
+        self.last_dispatch = 0.0
+        self.rssi = None
+
+
+class RelayScanner:
+    """Long-lived BLE scanner that reports DE&N relays as soon as they advertise.
+
+    on_relay(device) is called from the detection callback for every relay
+    advertisement, at most once per dispatch_interval per relay; the caller
+    decides whether a connection is needed. The scanner is restarted if no
+    advertisement arrives for idle_restart seconds, which recovers from adapters
+    that silently stop discovery after a connection. While all_connected()
+    reports every known relay connected nothing is expected to advertise, so the
+    idle timer is held; each restart that brings no advertisement doubles the
+    timeout up to max_idle_restart.
+    """
+
+    dispatch_interval = 2.0
+    idle_restart = 60.0
+    max_idle_restart = 600.0
+    restart_delay = 5.0
+
+    def __init__(self, on_relay: Callable, all_connected: Optional[Callable[[], bool]] = None):
+        self.on_relay = on_relay
+        self.all_connected = all_connected
+        self.seen: Dict[str, SeenRelay] = {}
+        self._last_advertisement = time.monotonic()
+        self._idle_timeout = self.idle_restart
+
+    def _on_advertisement(self, device, adv):
+        self._last_advertisement = time.monotonic()
+        self._idle_timeout = self.idle_restart
+        if DEAN_UUID_BASE_SERVICE not in adv.service_uuids:
+            return
+        name = device.name or adv.local_name
+        relay = self.seen.get(device.address)
+        if relay is None:
+            relay = self.seen[device.address] = SeenRelay(device, name)
+            logging.info("Relay %s (%s) discovered", device.address, name)
+        relay.device = device
+        relay.name = name or relay.name
+        relay.last_seen = self._last_advertisement
+        relay.rssi = adv.rssi
+        if relay.name != RELAY_NAME:
+            return
+        if relay.last_dispatch and relay.last_seen - relay.last_dispatch < self.dispatch_interval:
+            return
+        relay.last_dispatch = relay.last_seen
+        try:
+            self.on_relay(device)
+        except Exception as e:
+            logging.warning("Relay %s dispatch failed: %s", device.address, e)
+
+    async def run(self, stop_event: asyncio.Event):
+        while not stop_event.is_set():
+            scanner = BleakScanner(detection_callback=self._on_advertisement,
+                                   service_uuids=[DEAN_UUID_BASE_SERVICE])
+            try:
+                await scanner.start()
+            except Exception as e:
+                logging.warning("Relay scanner start failed: %s", e)
+                await self._wait(stop_event, self.restart_delay)
+                continue
+            quiet_since = time.monotonic()
+            try:
+                while not stop_event.is_set():
+                    await self._wait(stop_event, self.idle_restart / 4)
+                    now = time.monotonic()
+                    if self.all_connected is not None and self.all_connected():
+                        quiet_since = now
+                        continue
+                    quiet_since = max(quiet_since, self._last_advertisement)
+                    if now - quiet_since > self._idle_timeout:
+                        logging.info("No advertisement for %.0f s, restarting relay scanner", self._idle_timeout)
+                        self._idle_timeout = min(self._idle_timeout * 2, self.max_idle_restart)
+                        break
+            finally:
+                try:
+                    await scanner.stop()
+                except Exception as e:
+                    logging.warning("Relay scanner stop failed: %s", e)
+
+    @staticmethod
+    async def _wait(event: asyncio.Event, timeout: float):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def get(self, address: str) -> Optional[SeenRelay]:
+        return self.seen.get(address)
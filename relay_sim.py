@@ -0,0 +1,317 @@
+"""Simulated DE&N relay for model and file transfers.
+
+SimRelay plays the relay/DEAN side of the sound/model and config/file
+transfer protocols, stop-and-wait or windowed (packet.TRANSFER_CAP_WINDOW),
+with configurable link latency and packet loss. SimClient stands in for the
+BleakClient of a Device, so the hub side under test is the real Device code.
+
+The hub always offers a window; a relay without windowed support answers
+with a plain START, which is the stop-and-wait fallback. Stop-and-wait has no
+retransmission, so with --loss only the windowed mode finishes.
+
+    python relay_sim.py                       # stop-and-wait vs. windowed
+    python relay_sim.py --kind file --size 300000 --window 8 --loss 0.02
+    python relay_sim.py --drop-at 0.8 --resume   # link drop near the end of a push
+    python relay_sim.py --retrain 4096 --delta   # retrained head sent as a delta
+    python relay_sim.py --probe 0.1              # unitspace write latency during a push
+    python relay_sim.py --mode window --no-response   # write requests vs. write commands
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import logging
+from functools import partial
+from types import SimpleNamespace
+
+from bleak.exc import BleakError
+
+import device
+import model_delta
+from dean_identity import mac_bytes_to_str
+from dean_uuid import *
+from packet import *
+
+SIM_RELAY_ADDRESS = 'SIM:RELAY'
+SIM_DEAN_MAC = bytes.fromhex('5A1A00000001')
+
+
+class SimRelay:
+    def __init__(self, windowed=True, max_window=16, varlen=False, max_chunk=244, resume=False, delta=False,
+                 latency=0.03, write_time=0.01, command_time=0.002, loss=0.0, ack_loss=0.0, seed=0):
+        self.windowed = windowed
+        self.max_window = max_window
+        self.varlen = varlen
+        self.max_chunk = max_chunk      # largest DATA payload the relay/DEAN link takes
+        self.resume = resume            # keep partial payloads across a dropped hub link
+        self.delta = delta              # decode model_delta streams against self.model
+        self.model = b''                # model installed on the DEAN
+        self.latency = latency          # relay -> DEAN -> relay -> hub, per notification
+        self.write_time = write_time    # one GATT write with response
+        self.command_time = command_time  # one write without response, several fit a connection event
+        self.loss = loss                # hub -> DEAN data chunks lost
+        self.ack_loss = ack_loss        # DEAN -> hub ACKs lost
+        self.random = random.Random(seed)
+        self.notify = None              # notify(char_uuid, payload) set by SimClient
+        self.sessions = {}
+        self.received = {}
+
+    def receive(self, char_uuid, packet: bytes):
+        mac, payload = packet[:6], packet[6:]
+        if char_uuid == DEAN_UUID_SOUND_MODEL_CHAR:
+            self._on_packet(char_uuid, mac, payload, MODEL_UPDATE_CMD_START, MODEL_UPDATE_CMD_DATA, MODEL_UPDATE_CMD_END,
+                            ModelDataPacket, VarModelDataPacket)
+        elif char_uuid == DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR:
+            self._on_packet(char_uuid, mac, payload, FILE_TRANSFER_CMD_START, FILE_TRANSFER_CMD_DATA, FILE_TRANSFER_CMD_END,
+                            FileDataPacket, VarFileDataPacket)
+
+    def _reply(self, char_uuid, mac, payload, droppable=False):
+        if droppable and self.random.random() < self.ack_loss:
+            return
+        self.notify(char_uuid, mac + payload)
+
+    def _on_packet(self, char_uuid, mac, payload, cmd_start, cmd_data, cmd_end, fixed_packet, var_packet):
+        cmd = payload[0]
+        if cmd == cmd_start:
+            start_size = 133 if char_uuid == DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR else 1
+            offered = TransferCapabilities.unpack_reply(b'\x00' + payload[start_size:start_size + 14])
+            previous = self.sessions.get(char_uuid)
+            granted = TransferCapabilities()
+            if (self.resume and offered.resumable and previous is not None
+                    and previous['digest'] == offered.digest and previous['expected'] > 0):
+                # Same payload as the interrupted attempt: keep what arrived
+                session = previous
+                session['window'] = 0
+                granted.flags |= TRANSFER_CAP_RESUME
+                granted.resume = min(offered.resume, session['expected'])
+                if session['varlen']:
+                    granted.flags |= TRANSFER_CAP_VARLEN
+                    granted.chunk = offered.chunk
+            else:
+                session = {'chunks': {}, 'expected': 0, 'window': 0, 'varlen': False, 'digest': offered.digest, 'delta': False}
+                if self.delta and offered.delta and offered.base == (device._short_digest(self.model) if self.model else 0):
+                    session['delta'] = True
+            if session['delta']:
+                granted.flags |= TRANSFER_CAP_DELTA
+                granted.base = offered.base
+            self.sessions[char_uuid] = session
+            if self.windowed and offered.windowed:
+                session['window'] = min(offered.window, self.max_window)
+                granted.flags |= TRANSFER_CAP_WINDOW
+                granted.window = session['window']
+            if self.varlen and offered.varlen and not granted.resumable:
+                session['varlen'] = True
+                granted.flags |= TRANSFER_CAP_VARLEN
+                granted.chunk = min(offered.chunk, self.max_chunk)
+            reply = bytes([cmd_start]) + (granted.pack() if granted.flags else b'')
+            self._reply(char_uuid, mac, reply)
+        elif cmd == cmd_data:
+            session = self.sessions.get(char_uuid)
+            if session is None:
+                return
+            seq = int.from_bytes(payload[1:3], 'little')
+            if self.random.random() < self.loss:
+                return
+            packet = (var_packet if session['varlen'] else fixed_packet).unpack(payload)
+            chunk = packet.data[:packet.size] if hasattr(packet, 'size') else packet.data
+            session['chunks'].setdefault(seq, chunk)
+            while session['expected'] in session['chunks']:
+                session['expected'] += 1
+            if session['window']:
+                # Cumulative ACK of the highest chunk received in order
+                if session['expected'] == 0:
+                    return
+                ack = session['expected'] - 1
+            else:
+                ack = seq
+            self._reply(char_uuid, mac, bytes([cmd_data]) + ack.to_bytes(2, 'little'), droppable=True)
+        elif cmd == cmd_end:
+            session = self.sessions.pop(char_uuid, None)
+            if session is not None:
+                chunks = session['chunks']
+                payload = b''.join(bytes(chunks[i]) for i in sorted(chunks))
+                self.payload_bytes = len(payload)
+                if session['delta']:
+                    payload = model_delta.decode(self.model, payload)
+                if char_uuid == DEAN_UUID_SOUND_MODEL_CHAR:
+                    self.model = payload
+                self.received[char_uuid] = payload
+            self._reply(char_uuid, mac, bytes([cmd_end]))
+
+
+class SimClient:
+    """The parts of BleakClient the transfer code uses."""
+
+    def __init__(self, relay: SimRelay, dev: 'device.Device', mtu=247):
+        self.relay = relay
+        self.dev = dev
+        self.address = SIM_RELAY_ADDRESS
+        self.mtu_size = mtu
+        self.connected = True
+        characteristic = SimpleNamespace(properties=['read', 'write', 'write-without-response', 'notify'])
+        self.services = SimpleNamespace(get_characteristic=lambda char_uuid: characteristic)
+        # One ATT write request outstanding per link, as in BlueZ
+        self._link = asyncio.Lock()
+        relay.notify = self._notify
+
+    def _notify(self, char_uuid, data):
+        service_uuid = (dean_service_dict['sound']['service'] if char_uuid == DEAN_UUID_SOUND_MODEL_CHAR
+                        else dean_service_dict['config']['service'])
+        sender = SimpleNamespace(handle=hash(char_uuid) & 0xFFFF, uuid=char_uuid, service_uuid=service_uuid)
+        asyncio.get_running_loop().call_later(self.relay.latency, self._deliver, sender, bytearray(data))
+
+    def _deliver(self, sender, data):
+        if self.connected:
+            self.dev._ble_notify_callback(sender, data)
+
+    async def write_gatt_char(self, char_uuid, data, response=None):
+        if not self.connected:
+            raise BleakError('Not connected')
+        if response is False and len(data) > self.mtu_size - 3:
+            raise BleakError(f'Write without response of {len(data)} bytes exceeds ATT MTU {self.mtu_size}')
+        async with self._link:
+            await asyncio.sleep(self.relay.command_time if response is False else self.relay.write_time)
+            self.relay.receive(char_uuid, bytes(data))
+
+    async def disconnect(self):
+        return True
+
+
+def make_device(relay: SimRelay, window: int, varlen: bool, mtu: int, resume: bool, no_response=False) -> 'device.Device':
+    created = not os.path.isdir(os.path.join(os.path.dirname(os.path.abspath(device.__file__)), "programdata", "datasets", SIM_RELAY_ADDRESS))
+    dev = device.Device(SimpleNamespace(address=SIM_RELAY_ADDRESS, name='DE&N_RELAY'))
+    if created:
+        os.rmdir(dev.dataset_path)
+    dev.transfer_window = window
+    dev.transfer_varlen = varlen
+    dev.transfer_resume = resume
+    dev.transfer_no_response = no_response
+    dev.ble_client = SimClient(relay, dev, mtu)
+    dev.att_mtu = mtu
+    dev.is_connected = True
+    return dev
+
+
+async def drop_link(dev: 'device.Device', downtime: float, restart):
+    dev.ble_client.connected = False
+    dev._ble_disconnected_callback(dev.ble_client)
+    await asyncio.sleep(downtime)
+    dev.ble_client.connected = True
+    dev.is_connected = True
+    if dev.transfer_resume:
+        await dev.resume_transfers()
+    else:
+        await restart()
+
+
+async def simulate(kind='model', size=300000, window=8, windowed_relay=True, varlen=False, mtu=247,
+                   resume=False, drop_at=None, downtime=0.5, delta=False, retrain=0, probe=0.0, no_response=False,
+                   timeout=600.0, **link):
+    """One transfer; with drop_at the link drops once that fraction has been acknowledged.
+
+    With retrain, the model is pushed once untimed and the timed transfer is a
+    retrained copy whose last `retrain` bytes differ. With probe, a unitspace
+    callback is written every `probe` seconds while the transfer runs.
+    """
+    relay = SimRelay(windowed=windowed_relay, varlen=varlen, resume=resume, delta=delta, **link)
+    dev = make_device(relay, window, varlen, mtu, resume, no_response)
+    dev.transfer_delta = delta
+    dean_mac = mac_bytes_to_str(SIM_DEAN_MAC)
+    payload = os.urandom(size)
+    with tempfile.NamedTemporaryFile(suffix='.bin') as f, tempfile.TemporaryDirectory() as progress_dir:
+        device.transfer_progress.root = progress_dir
+        f.write(payload)
+        f.flush()
+        if kind == 'model':
+            dev._model_path_for = lambda mac: f.name
+            dev._pushed_model_path = lambda mac: os.path.join(progress_dir, 'pushed.tflite')
+            if retrain:
+                state = dev._get_model_state(dean_mac)
+                await dev.model_update_start(dean_mac)
+                while state.sending:
+                    await asyncio.sleep(0.01)
+                payload = payload[:-retrain] + os.urandom(retrain)
+                f.seek(0)
+                f.write(payload)
+                f.flush()
+            start_transfer = partial(dev.model_update_start, dean_mac)
+            state, char_uuid = dev._get_model_state(dean_mac), DEAN_UUID_SOUND_MODEL_CHAR
+        else:
+            start_transfer = partial(dev.file_transfer_start, dean_mac, f.name, '/sim/target.bin')
+            state, char_uuid = dev._get_file_state(dean_mac), DEAN_UUID_CONFIG_FILE_TRANSFER_CHAR
+        async def unitspace_probe():
+            while True:
+                await asyncio.sleep(probe)
+                await dev.unitspace_existence_callback(dean_mac, 'strong_enter')
+
+        start = time.monotonic()
+        await start_transfer()
+        prober = asyncio.create_task(unitspace_probe()) if probe else None
+        dropped = drop_at is None
+        while time.monotonic() - start < timeout:
+            await asyncio.sleep(0.01)
+            if not dropped and state.mode and state.next_unacked() * state.chunk_size >= drop_at * size:
+                dropped = True
+                await drop_link(dev, downtime, start_transfer)
+            elif not state.sending:
+                break
+        elapsed = time.monotonic() - start
+        if prober is not None:
+            prober.cancel()
+    await dev.remove()
+    received = relay.received.get(char_uuid, b'')
+    return {
+        'mode': (state.mode or 'stop-and-wait') + ('+nr' if state.no_response and state.mode == 'window' else ''),
+        'seconds': elapsed,
+        'kbps': size * 8 / 1000 / elapsed,
+        'chunk': state.chunk_size,
+        'sent': state.size,
+        'verified': received[:size] == payload,
+        'writes': dev.writes.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=('model', 'file'), default='model')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='payload bytes')
+    parser.add_argument('--window', type=int, default=8, help='window offered by the hub (>= 2)')
+    parser.add_argument('--mode', choices=('both', 'window', 'legacy'), default='both',
+                        help='relay with windowed support, without, or compare both')
+    parser.add_argument('--varlen', action='store_true', help='negotiate MTU-sized unpadded chunks')
+    parser.add_argument('--mtu', type=int, default=247, help='ATT MTU of the hub/relay link')
+    parser.add_argument('--drop-at', type=float, default=None, help='drop the link once this fraction is acknowledged')
+    parser.add_argument('--resume', action='store_true', help='resume after the drop instead of starting over')
+    parser.add_argument('--delta', action='store_true', help='send model updates as deltas')
+    parser.add_argument('--retrain', type=int, default=0, help='time a second push whose last RETRAIN bytes changed')
+    parser.add_argument('--no-response', action='store_true', help='also run with windowed DATA chunks as write without response')
+    parser.add_argument('--command-time', type=float, default=0.002, help='link time of one write without response')
+    parser.add_argument('--probe', type=float, default=0.0, help='write a unitspace callback every PROBE seconds')
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--write-time', type=float, default=0.01)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--ack-loss', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s: %(message)s')
+
+    # --no-response compares each mode with and without write requests for DATA
+    runs = [(windowed, no_response) for windowed in {'both': (False, True), 'window': (True,), 'legacy': (False,)}[args.mode]
+            for no_response in ((False, True) if args.no_response else (False,))]
+    for windowed, no_response in runs:
+        result = asyncio.run(simulate(args.kind, args.size, max(2, args.window), windowed, args.varlen, args.mtu,
+                                      args.resume, args.drop_at, delta=args.delta, retrain=args.retrain, probe=args.probe,
+                                      no_response=no_response, command_time=args.command_time,
+                                      latency=args.latency, write_time=args.write_time,
+                                      loss=args.loss, ack_loss=args.ack_loss, seed=args.seed))
+        print(f"{args.kind} {args.size} bytes ({result['sent']} sent), {result['mode']:>13}, {result['chunk']:3d}-byte chunks: {result['seconds']:6.2f} s, "
+              f"{result['kbps']:7.1f} kbit/s, verified {result['verified']}")
+        for name, r in result['writes'].items():
+            if r['writes'] and (args.probe or args.verbose):
+                print(f"  {name:<10} {r['writes']:6d} writes, wait avg {r['wait_avg_ms']:6.1f} ms, max {r['wait_max_ms']:6.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+QUEUED = 'queued'
+SENDING = 'sending'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class RolloutTarget:
+    def __init__(self, dean_mac: str, relay_address: str):
+        self.dean_mac = dean_mac
+        self.relay_address = relay_address
+        self.status = QUEUED
+        self.error = ''
+        self.attempts = 0
+        self.started = 0.0
+        self.finished = 0.0
+        self.progress = 0.0
+
+    def elapsed(self) -> float:
+        if not self.started:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class ModelRollout:
+    """Model updates for many DEANs: relays in parallel, one DEAN at a time per relay.
+
+    resolve(dean_mac) returns the Device the DEAN is reached through (or None).
+    Each relay's queue runs as its own task, so the rollout takes as long as
+    the slowest relay. A DEAN whose transfer fails is retried once its relay
+    is connected again, up to retries times; with resumable transfers the
+    retry continues where the link dropped.
+    """
+
+    retries = 1
+    transfer_timeout = 600.0
+    reconnect_wait = 60.0
+
+    def __init__(self, targets: Dict[str, List[str]], resolve: Callable[[str], Optional[object]]):
+        # targets: relay address -> DEAN MACs behind it
+        self.resolve = resolve
+        self.targets: List[RolloutTarget] = [RolloutTarget(dean_mac, relay_address)
+                                             for relay_address, deans in targets.items() for dean_mac in deans]
+        self.started = 0.0
+        self.finished = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self._cancelled = False
+
+    def start(self) -> asyncio.Task:
+        self.started = time.monotonic()
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def run(self) -> bool:
+        relays: Dict[str, List[RolloutTarget]] = {}
+        for target in self.targets:
+            relays.setdefault(target.relay_address, []).append(target)
+        await asyncio.gather(*(self._run_relay(address, queue) for address, queue in relays.items()))
+        self.finished = time.monotonic()
+        logging.info('Model rollout finished: %s', self._counts())
+        return all(target.status == DONE for target in self.targets)
+
+    async def _wait_connected(self, dean_mac: str):
+        deadline = time.monotonic() + self.reconnect_wait
+        while not self._cancelled:
+            device = self.resolve(dean_mac)
+            if device is not None and device.is_connected:
+                return device
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(1.0)
+        return None
+
+    async def _run_relay(self, relay_address: str, queue: List[RolloutTarget]):
+        for target in queue:
+            if self._cancelled:
+                target.status = CANCELLED
+                continue
+            target.started = time.monotonic()
+            while target.status != DONE and target.attempts <= self.retries and not self._cancelled:
+                device = await self._wait_connected(target.dean_mac)
+                if device is None:
+                    target.error = 'relay not connected'
+                    break
+                target.attempts += 1
+                target.status = SENDING
+                monitor = asyncio.create_task(self._track(device, target))
+                try:
+                    await device.model_update(target.dean_mac, self.transfer_timeout)
+                    target.status = DONE
+                    target.progress = 1.0
+                except Exception as e:
+                    target.error = str(e) or e.__class__.__name__
+                    logging.warning('%s: rollout attempt %d failed: %s', target.dean_mac, target.attempts, target.error)
+                finally:
+                    monitor.cancel()
+            if target.status != DONE:
+                target.status = CANCELLED if self._cancelled else FAILED
+            target.finished = time.monotonic()
+            logging.info('%s via %s: model rollout %s in %.1f s', target.dean_mac, relay_address, target.status, target.elapsed())
+
+    @staticmethod
+    async def _track(device, target: RolloutTarget):
+        while True:
+            acked, total = device.model_update_progress(target.dean_mac)
+            if total:
+                target.progress = acked / total
+            await asyncio.sleep(0.5)
+
+    def _counts(self) -> str:
+        counts = {}
+        for target in self.targets:
+            counts[target.status] = counts.get(target.status, 0) + 1
+        return ', '.join(f'{count} {status}' for status, count in counts.items())
+
+    def summary(self) -> str:
+        total = len(self.targets)
+        progress = sum(target.progress for target in self.targets) / total if total else 1.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        lines = [f"Model rollout {'running' if self.running else 'finished'}: {total} DEANs, "
+                 f"{self._counts()}, {progress:.0%} in {elapsed:.0f} s"]
+        lines.append(f"{'Dean MAC':<20}{'Relay':<20}{'Status':<11}{'Progress':<10}{'Time':<8}Error")
+        for target in self.targets:
+            lines.append(f"{target.dean_mac:<20}{target.relay_address:<20}{target.status:<11}"
+                         f"{target.progress:<10.0%}{target.elapsed():<8.0f}{target.error}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,240 @@
+import multiprocessing as mp
+import queue
+import struct
+import time
+import logging
+from typing import Dict, Optional
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from dean_identity import mac_bytes_to_str, mac_str_to_bytes
+from dean_uuid import dean_char_id, dean_char_by_id
+
+# Ring header: write index and read index on separate cache lines, then the
+# consumer's waiting flag. Only the producer writes _WRITE_OFF, only the
+# consumer writes _READ_OFF and _WAIT_OFF.
+_INDEX = struct.Struct('<Q')
+_WRITE_OFF = 0
+_READ_OFF = 64
+_WAIT_OFF = 128
+_HEADER_SIZE = 192
+
+# Slot: commit seq (written last), timestamp, DEAN MAC, char id, payload length,
+# location, device type, payload. ATT attribute values are at most 512 bytes.
+_SLOT_HEAD = struct.Struct('<Qd6sBxH32s16s')
+SLOT_PAYLOAD_SIZE = 512
+_SLOT_SIZE = (_SLOT_HEAD.size + SLOT_PAYLOAD_SIZE + 7) & ~7
+_LOCATION_SIZE = 32
+_DEVICE_TYPE_SIZE = 16
+
+
+class ShmRing:
+    """Fixed-slot single-producer/single-consumer ring in shared memory."""
+
+    def __init__(self, capacity: int = 1024, name: Optional[str] = None):
+        self.capacity = capacity
+        size = _HEADER_SIZE + capacity * _SLOT_SIZE
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.buf = self.shm.buf
+
+    def __getstate__(self):
+        return {'capacity': self.capacity, 'name': self.shm.name}
+
+    def __setstate__(self, state):
+        self.__init__(state['capacity'], name=state['name'])
+
+    def _load(self, offset: int) -> int:
+        return _INDEX.unpack_from(self.buf, offset)[0]
+
+    def _store(self, offset: int, value: int):
+        _INDEX.pack_into(self.buf, offset, value)
+
+    def __len__(self):
+        return self._load(_WRITE_OFF) - self._load(_READ_OFF)
+
+    def full(self) -> bool:
+        return len(self) >= self.capacity
+
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def waiting(self) -> bool:
+        return self._load(_WAIT_OFF) != 0
+
+    @waiting.setter
+    def waiting(self, value: bool):
+        self._store(_WAIT_OFF, 1 if value else 0)
+
+    def push(self, timestamp: float, mac: bytes, char_id: int, location: bytes, device_type: bytes, payload) -> bool:
+        write = self._load(_WRITE_OFF)
+        if write - self._load(_READ_OFF) >= self.capacity:
+            return False
+        offset = _HEADER_SIZE + (write % self.capacity) * _SLOT_SIZE
+        length = len(payload)
+        body = offset + _SLOT_HEAD.size
+        self.buf[body:body + length] = payload
+        # Slot contents first, commit seq next, write index last
+        _SLOT_HEAD.pack_into(self.buf, offset, 0, timestamp, mac, char_id, length, location, device_type)
+        self._store(offset, write + 1)
+        self._store(_WRITE_OFF, write + 1)
+        return True
+
+    def pop(self):
+        read = self._load(_READ_OFF)
+        if read == self._load(_WRITE_OFF):
+            return None
+        offset = _HEADER_SIZE + (read % self.capacity) * _SLOT_SIZE
+        seq, timestamp, mac, char_id, length, location, device_type = _SLOT_HEAD.unpack_from(self.buf, offset)
+        if seq != read + 1:
+            # Index published before the slot became visible; retry on the next poll
+            return None
+        body = offset + _SLOT_HEAD.size
+        payload = bytearray(self.buf[body:body + length])
+        self._store(_READ_OFF, read + 1)
+        return timestamp, mac, char_id, location, device_type, payload
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingQueue:
+    """mp.Queue-compatible worker queue backed by a ShmRing.
+
+    The producer side takes the usual 7-element notification list. Items that do
+    not fit a slot (unknown characteristic, oversized payload, location or device
+    type longer than its field, shutdown sentinel) travel through the fallback
+    mp.Queue. The consumer is woken through an mp.Event only while it is
+    actually sleeping.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, capacity: int = 1024):
+        self.ring = ShmRing(capacity)
+        self.fallback = mp.Queue()
+        self.doorbell = mp.Event()
+        self._mac_cache: Dict[str, bytes] = {}
+        self._text_cache: Dict[str, bytes] = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_mac_cache'] = {}
+        state['_text_cache'] = {}
+        return state
+
+    # ---- producer side ----
+
+    def _encode_text(self, value: str, size: int) -> Optional[bytes]:
+        # None when the text does not fit its slot field; never truncated, since a cut
+        # UTF-8 sequence fails to decode and a shortened location changes the output path
+        try:
+            return self._text_cache[value]
+        except KeyError:
+            pass
+        encoded = value.encode('utf-8')
+        if len(encoded) > size:
+            logging.info("Ring field %r is %d bytes (slot holds %d), sent through the fallback queue",
+                         value, len(encoded), size)
+            encoded = None
+        self._text_cache[value] = encoded
+        return encoded
+
+    def _encode_mac(self, mac: str) -> bytes:
+        mac_bytes = self._mac_cache.get(mac)
+        if mac_bytes is None:
+            mac_bytes = self._mac_cache[mac] = mac_str_to_bytes(mac)
+        return mac_bytes
+
+    def full(self) -> bool:
+        return self.ring.full()
+
+    def empty(self) -> bool:
+        return self.ring.empty() and self.fallback.empty()
+
+    def qsize(self) -> int:
+        return len(self.ring)
+
+    def put(self, item, block=True, timeout=None):
+        if item is None:
+            self.fallback.put(None)
+        else:
+            location, device_type, address, service_name, char_name, received_time, data = item
+            char_id = dean_char_id.get((service_name, char_name))
+            location_bytes = self._encode_text(location, _LOCATION_SIZE)
+            device_type_bytes = self._encode_text(device_type, _DEVICE_TYPE_SIZE)
+            if char_id is None or len(data) > SLOT_PAYLOAD_SIZE or location_bytes is None or device_type_bytes is None:
+                self.fallback.put(item)
+            elif not self.ring.push(received_time, self._encode_mac(address), char_id,
+                                    location_bytes, device_type_bytes, data):
+                raise queue.Full
+        if self.ring.waiting:
+            self.doorbell.set()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    # ---- consumer side ----
+
+    def _pop(self):
+        record = self.ring.pop()
+        if record is None:
+            return self.fallback.get_nowait()
+        timestamp, mac, char_id, location, device_type, payload = record
+        service_name, char_name = dean_char_by_id[char_id]
+        return [location.rstrip(b'\x00').decode('utf-8'), device_type.rstrip(b'\x00').decode('utf-8'),
+                mac_bytes_to_str(mac), service_name, char_name, timestamp, payload]
+
+    def get_nowait(self):
+        return self._pop()
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._pop()
+            except queue.Empty:
+                pass
+            if not block:
+                raise queue.Empty
+            remaining = self.poll_interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                raise queue.Empty
+            self.ring.waiting = True
+            try:
+                # Re-check after announcing the wait so a racing put is not missed
+                return self._pop()
+            except queue.Empty:
+                self.doorbell.wait(min(remaining, self.poll_interval))
+            finally:
+                self.doorbell.clear()
+                self.ring.waiting = False
+
+    def close(self):
+        self.ring.close()
+        self.fallback.close()
+
+
+def make_worker_queue(capacity: int = 1024, use_shared_memory: bool = True):
+    """RingQueue when shared memory is available, bounded mp.Queue otherwise."""
+    if use_shared_memory and shared_memory is not None:
+        try:
+            return RingQueue(capacity)
+        except OSError as e:
+            logging.warning("Shared memory ring unavailable, using mp.Queue: %s", e)
+    return mp.Queue(capacity)
@@ -0,0 +1,71 @@
+import multiprocessing as mp
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from backpressure import GuardedQueue, SpillSegment
+
+
+def _item(n):
+    return ['location', 'type', 'dean', 'inference', 'rawdata', float(n), bytes(44)]
+
+
+def test_spill_file_stays_bounded_while_replaying(tmp_path):
+    path = str(tmp_path / "data.spill")
+    spill = SpillSegment(path, max_bytes=16 * 1024)
+    appended = replayed = 0
+    for _ in range(200):
+        while spill.append(_item(appended)):
+            appended += 1
+        # The consumer catches up with part of the backlog
+        for _ in range(len(spill) // 2):
+            item, size = spill.peek()
+            assert item[5] == replayed
+            spill.advance(size)
+            replayed += 1
+        assert os.path.getsize(path) <= 16 * 1024 + 8
+    assert appended > 200 * 10
+    spill.close()
+
+    reopened = SpillSegment(path, max_bytes=16 * 1024)
+    assert reopened.peek()[0][5] == replayed
+    reopened.close()
+
+
+def test_overflow_is_replayed_in_order(tmp_path):
+    guarded = GuardedQueue('data', queue.Queue(maxsize=4), SpillSegment(str(tmp_path / "data.spill")))
+    for n in range(50):
+        guarded.put(_item(n))
+    # put() only stages overflow; the file is written by pump()
+    assert len(guarded.spill) == 0
+    received = []
+    while len(received) < 50:
+        guarded.pump()
+        while not guarded.inner.empty():
+            received.append(guarded.get()[5])
+    assert received == list(range(50))
+    assert guarded.report()['spill_backlog'] == 0
+    assert guarded.stats.dropped == 0
+    guarded.spill.close()
+
+
+def _produce(guarded, count):
+    for n in range(count):
+        guarded.put(_item(n))
+
+
+def test_counters_of_producers_in_other_processes_reach_the_report():
+    context = mp.get_context('fork')
+    guarded = GuardedQueue('log', context.Queue(maxsize=2), shared_stats=True)
+    producers = [context.Process(target=_produce, args=(guarded, 3)) for _ in range(2)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    report = guarded.report()
+    assert report['put'] == 6
+    assert report['dropped'] == 4
+    assert report['high_water'] >= 1
+    guarded.inner.close()
@@ -0,0 +1,88 @@
+import fcntl
+import os
+import sys
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import compactor
+import data_index
+import record_store
+from block_file import block_path, compress_file, late_path
+from data_writer import AppendWriter
+
+PAYLOAD = bytes(record_store.RAWDATA_SIZE)
+
+
+def test_late_records_after_compaction_keep_the_store_readable(tmp_path):
+    path = str(tmp_path / "2024-01-01.bin")
+    writer = AppendWriter(sync=False)
+    writer.write(path, record_store.pack_record(1.0, PAYLOAD), header=record_store.store_header())
+    writer.flush()
+    compactor.compact_day_file(path)
+
+    writer.write(path, record_store.pack_record(2.0, PAYLOAD), header=record_store.store_header())
+    writer.close()
+    assert not os.path.exists(path)
+    assert list(record_store.open_day(path)['time']) == [1.0]
+
+    compactor.compact_day_file(late_path(path))
+    assert not os.path.exists(late_path(path))
+    assert list(record_store.open_day(path)['time']) == [1.0, 2.0]
+
+
+def test_late_lines_do_not_hide_the_compacted_day(tmp_path):
+    path = str(tmp_path / "2024-01-01.txt")
+    header = b"time,value\n"
+    writer = AppendWriter(sync=False)
+    writer.write(path, b"2024-01-01 10:00:05,a\n", header=header, minute=600)
+    writer.flush()
+    compactor.compact_day_file(path)
+    assert os.path.exists(block_path(path))
+
+    writer.write(path, b"2024-01-01 11:00:05,b\n", header=header, minute=660)
+    writer.close()
+    day = datetime(2024, 1, 1)
+    assert data_index.read_range(path, day.replace(hour=10), day.replace(hour=10, minute=59)) == ["2024-01-01 10:00:05,a"]
+
+    compactor.compact_day_file(late_path(path))
+    assert data_index.read_range(path, day.replace(hour=10), day.replace(hour=11)) == ["2024-01-01 10:00:05,a", "2024-01-01 11:00:05,b"]
+
+
+def test_flush_waits_for_a_compaction_in_progress(tmp_path):
+    path = str(tmp_path / "2024-01-01.bin")
+    writer = AppendWriter(sync=False)
+    writer.write(path, record_store.pack_record(1.0, PAYLOAD), header=record_store.store_header())
+    writer.flush()
+
+    # Compactor has read the file and holds its lock while the late record arrives
+    with open(path, 'rb') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        writer.write(path, record_store.pack_record(2.0, PAYLOAD), header=record_store.store_header())
+        flush = threading.Thread(target=writer.flush)
+        flush.start()
+        flush.join(0.2)
+        assert flush.is_alive()
+        compress_file(path, block_path(path))
+        os.remove(path)
+    flush.join()
+    writer.close()
+
+    compactor.compact_day_file(late_path(path))
+    assert list(record_store.open_day(path)['time']) == [1.0, 2.0]
+
+
+def test_headerless_late_line_equal_to_the_first_line_is_kept(tmp_path):
+    path = str(tmp_path / "2024-01-01.txt")
+    line = b"2024-01-01 10:00:05,same\n"
+    writer = AppendWriter(sync=False)
+    writer.write(path, line, minute=600)
+    writer.flush()
+    compactor.compact_day_file(path)
+    writer.write(path, line, minute=600)
+    writer.close()
+
+    compactor.compact_day_file(late_path(path))
+    day = datetime(2024, 1, 1)
+    assert data_index.read_range(path, day.replace(hour=10), day.replace(hour=11)) == [line.decode().strip()] * 2
@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from dean_identity import KnownDeanTable
+
+
+def test_entry_without_relay_is_indexed_once_the_relay_is_known():
+    table = KnownDeanTable()
+    entry = table.ensure("AA:BB:CC:DD:EE:FF")
+    assert table.iter_by_relay() == []
+    assert table.deans_on("") == []
+
+    table.ensure("AA:BB:CC:DD:EE:FF", relay_address="11:22:33:44:55:66")
+    assert table.relay_for("AA:BB:CC:DD:EE:FF") == "11:22:33:44:55:66"
+    assert table.iter_by_relay() == [("11:22:33:44:55:66", [entry])]
@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import model_delta
+
+
+def _model(size, seed=1):
+    return random.Random(seed).randbytes(size)
+
+
+def _retrained(base, changed=4096):
+    return base[:-changed] + _model(changed, seed=2)
+
+
+def test_full_model_round_trip():
+    target = _model(64 * 1024)
+    delta = model_delta.encode(b'', target)
+    assert model_delta.decode(b'', delta) == target
+
+
+def test_delta_round_trip_against_a_similar_base():
+    base = _model(64 * 1024)
+    target = _retrained(base)
+    delta = model_delta.encode(base, target)
+    assert len(delta) < len(target) // 4
+    assert model_delta.decode(base, delta) == target
+    # DATA packets are padded with 0xFF past the end of the stream
+    assert model_delta.decode(base, delta + b'\xff' * 100) == target
+
+
+def test_uncompressed_round_trip():
+    base = _model(16 * 1024)
+    target = _retrained(base, 1024)
+    assert model_delta.decode(base, model_delta.encode(base, target, compress=False)) == target
+
+
+def test_wrong_base_is_rejected():
+    base = _model(64 * 1024)
+    delta = model_delta.encode(base, _retrained(base))
+    with pytest.raises(ValueError):
+        model_delta.decode(base[:-1], delta)
+    # Same size, different content: the target CRC no longer matches
+    with pytest.raises(ValueError):
+        model_delta.decode(_model(64 * 1024, seed=3), delta)
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_truncated_or_corrupted_stream_is_rejected(compress):
+    base = _model(64 * 1024)
+    delta = model_delta.encode(base, _retrained(base), compress=compress)
+    for broken in (delta[:5], delta[:model_delta.HEADER.size + 3], delta[:-10]):
+        with pytest.raises(ValueError):
+            model_delta.decode(base, broken)
+    corrupted = bytearray(delta)
+    corrupted[-20] ^= 0xFF
+    with pytest.raises(ValueError):
+        model_delta.decode(base, bytes(corrupted))
+    with pytest.raises(ValueError):
+        model_delta.decode(base, b'XXXX' + delta[4:])
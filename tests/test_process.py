@@ -0,0 +1,40 @@
+import os
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from backpressure import SpillSegment
+from process import DataProcess, DataProcessPool
+
+MACS = ["AA:BB:CC:00:00:%02X" % n for n in range(16)]
+
+
+def _shard(mac, size):
+    return zlib.crc32(mac.encode('utf-8')) % size
+
+
+def test_spill_is_rerouted_when_the_pool_shrinks(tmp_path, monkeypatch):
+    monkeypatch.setattr(DataProcess, 'spill_dir', str(tmp_path))
+    monkeypatch.setattr(DataProcess, 'use_shared_memory', False)
+    segments = [SpillSegment(str(tmp_path / f"DataProcess-{shard}.spill")) for shard in range(3)]
+    for seq in range(5):
+        for mac in MACS:
+            segments[_shard(mac, 3)].append(['location', 'type', mac, 'inference', 'rawdata', float(seq), bytes(44)])
+    for segment in segments:
+        segment.close()
+
+    pool = DataProcessPool(size=2)
+    pool.open(2)
+    try:
+        assert sorted(os.listdir(tmp_path)) == ["DataProcess-0.spill", "DataProcess-1.spill"]
+        received = {}
+        for shard, worker in enumerate(pool.workers):
+            q = worker.get_queue()
+            for _ in range(q.qsize()):
+                item = q.get(timeout=1.0)
+                assert _shard(item[2], 2) == shard
+                received.setdefault(item[2], []).append(item[5])
+        assert received == {mac: [0.0, 1.0, 2.0, 3.0, 4.0] for mac in MACS}
+    finally:
+        pool.close()
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from shm_ring import RingQueue
+
+
+def _get(q):
+    # The fallback mp.Queue hands items over through a feeder thread
+    return q.get(timeout=2.0)
+
+
+def test_long_non_ascii_location_is_not_truncated():
+    q = RingQueue(capacity=8)
+    try:
+        location = '서울특별시 관악구 관악로 1 연구동 거실'   # > 32 bytes in UTF-8
+        item = [location, 'DE&N', '5A:1A:00:00:00:01', 'inference', 'rawdata', time.time(), bytearray(b'\x01\x02')]
+        q.put(item)
+        received = _get(q)
+        assert received[0] == location
+        assert received[1] == 'DE&N'
+        assert bytes(received[6]) == b'\x01\x02'
+    finally:
+        q.close()
+
+
+def test_fitting_text_uses_the_ring():
+    q = RingQueue(capacity=8)
+    try:
+        q.put(['거실', 'DE&N', '5A:1A:00:00:00:01', 'inference', 'rawdata', 1.5, bytearray(b'\x07')])
+        assert q.qsize() == 1
+        received = _get(q)
+        assert received[:3] == ['거실', 'DE&N', '5A:1A:00:00:00:01']
+        assert received[5] == 1.5
+    finally:
+        q.close()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import time
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+
+class WindowedSender:
+    """Sliding-window sender for one model or file transfer.
+
+    Up to window chunks are kept in flight. The relay acknowledges cumulatively
+    with the highest sequence number it has received in order; a repeated ACK
+    means the next chunk was lost and only that chunk is sent again. If no ACK
+    arrives for ack_timeout seconds the oldest unacknowledged chunk is resent.
+    """
+
+    ack_timeout = 2.0
+    max_retries = 5
+    dup_ack_threshold = 2
+    end_retries = 3
+    end_wait = 1.0
+
+    def __init__(self, label: str, state, send: Callable[[bytes], Awaitable],
+                 data_packet: Callable[[int, memoryview], bytes], end_packet: bytes,
+                 chunk_size: int, window: int, start: int = 0):
+        self.label = label
+        self.state = state
+        self.send = send
+        self.data_packet = data_packet
+        self.end_packet = end_packet
+        self.chunk_size = chunk_size
+        self.window = window
+        self.total = (state.size + chunk_size - 1) // chunk_size
+        self.start = start
+        self.base = start       # first chunk not yet acknowledged (resumed transfers start later)
+        self.next_seq = start   # next chunk never sent
+        self.dup_acks = 0
+        self.retransmits = 0
+        self.completed = False
+        self.finished = False
+        self._resend = deque()
+        self._progress = asyncio.Event()
+
+    def on_ack(self, seq: int):
+        if seq >= self.total:
+            return
+        acked = seq + 1
+        if acked > self.base:
+            self.base = acked
+            self.dup_acks = 0
+        elif acked == self.base and self.base < self.next_seq:
+            self.dup_acks += 1
+            if self.dup_acks == self.dup_ack_threshold:
+                self._resend.append(self.base)
+        self._progress.set()
+
+    def finish(self, completed: bool):
+        # END / FAIL from the relay, or the link dropped
+        self.completed = completed
+        self.finished = True
+        self._progress.set()
+
+    async def _send_chunk(self, seq: int):
+        await self.send(self.data_packet(seq, self.state.chunk(seq, self.chunk_size)))
+
+    async def run(self) -> bool:
+        start = time.monotonic()
+        retries = 0
+        while self.state.sending and not self.finished and self.base < self.total:
+            self._progress.clear()
+            while self._resend and self.state.sending:
+                seq = self._resend.popleft()
+                if seq >= self.base:
+                    await self._send_chunk(seq)
+                    self.retransmits += 1
+            while self.next_seq < min(self.base + self.window, self.total) and self.state.sending:
+                await self._send_chunk(self.next_seq)
+                self.next_seq += 1
+            base = self.base
+            try:
+                await asyncio.wait_for(self._progress.wait(), self.ack_timeout)
+            except asyncio.TimeoutError:
+                retries += 1
+                if retries > self.max_retries:
+                    logging.warning('%s: no ACK for chunk %d after %d retries', self.label, self.base, self.max_retries)
+                    return False
+                self._resend.append(self.base)
+                continue
+            if self.base > base:
+                retries = 0
+
+        for _ in range(self.end_retries):
+            # state.sending is shared with whatever transfer starts next
+            if self.finished or not self.state.sending:
+                break
+            self._progress.clear()
+            await self.send(self.end_packet)
+            try:
+                await asyncio.wait_for(self._progress.wait(), self.end_wait)
+            except asyncio.TimeoutError:
+                pass
+        logging.info('%s: %d chunks in %.2f s, window %d, %d retransmitted',
+                     self.label, self.total - self.start, time.monotonic() - start, self.window, self.retransmits)
+        return self.completed
+
+
+class TransferProgressStore:
+    """Position of unfinished transfers, one JSON record per DEAN and kind.
+
+    A record holds the payload's SHA-256, the chunk geometry and next_seq, the
+    first chunk not yet acknowledged. It is written when a transfer starts, at
+    most every save_interval seconds while ACKs arrive and whenever the link
+    drops, and removed once the transfer ends.
+    """
+
+    save_interval = 1.0
+
+    def __init__(self, root: str):
+        self.root = root
+        self._saved: Dict[Tuple[str, str], float] = {}
+
+    def _path(self, dean_slug: str, kind: str) -> str:
+        return os.path.join(self.root, f"{dean_slug}.{kind}.json")
+
+    def load(self, dean_slug: str, kind: str) -> Optional[dict]:
+        try:
+            with open(self._path(dean_slug, kind), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, dean_slug: str, kind: str, record: dict, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now - self._saved.get((dean_slug, kind), 0.0) < self.save_interval:
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(dean_slug, kind)
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(record, f, indent=4)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning('Transfer progress not saved (%s): %s', path, e)
+            return False
+        self._saved[(dean_slug, kind)] = now
+        return True
+
+    def remove(self, dean_slug: str, kind: str):
+        self._saved.pop((dean_slug, kind), None)
+        try:
+            os.remove(self._path(dean_slug, kind))
+        except FileNotFoundError:
+            pass
+
+    def records(self) -> Iterator[dict]:
+        try:
+            names = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return
+        for name in names:
+            parts = name.split('.')
+            if len(parts) == 3 and parts[2] == 'json':
+                record = self.load(parts[0], parts[1])
+                if record is not None:
+                    yield record